@@ -2,6 +2,7 @@ from pathlib import Path
 import environ
 import os
 from datetime import timedelta
+from kombu import Queue
 
 env = environ.Env()
 
@@ -46,11 +47,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "listings.middleware.WhiteNoiseMiddleware",
+    "listings.middleware.InstrumentationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -117,6 +118,10 @@ PRODUCTION_DATABASE = {
 TESTING_DATABASE = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
+        # A file the concurrency tests' threads share, whose writers wait
+        # for the lock as on MySQL instead of failing with "locked".
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 30},
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -147,6 +152,22 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache: locmemcache:// (per process) or a Redis URL, e.g. redis://localhost:6379/1.
+# List ETags, worker metrics and the outbox rate limit need a shared one.
+CACHES = {"default": env.cache_url(f"{ENVIRONMENT}_CACHE_URL", default="locmemcache://")}
+# Seconds a cached listing/location response is served before it is rebuilt
+READ_CACHE_TIMEOUT = env.int(f"{ENVIRONMENT}_READ_CACHE_TIMEOUT", default=300)
+# Addresses allowed to scrape /internal/metrics/
+INTERNAL_IPS = env.list(f"{ENVIRONMENT}_INTERNAL_IPS", default=["127.0.0.1"])
+# Share of requests whose queries and serializer time are profiled for the
+# metrics, and the wall time above which a request is logged as slow
+INSTRUMENTATION_SAMPLE_RATE = env.float(f"{ENVIRONMENT}_INSTRUMENTATION_SAMPLE_RATE", default=0.1)
+SLOW_REQUEST_SECONDS = env.float(f"{ENVIRONMENT}_SLOW_REQUEST_SECONDS", default=1.0)
+# Rows fetched per query by the CSV/NDJSON exports
+EXPORT_CHUNK_SIZE = env.int(f"{ENVIRONMENT}_EXPORT_CHUNK_SIZE", default=2000)
+# Most items one bulk listing or booking write may carry
+BULK_MAX_ITEMS = env.int(f"{ENVIRONMENT}_BULK_MAX_ITEMS", default=1000)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -179,22 +200,124 @@ rb_user = env(f"{ENVIRONMENT}_RABBITMQ_USERNAME", default="guest")
 rb_password = env(f"{ENVIRONMENT}_RABBITMQ_PASSWORD", default="guest")
 rb_host = env(f"{ENVIRONMENT}_RABBITMQ_HOST", default="localhost")
 rb_port = env(f"{ENVIRONMENT}_RABBITMQ_PORT", default="5672")
-CELERY_BROKER_URL = f"amqp://{rb_user}:{rb_password}@{rb_host}:{rb_port}//"
+# Set to memory:// to run without RabbitMQ: messages then stay inside one
+# process, so the worker must run there too (see the run_tasks_in_memory
+# command)
+CELERY_BROKER_URL = env(f"{ENVIRONMENT}_CELERY_BROKER_URL", default=f"amqp://{rb_user}:{rb_password}@{rb_host}:{rb_port}//")
 CELERY_RESULT_BACKEND = env(f"{ENVIRONMENT}_CELERY_RESULT_BACKEND", default="django-db")
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_RESULT_EXTENDED = env.bool(f"{ENVIRONMENT}_CELERY_RESULT_EXTENDED", default=True)
+# One queue per kind of work, so an email backlog cannot hold up payments.
+# Run a worker per queue (celery worker -Q payments) or one for all.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_QUEUES = (
+    Queue("default"),
+    Queue("payments"),
+    Queue("email"),
+    Queue("maintenance"),
+)
+CELERY_TASK_ROUTES = {
+    "listings.tasks.initialize_booking_payment": {"queue": "payments"},
+    "listings.tasks.reconcile_pending_payments": {"queue": "payments"},
+    "listings.tasks.send_booking_confirmation_email": {"queue": "email"},
+    "listings.tasks.send_booking_confirmation_emails": {"queue": "email"},
+    "listings.tasks.send_payment_confirmation_email": {"queue": "email"},
+    "listings.tasks.drain_email_outbox": {"queue": "email"},
+    "listings.tasks.expire_stale_bookings": {"queue": "maintenance"},
+    "listings.tasks.update_listing_rollups": {"queue": "maintenance"},
+}
+# Limits for tasks that do not set their own (listings/tasks.py does)
+CELERY_TASK_SOFT_TIME_LIMIT = 300
+CELERY_TASK_TIME_LIMIT = 360
+# Tasks are idempotent, so they are acknowledged after they run: if a
+# worker goes away mid-task the broker hands the task to another. Each
+# worker process reserves one task at a time so a slow task does not
+# strand others behind it.
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = env.int(f"{ENVIRONMENT}_CELERY_WORKER_PREFETCH_MULTIPLIER", default=1)
+
+# Chapa payment gateway
+CHAPA_SECRET_KEY = env("CHAPA_SECRET_KEY", default="")
+CHAPA_BASE_URL = env("CHAPA_BASE_URL", default="")
+CHAPA_CONNECT_TIMEOUT = env.float("CHAPA_CONNECT_TIMEOUT", default=3.05)
+CHAPA_READ_TIMEOUT = env.float("CHAPA_READ_TIMEOUT", default=15)
+CHAPA_MAX_RETRIES = env.int("CHAPA_MAX_RETRIES", default=2)
+CHAPA_POOL_SIZE = env.int("CHAPA_POOL_SIZE", default=10)
+# Consecutive failed calls before the breaker opens, and how long it stays open
+CHAPA_BREAKER_THRESHOLD = env.int("CHAPA_BREAKER_THRESHOLD", default=5)
+CHAPA_BREAKER_RESET_SECONDS = env.float("CHAPA_BREAKER_RESET_SECONDS", default=30)
+# Secret hash set on the Chapa dashboard; webhooks are rejected without it
+CHAPA_WEBHOOK_SECRET = env("CHAPA_WEBHOOK_SECRET", default="")
+# Pending payments older than PAYMENT_RECONCILE_AFTER seconds are verified
+# with the gateway in batches by the reconcile_pending_payments beat task
+PAYMENT_RECONCILE_INTERVAL = env.int("PAYMENT_RECONCILE_INTERVAL", default=300)
+PAYMENT_RECONCILE_AFTER = env.int("PAYMENT_RECONCILE_AFTER", default=600)
+PAYMENT_RECONCILE_BATCH_SIZE = env.int("PAYMENT_RECONCILE_BATCH_SIZE", default=100)
+# Pending bookings older than BOOKING_PENDING_TTL seconds are cancelled, and
+# their nights freed, by the expire_stale_bookings beat task, once Chapa
+# confirms their payments are unpaid; keep it well above
+# PAYMENT_RECONCILE_AFTER so most late payments are settled before that
+BOOKING_PENDING_TTL = env.int("BOOKING_PENDING_TTL", default=3600)
+BOOKING_EXPIRY_INTERVAL = env.int("BOOKING_EXPIRY_INTERVAL", default=300)
+BOOKING_EXPIRY_BATCH_SIZE = env.int("BOOKING_EXPIRY_BATCH_SIZE", default=500)
+BOOKING_EXPIRY_MAX_BATCHES = env.int("BOOKING_EXPIRY_MAX_BATCHES", default=20)
+# Host dashboard rollups: the update_listing_rollups beat task rebuilds the
+# daily stats of listings changed since its last run, rereading the last
+# ROLLUP_OVERLAP seconds for transactions that committed late
+ROLLUP_INTERVAL = env.int("ROLLUP_INTERVAL", default=300)
+ROLLUP_OVERLAP = env.int("ROLLUP_OVERLAP", default=300)
+ROLLUP_BATCH_SIZE = env.int("ROLLUP_BATCH_SIZE", default=500)
 
 # Email settings console
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# Outbox drained by the drain_email_outbox beat task
+EMAIL_OUTBOX_DRAIN_INTERVAL = env.int("EMAIL_OUTBOX_DRAIN_INTERVAL", default=10)
+EMAIL_OUTBOX_BATCH_SIZE = env.int("EMAIL_OUTBOX_BATCH_SIZE", default=100)
+# Messages per second across all workers sharing CACHE_URL; per worker process
+# with the locmem default (0 = unlimited)
+EMAIL_OUTBOX_RATE_LIMIT = env.int("EMAIL_OUTBOX_RATE_LIMIT", default=10)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", default=8)
+EMAIL_OUTBOX_BACKOFF_SECONDS = env.int("EMAIL_OUTBOX_BACKOFF_SECONDS", default=30)
+EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = env.int("EMAIL_OUTBOX_BACKOFF_MAX_SECONDS", default=3600)
+# How long a worker holds a claimed batch before others may retry it
+EMAIL_OUTBOX_LEASE_SECONDS = env.int("EMAIL_OUTBOX_LEASE_SECONDS", default=300)
+
+# Periodic tasks (run `celery -A alx_travel_app beat`)
+CELERY_BEAT_SCHEDULE = {
+    "drain-email-outbox": {
+        "task": "listings.tasks.drain_email_outbox",
+        "schedule": EMAIL_OUTBOX_DRAIN_INTERVAL,
+    },
+    "reconcile-pending-payments": {
+        "task": "listings.tasks.reconcile_pending_payments",
+        "schedule": PAYMENT_RECONCILE_INTERVAL,
+    },
+    "expire-stale-bookings": {
+        "task": "listings.tasks.expire_stale_bookings",
+        "schedule": BOOKING_EXPIRY_INTERVAL,
+    },
+    "update-listing-rollups": {
+        "task": "listings.tasks.update_listing_rollups",
+        "schedule": ROLLUP_INTERVAL,
+    },
+}
 
 # rest authentication
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+    ),
+    # keyset pagination on (created_at, id); clients pass ?cursor= and ?limit= (max 100)
+    "DEFAULT_PAGINATION_CLASS": "listings.pagination.KeysetPagination",
+    "PAGE_SIZE": 20,
+    # orjson, producing the same bytes as DRF's JSONRenderer
+    "DEFAULT_RENDERER_CLASSES": (
+        "listings.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 SIMPLE_JWT = {
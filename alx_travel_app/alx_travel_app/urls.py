@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from . import swagger_urls
 from listings import urls as listings_urls
-from listings.views import LogoutView, RegisterView
+from listings.views import LogoutView, RegisterView, metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -17,4 +17,5 @@ urlpatterns = [
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('api/auth/logout/', LogoutView.as_view(), name='logout'),
+    path('internal/metrics/', metrics_view, name='metrics'),
 ]
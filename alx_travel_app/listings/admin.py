@@ -1,10 +1,11 @@
 from django.contrib import admin
-from .models import Listing, Booking, Review, Payment, Location, User
+from .models import Listing, Booking, Review, Payment, PaymentEvent, Location, User
 # Register your models here.
 
 admin.site.register(Listing)
 admin.site.register(Booking)
 admin.site.register(Review)
 admin.site.register(Payment)
+admin.site.register(PaymentEvent)
 admin.site.register(Location)
 admin.site.register(User)
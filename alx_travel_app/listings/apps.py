@@ -5,3 +5,5 @@ class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
 
+    def ready(self):
+        from . import signals, task_metrics  # noqa: F401
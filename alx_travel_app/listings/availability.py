@@ -0,0 +1,166 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import BookedNight, Booking, BookingStatus, Listing
+
+# Bookings in these states hold their nights on the calendar.
+RESERVING_STATUSES = (BookingStatus.ACTIVE, BookingStatus.PENDING)
+# Listings per calendar query when checking stays in bulk
+STAY_CHECK_CHUNK = 500
+
+
+def as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def booking_nights(start_date, end_date):
+    """
+    Returns every night of a stay. The check-out day is not a night, so a
+    booking from the 1st to the 3rd holds the 1st and the 2nd.
+    """
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    return [start_date + timedelta(days=n) for n in range((end_date - start_date).days)]
+
+
+def sync_booking_nights(booking):
+    """
+    Brings the calendar rows of a booking in line with its listing, dates
+    and status, touching only the nights that changed.
+    """
+    wanted = set()
+    if booking.status in RESERVING_STATUSES:
+        wanted = {(booking.listing_id, night) for night in booking_nights(booking.start_date, booking.end_date)}
+    existing = set(BookedNight.objects.filter(booking=booking).values_list('listing_id', 'date'))
+
+    stale = existing - wanted
+    if stale:
+        # A booking moved to another listing may keep its dates, so the
+        # rows are matched on both.
+        by_listing = defaultdict(list)
+        for listing_id, night in stale:
+            by_listing[listing_id].append(night)
+        query = Q()
+        for listing_id, nights in by_listing.items():
+            query |= Q(listing_id=listing_id, date__in=nights)
+        BookedNight.objects.filter(query, booking=booking).delete()
+    missing = wanted - existing
+    if missing:
+        BookedNight.objects.bulk_create(
+            BookedNight(booking=booking, listing_id=listing_id, date=night)
+            for listing_id, night in sorted(missing)
+        )
+
+
+def sync_nights(bookings):
+    """
+    sync_booking_nights for many bookings at once, e.g. after bulk_create
+    or bulk_update, which send no signals: their calendar rows are
+    rewritten with one delete and one insert.
+    """
+    BookedNight.objects.filter(booking__in=[booking.pk for booking in bookings]).delete()
+    BookedNight.objects.bulk_create(
+        [
+            BookedNight(booking_id=booking.pk, listing_id=booking.listing_id, date=night)
+            for booking in bookings if booking.status in RESERVING_STATUSES
+            for night in booking_nights(booking.start_date, booking.end_date)
+        ],
+        batch_size=1000,
+    )
+
+
+def is_available(listing, start_date, end_date, exclude_booking=None):
+    nights = BookedNight.objects.filter(listing=listing, date__gte=start_date, date__lt=end_date)
+    if exclude_booking is not None:
+        nights = nights.exclude(booking=exclude_booking)
+    return not nights.exists()
+
+
+def overlapping_stays(stays, exclude_bookings=()):
+    """
+    is_available for a batch of stays, (listing_id, start_date, end_date)
+    each: reads the calendar once per STAY_CHECK_CHUNK listings, over the
+    span their stays cover, instead of once per stay. Returns the indexes
+    of the stays that hit a booked night, and of those overlapping an
+    earlier-starting stay of the batch on the same listing, as
+    {index: 'booked' or 'batch'}.
+    """
+    spans = {}
+    for listing_id, start_date, end_date in stays:
+        first, last = spans.get(listing_id, (start_date, end_date))
+        spans[listing_id] = (min(first, start_date), max(last, end_date))
+    booked = defaultdict(list)
+    listing_ids = list(spans)
+    for chunk in range(0, len(listing_ids), STAY_CHECK_CHUNK):
+        query = Q()
+        for listing_id in listing_ids[chunk:chunk + STAY_CHECK_CHUNK]:
+            first, last = spans[listing_id]
+            query |= Q(listing_id=listing_id, date__gte=first, date__lt=last)
+        nights = BookedNight.objects.filter(query).exclude(booking__in=exclude_bookings)
+        for listing_id, night in nights.values_list('listing_id', 'date'):
+            booked[listing_id].append(night)
+    for nights in booked.values():
+        nights.sort()
+
+    overlaps = {}
+    by_listing = defaultdict(list)
+    for index, (listing_id, start_date, end_date) in enumerate(stays):
+        nights = booked[listing_id]
+        position = bisect_left(nights, start_date)
+        if position < len(nights) and nights[position] < end_date:
+            overlaps[index] = 'booked'
+        by_listing[listing_id].append(index)
+    for indexes in by_listing.values():
+        held_until = None
+        for index in sorted(indexes, key=lambda index: stays[index][1]):
+            if held_until is not None and stays[index][1] < held_until:
+                overlaps.setdefault(index, 'batch')
+            held_until = max(held_until or stays[index][2], stays[index][2])
+    return overlaps
+
+
+@transaction.atomic
+def rebuild_availability(batch_size=1000):
+    """
+    Recomputes the whole calendar from the bookings table. Used after bulk
+    imports, which skip the booking signals. Where old bookings overlap, the
+    earliest one keeps the night. Returns the number of nights processed.
+    """
+    BookedNight.objects.all().delete()
+    bookings = Booking.objects.filter(status__in=RESERVING_STATUSES) \
+        .order_by('created_at', 'id') \
+        .values_list('id', 'listing_id', 'start_date', 'end_date')
+
+    total = 0
+    batch = []
+    for booking_id, listing_id, start_date, end_date in bookings.iterator(chunk_size=batch_size):
+        for night in booking_nights(start_date, end_date):
+            batch.append(BookedNight(booking_id=booking_id, listing_id=listing_id, date=night))
+        if len(batch) >= batch_size:
+            BookedNight.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+            batch = []
+    if batch:
+        BookedNight.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+    return total
+
+
+def available_listings(start, end, city=None, max_price=None):
+    """
+    Returns listings with no booked night in [start, end).
+    """
+    booked = BookedNight.objects.filter(date__gte=start, date__lt=end).values('listing_id')
+    queryset = Listing.objects.exclude(id__in=booked)
+    if city:
+        queryset = queryset.filter(location__city__iexact=city)
+    if max_price is not None:
+        queryset = queryset.filter(price_per_night__lte=max_price)
+    return queryset
@@ -0,0 +1,173 @@
+from collections import Counter
+
+from celery import group
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .availability import overlapping_stays, sync_nights
+from .cache import invalidate
+from .models import Booking, BookingStatus, Listing
+from .pricing import price_stay, rate_tables
+from .regions import shift_listing_counts
+from .search import rebuild_search_index
+from .serializers import BOOKED_DATES_MESSAGE, BookingSerializer, BulkListSerializer, ListingSerializer, parse_id
+from .signals import CACHE_DEPENDENCIES
+from .tasks import initialize_booking_payment, send_booking_confirmation_emails
+
+# Rows per INSERT/UPDATE statement
+BATCH_SIZE = 500
+OVERLAP_MESSAGES = {
+    'booked': BOOKED_DATES_MESSAGE,
+    'batch': "Overlaps another booking in this batch.",
+}
+
+
+def item_errors(errors):
+    """Raises the per-item errors, if any, in the shape a many=True serializer reports them."""
+    if any(errors):
+        raise serializers.ValidationError([
+            {api_settings.NON_FIELD_ERRORS_KEY: [error]} if error else {} for error in errors
+        ])
+
+
+def validate_batch(serializer_class, data, context, instances=None):
+    """Validated attrs for each item of `data`, in one BulkListSerializer pass."""
+    serializer = BulkListSerializer(
+        child=serializer_class(context=context),
+        data=data,
+        context={**context, 'bulk': True},
+        instances=instances,
+        partial=instances is not None,
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def instances_for(queryset, data):
+    """{id: instance} for the items of `data` that `queryset` holds. Each id may appear once."""
+    ids = [parse_id(item.get('id')) if isinstance(item, dict) else None for item in data] \
+        if isinstance(data, list) else []
+    counts = Counter(ids)
+    item_errors(["Repeated in this batch." if item_id and counts[item_id] > 1 else None for item_id in ids])
+    return queryset.in_bulk([item_id for item_id in ids if item_id])
+
+
+def apply_changes(data, items, instances):
+    """Sets the validated attrs of each item on the instance it names; returns the instances and fields set."""
+    now = timezone.now()
+    changed, fields = [], {'updated_at'}
+    for item, attrs in zip(data, items):
+        instance = instances[parse_id(item['id'])]
+        for name, value in attrs.items():
+            setattr(instance, name, value)
+        # bulk_update skips auto_now, and the rollups find changes by it.
+        instance.updated_at = now
+        fields.update(attrs)
+        changed.append(instance)
+    return changed, sorted(fields)
+
+
+def create_listings(data, context):
+    """
+    Creates a batch of listings in one transaction, with the search index
+    and region counts the listing signals would have kept.
+    """
+    listings = [Listing(**attrs) for attrs in validate_batch(ListingSerializer, data, context)]
+    with transaction.atomic():
+        Listing.objects.bulk_create(listings, batch_size=BATCH_SIZE)
+        shift_listing_counts(Counter(listing.location_id for listing in listings))
+        rebuild_search_index([listing.pk for listing in listings])
+        invalidate(*CACHE_DEPENDENCIES[Listing])
+    return listings
+
+
+def update_listings(data, context, host):
+    """Updates a batch of `host`'s listings, named by "id", like create_listings."""
+    instances = instances_for(Listing.objects.filter(host=host), data)
+    before = {pk: (listing.location_id, listing.title, listing.description) for pk, listing in instances.items()}
+    items = validate_batch(ListingSerializer, data, context, instances)
+    listings, fields = apply_changes(data, items, instances)
+
+    moved = Counter()
+    reindex = []
+    for listing in listings:
+        location_id, title, description = before[listing.pk]
+        if location_id != listing.location_id:
+            moved[location_id] -= 1
+            moved[listing.location_id] += 1
+        if (title, description) != (listing.title, listing.description):
+            reindex.append(listing.pk)
+    with transaction.atomic():
+        Listing.objects.bulk_update(listings, fields, batch_size=BATCH_SIZE)
+        shift_listing_counts(moved)
+        if reindex:
+            rebuild_search_index(reindex)
+        invalidate(*CACHE_DEPENDENCIES[Listing])
+    return listings
+
+
+def check_stays(bookings, exclude_bookings=()):
+    """Per-item errors for stays too short or overlapping a booked night or each other, checked set-wise."""
+    errors = [None] * len(bookings)
+    stays = []
+    for index, booking in enumerate(bookings):
+        if booking.end_date <= booking.start_date:
+            errors[index] = "Booking days must be at least 1 day long."
+        else:
+            stays.append((index, (booking.listing_id, booking.start_date, booking.end_date)))
+    overlaps = overlapping_stays([stay for _, stay in stays], exclude_bookings)
+    for position, reason in overlaps.items():
+        errors[stays[position][0]] = OVERLAP_MESSAGES[reason]
+    item_errors(errors)
+
+
+def save_reserving_nights(write, bookings):
+    # As in BookingViewSet, the BookedNight unique constraint fails the
+    # whole batch if a racing request took any of the nights first.
+    try:
+        with transaction.atomic():
+            write()
+            sync_nights(bookings)
+            invalidate(*CACHE_DEPENDENCIES[Booking])
+    except IntegrityError:
+        raise serializers.ValidationError(BOOKED_DATES_MESSAGE)
+
+
+def create_bookings(data, context, guest):
+    """
+    Creates a batch of pending bookings for `guest` in one transaction,
+    priced by the quote engine. One task queues every confirmation email,
+    and the payment initializations go out as one group.
+    """
+    bookings = [
+        Booking(**{**attrs, 'guest': guest}, status=BookingStatus.PENDING)
+        for attrs in validate_batch(BookingSerializer, data, context)
+    ]
+    check_stays(bookings)
+    tables = rate_tables({(booking.listing_id, booking.listing.price_per_night) for booking in bookings})
+    for booking in bookings:
+        booking.total_price = price_stay(tables[booking.listing_id], booking.start_date, booking.end_date)['total']
+    save_reserving_nights(lambda: Booking.objects.bulk_create(bookings, batch_size=BATCH_SIZE), bookings)
+
+    booking_ids = [booking.id for booking in bookings]
+    send_booking_confirmation_emails.delay(booking_ids)
+    group(initialize_booking_payment.s(booking_id) for booking_id in booking_ids).apply_async()
+    return bookings
+
+
+def update_bookings(data, context, guest):
+    """
+    Updates a batch of `guest`'s bookings, named by "id", in one
+    transaction. As with single updates, prices stay as booked.
+    """
+    instances = instances_for(Booking.objects.filter(guest=guest), data)
+    items = validate_batch(BookingSerializer, data, context, instances)
+    bookings, fields = apply_changes(data, items, instances)
+    check_stays(bookings, exclude_bookings=list(instances))
+    save_reserving_nights(lambda: Booking.objects.bulk_update(bookings, fields, batch_size=BATCH_SIZE), bookings)
+    return bookings
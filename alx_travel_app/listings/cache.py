@@ -0,0 +1,106 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+
+# How long one request may hold the rebuild lock for a key, and how often
+# the requests waiting on it look for the result.
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+# Backends that keep entries inside one process.
+LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+metrics.describe('read_cache_requests_total', "Cached reads by namespace and result (hit, miss, wait).")
+
+
+def cache_is_shared():
+    """Whether all processes (web and workers) read and write the same cache."""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_BACKENDS
+
+
+def version_key(namespace):
+    return f'readcache:{namespace}:version'
+
+
+def get_version(namespace):
+    version = cache.get(version_key(namespace))
+    if version is None:
+        # A clock-based start never reuses a version whose entries may still
+        # be cached after the version key itself was evicted.
+        cache.add(version_key(namespace), time.time_ns(), timeout=None)
+        version = cache.get(version_key(namespace))
+    return version
+
+
+def get_versions(namespaces):
+    """get_version for many namespaces, in one cache round trip when they are all set."""
+    keys = {namespace: version_key(namespace) for namespace in namespaces}
+    stored = cache.get_many(list(keys.values()))
+    return {
+        namespace: stored[key] if key in stored else get_version(namespace)
+        for namespace, key in keys.items()
+    }
+
+
+def bump_version(namespace):
+    try:
+        cache.incr(version_key(namespace))
+    except ValueError:
+        cache.add(version_key(namespace), time.time_ns(), timeout=None)
+
+
+def invalidate(*namespaces):
+    """
+    Drops every cached read in `namespaces` by moving them to a new version,
+    once the current transaction commits (right away outside of one).
+    """
+    for namespace in namespaces:
+        transaction.on_commit(lambda namespace=namespace: bump_version(namespace))
+
+
+def make_key(namespace, *parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'readcache:{namespace}:v{get_version(namespace)}:{digest}'
+
+
+def read_through(namespace, key, compute, timeout=None):
+    """
+    Returns the cached value for `key`, or computes and caches it. Only one
+    caller rebuilds a missing key; the others wait up to LOCK_TIMEOUT for its
+    result before computing it themselves.
+    """
+    timeout = settings.READ_CACHE_TIMEOUT if timeout is None else timeout
+    value = cache.get(key)
+    if value is not None:
+        metrics.increment('read_cache_requests_total', namespace=namespace, result='hit')
+        return value
+
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, timeout=LOCK_TIMEOUT):
+        metrics.increment('read_cache_requests_total', namespace=namespace, result='miss')
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock)
+        return value
+
+    metrics.increment('read_cache_requests_total', namespace=namespace, result='wait')
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock) is None:
+            # The rebuild failed or its result was evicted already.
+            break
+    return compute()
@@ -0,0 +1,102 @@
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INITIALIZE_PATH = re.compile(r".*/transaction/initialize/?$")
+VERIFY_PATH = re.compile(r".*/transaction/verify/(?P<tx_ref>[^/]+)/?$")
+
+
+class ChapaStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the two Chapa endpoints the app uses, with optional added latency
+    and a random share of 503s to exercise retries and the circuit breaker.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+        if not self._before_response():
+            return
+        if not INITIALIZE_PATH.match(self.path):
+            return self._send(404, {"status": "failed", "message": "Not found"})
+        payload = json.loads(body or b"{}")
+        tx_ref = payload.get("tx_ref")
+        if not tx_ref:
+            return self._send(400, {"status": "failed", "message": "tx_ref is required"})
+        if tx_ref in self.server.transactions:
+            return self._send(400, {"status": "failed", "message": "Transaction reference has been used before"})
+        self.server.transactions[tx_ref] = payload
+        host, port = self.server.server_address[:2]
+        self._send(200, {
+            "message": "Hosted Link",
+            "status": "success",
+            "data": {"checkout_url": f"http://{host}:{port}/checkout/{tx_ref}"},
+        })
+
+    def do_GET(self):
+        if not self._before_response():
+            return
+        match = VERIFY_PATH.match(self.path)
+        if not match:
+            return self._send(404, {"status": "failed", "message": "Not found"})
+        payload = self.server.transactions.get(match["tx_ref"])
+        if payload is None:
+            return self._send(404, {"status": "failed", "message": "Invalid transaction or Transaction not found", "data": None})
+        self._send(200, {
+            "message": "Payment details",
+            "status": "success",
+            "data": {
+                "status": self.server.statuses.get(match["tx_ref"], "success"),
+                "tx_ref": match["tx_ref"],
+                "amount": payload.get("amount"),
+            },
+        })
+
+    def _before_response(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send(401, {"status": "failed", "message": "Invalid API Key"})
+            return False
+        if self.server.failure_rate and random.random() < self.server.failure_rate:
+            self._send(503, {"status": "failed", "message": "Service Unavailable"})
+            return False
+        return True
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The socketserver default backlog of 5 drops connections under load
+    # tests, which then stall on SYN retries.
+    request_queue_size = 1024
+
+
+def make_server(host="127.0.0.1", port=0, latency=0, failure_rate=0, verbose=False):
+    """
+    Builds a stub Chapa server. Port 0 picks a free port; the bound address
+    is on `server.server_address`. Run it with `serve_forever()`, e.g. in a
+    daemon thread, and point CHAPA_BASE_URL at it. Transactions verify as
+    paid unless `server.statuses[tx_ref]` says otherwise (e.g. "pending").
+    """
+    server = StubServer((host, port), ChapaStubHandler)
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.verbose = verbose
+    server.transactions = {}
+    server.statuses = {}
+    return server
@@ -0,0 +1,107 @@
+import asyncio
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .cache import invalidate
+from .gateway import get_client
+from .models import BookedNight, Booking, BookingStatus, Payment, PaymentEventSource, PaymentStatus
+from .payments import apply_payment_result, verified_status, verify_many
+
+expired = metrics.SharedCounter(
+    'stale_bookings_expired_total', "Rows changed by expiring unpaid bookings.", 'kind',
+    ['booking', 'payment', 'night'],
+)
+
+
+def settle_with_gateway(booking_ids):
+    """
+    Verifies the pending payments of `booking_ids` with the gateway before
+    expiry fails them, and applies the outcomes it reports, so a guest who
+    paid as the booking went stale keeps it. Returns the ids of the bookings
+    whose payments the gateway could not be asked about.
+    """
+    payments = dict(
+        Payment.objects.filter(booking_id__in=booking_ids, payment_status=PaymentStatus.PENDING)
+        .values_list('transaction_id', 'booking_id')
+    )
+    if not payments or not get_client().configured:
+        return set()
+    unverified = set()
+    for tx_ref, chapa_data in asyncio.run(verify_many(list(payments))):
+        if chapa_data is None:
+            unverified.add(payments[tx_ref])
+            continue
+        status = verified_status(chapa_data)
+        if status is not None:
+            apply_payment_result(tx_ref, status, PaymentEventSource.RECONCILE, chapa_data)
+    return unverified
+
+
+def expire_batch(cutoff, batch_size):
+    """
+    Cancels up to `batch_size` bookings still pending since before `cutoff`,
+    fails their pending payments and frees their nights, in one short
+    transaction. The payments are verified with the gateway first, outside
+    the transaction; bookings it could not be asked about wait for the next
+    run. Returns the number of each kind of row changed.
+    """
+    candidates = list(
+        Booking.objects.filter(status=BookingStatus.PENDING, created_at__lt=cutoff)
+        .order_by('created_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return Counter()
+    unverified = settle_with_gateway(candidates)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Rows another worker holds are skipped rather than waited for.
+        # Bookings the verification found paid are no longer pending.
+        booking_ids = set(
+            Booking.objects.select_for_update(skip_locked=True)
+            .filter(id__in=candidates, status=BookingStatus.PENDING)
+            .exclude(id__in=unverified)
+            .values_list('id', flat=True)
+        )
+        if not booking_ids:
+            return Counter()
+        pending = Payment.objects.filter(booking_id__in=booking_ids, payment_status=PaymentStatus.PENDING)
+        payments = dict(pending.select_for_update(skip_locked=True).values_list('id', 'booking_id'))
+        # A payment locked elsewhere is being settled right now (see
+        # payments.apply_payment_result); leave its booking for the next run.
+        booking_ids -= set(pending.exclude(id__in=payments).values_list('booking_id', flat=True))
+
+        bookings = Booking.objects.filter(id__in=booking_ids).update(status=BookingStatus.CANCELLED, updated_at=now)
+        payment_ids = [payment_id for payment_id, booking_id in payments.items() if booking_id in booking_ids]
+        failed = Payment.objects.filter(id__in=payment_ids).update(payment_status=PaymentStatus.FAILED, updated_at=now)
+        nights, _ = BookedNight.objects.filter(booking_id__in=booking_ids).delete()
+        # Queryset updates send no signals.
+        invalidate('bookings')
+    return Counter(booking=bookings, payment=failed, night=nights)
+
+
+def expire_stale_bookings(batch_size=None, max_batches=None):
+    """
+    Expires bookings left unpaid for longer than BOOKING_PENDING_TTL seconds,
+    a batch at a time. Returns the number of bookings cancelled, payments
+    failed and nights freed.
+    """
+    batch_size = batch_size or settings.BOOKING_EXPIRY_BATCH_SIZE
+    max_batches = max_batches or settings.BOOKING_EXPIRY_MAX_BATCHES
+    cutoff = timezone.now() - timedelta(seconds=settings.BOOKING_PENDING_TTL)
+    totals = Counter()
+    for _ in range(max_batches):
+        changed = expire_batch(cutoff, batch_size)
+        if not changed['booking']:
+            break
+        for kind, count in changed.items():
+            if count:
+                expired.increment(kind, count)
+        totals += changed
+    return {kind: totals[kind] for kind in expired.values}
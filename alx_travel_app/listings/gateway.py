@@ -0,0 +1,298 @@
+import asyncio
+import os
+import random
+import ssl
+import threading
+import time
+import weakref
+
+import certifi
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+class GatewayUnavailable(requests.RequestException):
+    """Raised without calling the gateway while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls
+    for `reset_timeout` seconds. After that a single probe call is let
+    through; its outcome closes the breaker again or keeps it open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Re-arm the timer so only one probe goes out per window.
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ChapaClient:
+    """
+    HTTP client for the Chapa API.
+
+    Connections are kept alive in a pooled `requests.Session`. Sessions are
+    per thread and per process, so one client can be shared by threaded WSGI
+    workers and by forked Celery workers. Failed calls are retried with
+    exponential backoff and full jitter, and a circuit breaker makes calls
+    fail fast with `GatewayUnavailable` while the gateway is down.
+    """
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url, secret_key, connect_timeout=3.05, read_timeout=15,
+                 max_retries=2, backoff=0.5, backoff_max=5, pool_size=10, breaker=None):
+        self.base_url = (base_url or "").rstrip("/")
+        self.secret_key = secret_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._local = threading.local()
+
+    @property
+    def configured(self):
+        return bool(self.base_url and self.secret_key)
+
+    @property
+    def session(self):
+        # A session created before a fork must not be reused by the child.
+        if getattr(self._local, "pid", None) != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Authorization"] = f"Bearer {self.secret_key}"
+            self._local.session = session
+            self._local.pid = os.getpid()
+        return self._local.session
+
+    def initialize(self, payload):
+        return self.request("POST", "/transaction/initialize", json=payload).json()
+
+    def verify(self, tx_ref):
+        return self.request("GET", f"/transaction/verify/{tx_ref}").json()
+
+    def request(self, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise GatewayUnavailable(f"Chapa circuit breaker is open; not calling {path}.")
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries or not self._can_retry(method, e):
+                    self.breaker.record_failure()
+                    raise
+            else:
+                if response.status_code not in self.retry_statuses:
+                    self.breaker.record_success()
+                    return response
+                if attempt >= self.max_retries or method != "GET":
+                    self.breaker.record_failure()
+                    return response
+            attempt += 1
+            time.sleep(self.retry_delay(attempt))
+
+    def retry_delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _can_retry(method, error):
+        # A POST whose response timed out may have been processed, so only
+        # connection failures are retried for it. Chapa rejects a repeated
+        # tx_ref, which keeps those retries from opening a second transaction.
+        if method == "GET":
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return isinstance(error, requests.ConnectionError)
+
+
+class AsyncChapaClient(ChapaClient):
+    """
+    The same client for async views, on `httpx.AsyncClient`, so a waiting
+    gateway call does not hold a worker thread. It keeps one connection pool
+    per event loop, closed when the loop shuts down, and reports transport
+    errors as the matching `requests` exceptions, so callers handle both
+    clients alike.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {event loop: (httpx client, generator closing it)}, dropped with the loop.
+        self._clients = weakref.WeakKeyDictionary()
+        self._clients_lock = threading.Lock()
+        self._ssl_context = None
+
+    async def http(self):
+        """
+        The connection pool of the running loop. Pooled connections belong to
+        the loop that opened them: under ASGI that is one loop per worker
+        process, while async views served over WSGI and asyncio.run() callers
+        get a loop, and so a pool, per call.
+        """
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            entry = self._clients.get(loop)
+            # Loading the CA bundle takes tens of milliseconds; do it once.
+            if entry is None and self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+        if entry is None:
+            client = httpx.AsyncClient(
+                verify=self._ssl_context,
+                headers={"Authorization": f"Bearer {self.secret_key}"},
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            closer = self.close_at_shutdown(client)
+            # Runs to its yield without suspending, so no other task on this
+            # loop can open a second pool meanwhile.
+            await closer.asend(None)
+            entry = (client, closer)
+            with self._clients_lock:
+                self._clients[loop] = entry
+        return entry[0]
+
+    async def close_at_shutdown(self, client):
+        """
+        Holds `client` open until its loop shuts down: asyncio.run(), and so
+        asgiref and the ASGI servers, finish the async generators a loop
+        started before closing it, which runs the `finally` on that loop.
+        """
+        try:
+            yield
+        finally:
+            await client.aclose()
+            # Open connections refer to the loop, which would keep its entry.
+            with self._clients_lock:
+                self._clients.pop(asyncio.get_running_loop(), None)
+
+    async def initialize(self, payload):
+        return json_of(await self.request("POST", "/transaction/initialize", json=payload))
+
+    async def verify(self, tx_ref):
+        return json_of(await self.request("GET", f"/transaction/verify/{tx_ref}"))
+
+    async def request(self, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise GatewayUnavailable(f"Chapa circuit breaker is open; not calling {path}.")
+        http = await self.http()
+        attempt = 0
+        while True:
+            try:
+                response = await http.request(method, f"{self.base_url}{path}", **kwargs)
+            except httpx.TransportError as e:
+                error = as_requests_error(e)
+                if attempt >= self.max_retries or not self._can_retry(method, error):
+                    self.breaker.record_failure()
+                    raise error from e
+            else:
+                if response.status_code not in self.retry_statuses:
+                    self.breaker.record_success()
+                    return response
+                if attempt >= self.max_retries or method != "GET":
+                    self.breaker.record_failure()
+                    return response
+            attempt += 1
+            await asyncio.sleep(self.retry_delay(attempt))
+
+
+def json_of(response):
+    """
+    The body of an httpx response, raising a `requests` exception as
+    `requests` does when it is not JSON, e.g. a proxy's HTML error page.
+    """
+    try:
+        return response.json()
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(
+            f"Chapa answered {response.status_code} with a body that is not JSON: {e}") from e
+
+
+def as_requests_error(error):
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.ReadTimeout(str(error))
+    if isinstance(error, (httpx.ConnectError, httpx.RemoteProtocolError)):
+        return requests.ConnectionError(str(error))
+    return requests.RequestException(str(error))
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Returns the process-wide Chapa client built from settings."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ChapaClient(
+                    base_url=settings.CHAPA_BASE_URL,
+                    secret_key=settings.CHAPA_SECRET_KEY,
+                    connect_timeout=settings.CHAPA_CONNECT_TIMEOUT,
+                    read_timeout=settings.CHAPA_READ_TIMEOUT,
+                    max_retries=settings.CHAPA_MAX_RETRIES,
+                    pool_size=settings.CHAPA_POOL_SIZE,
+                    breaker=CircuitBreaker(
+                        failure_threshold=settings.CHAPA_BREAKER_THRESHOLD,
+                        reset_timeout=settings.CHAPA_BREAKER_RESET_SECONDS,
+                    ),
+                )
+    return _client
+
+
+def get_async_client():
+    """
+    Returns the process-wide async Chapa client. It shares the circuit
+    breaker of `get_client()`, so both see the gateway as down at once.
+    """
+    global _async_client
+    if _async_client is None:
+        sync_client = get_client()
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncChapaClient(
+                    base_url=settings.CHAPA_BASE_URL,
+                    secret_key=settings.CHAPA_SECRET_KEY,
+                    connect_timeout=settings.CHAPA_CONNECT_TIMEOUT,
+                    read_timeout=settings.CHAPA_READ_TIMEOUT,
+                    max_retries=settings.CHAPA_MAX_RETRIES,
+                    pool_size=settings.CHAPA_POOL_SIZE,
+                    breaker=sync_client.breaker,
+                )
+    return _async_client
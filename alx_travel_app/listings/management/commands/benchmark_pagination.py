@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from listings.models import Booking, Listing, Payment
+from listings.pagination import KeysetPagination
+
+TARGETS = {
+    'listings': Listing,
+    'bookings': Booking,
+    'payments': Payment,
+}
+
+
+def median_ms(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def cursor_for(paginator, key):
+    """The ?cursor= value KeysetPagination hands out for the page after the row with `key`."""
+    paginator.base_url = ''
+    return paginator.encode_cursor({'key': list(key), 'reverse': False}).split('cursor=', 1)[1]
+
+
+class Command(BaseCommand):
+    help = ("Measures how long the first and a deep page of the list endpoints take to fetch with keyset "
+            "cursors, against LIMIT/OFFSET at the same positions. Fill the database first with e.g. "
+            "`generate_data --database --listings 100000 --bookings-per-listing 10`.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=10000, help="The deep page to compare with page 1.")
+        parser.add_argument('--limit', type=int, default=20, help="Rows per page, as in ?limit=.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--targets', default='listings,bookings', help="Comma-separated: listings, bookings, payments.")
+
+    def handle(self, *args, **options):
+        # The paginator builds its links from the request's host.
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        page, limit, repeat = options['page'], options['limit'], options['repeat']
+        factory = APIRequestFactory()
+        for name in options['targets'].split(','):
+            if name not in TARGETS:
+                raise CommandError(f"Unknown target: {name}.")
+            queryset = TARGETS[name].objects.values()
+            paginator = KeysetPagination()
+            ordering = paginator.ordering
+            names = [field.lstrip('-') for field in ordering]
+            offset = (page - 1) * limit
+            boundary = queryset.order_by(*ordering).values_list(*names)[offset - 1:offset]
+            if offset < 1 or not boundary:
+                raise CommandError(f"{name}: fewer than {offset + 1} rows, so there is no page {page}; "
+                                   f"generate more data or pass a smaller --page.")
+            cursor = cursor_for(paginator, boundary[0])
+
+            def keyset(params):
+                request = Request(factory.get(f'/api/{name}/', {**params, 'limit': limit}))
+                return KeysetPagination().paginate_queryset(queryset, request)
+
+            rows = keyset({'cursor': cursor})
+            expected = list(queryset.order_by(*ordering)[offset:offset + limit])
+            if [row['id'] for row in rows] != [row['id'] for row in expected]:
+                raise CommandError(f"{name}: page {page} by cursor differs from page {page} by offset.")
+
+            self.stdout.write(f"{name}: page 1 vs page {page}, {limit} rows per page, median of {repeat}")
+            for label, first, deep in [
+                ('keyset', lambda: keyset({}), lambda: keyset({'cursor': cursor})),
+                ('offset', lambda: list(queryset.order_by(*ordering)[:limit]),
+                 lambda: list(queryset.order_by(*ordering)[offset:offset + limit])),
+            ]:
+                first_ms, deep_ms = median_ms(repeat, first), median_ms(repeat, deep)
+                self.stdout.write(
+                    f"  {label:>6}: {first_ms:>8.2f} ms -> {deep_ms:>8.2f} ms ({deep_ms / first_ms:.1f}x)"
+                )
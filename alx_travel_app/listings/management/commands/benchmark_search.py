@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from functools import reduce
+from operator import and_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from listings.models import Listing
+from listings.search import search_listings, tokenize
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def substring_search(terms):
+    """What clients did before: AND of icontains over title and description."""
+    conditions = [Q(title__icontains=term) | Q(description__icontains=term) for term in terms]
+    return Listing.objects.filter(reduce(and_, conditions))
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks listing search against the icontains scan it replaces, on queries drawn from the "
+            "listings in the database (fill it with generate_data first).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--terms', type=int, default=2, help="Words per query.")
+        parser.add_argument('--limit', type=int, default=20, help="Results per query.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        limit = options['limit']
+        total = Listing.objects.count()
+        if not total:
+            raise CommandError("No listings to search; run generate_data first.")
+
+        search_ms, scan_ms, full_scan_ms, recalls, precisions, title_ranks = [], [], [], [], [], []
+        for _ in range(options['queries']):
+            # A query made of words from one listing, so it has matches.
+            target = Listing.objects.order_by('id').values('id', 'title', 'description')[rng.randrange(total)]
+            words = list(dict.fromkeys(tokenize(f"{target['title']} {target['description']}")))
+            terms = rng.sample(words, min(options['terms'], len(words)))
+
+            results, elapsed = timed(lambda: search_listings(' '.join(terms), limit=limit))
+            search_ms.append(elapsed)
+            _, elapsed = timed(lambda: list(substring_search(terms).values_list('id', flat=True)[:limit]))
+            scan_ms.append(elapsed)
+
+            # Ranking needs every match, which the scan can only get by reading
+            # the whole table.
+            matches, elapsed = timed(lambda: list(substring_search(terms).values_list('id', 'title', 'description')))
+            full_scan_ms.append(elapsed)
+
+            # The relevant listings are all those containing every query term
+            # as a whole word; substring matching also hits "lofty" for "loft".
+            relevant = {
+                listing_id for listing_id, title, description in matches
+                if set(terms) <= set(tokenize(f"{title} {description}"))
+            }
+            in_title = {listing_id for listing_id, title, _ in matches if set(terms) <= set(tokenize(title))}
+            ranked = [listing.id for listing in results]
+            hits = len(relevant.intersection(ranked))
+            recalls.append(hits / min(limit, len(relevant)))
+            precisions.append(hits / len(ranked) if ranked else 0)
+            # Title matches are boosted, so as many as exist should lead.
+            if in_title:
+                title_ranks.append(len(in_title.intersection(ranked)) / min(limit, len(in_title)))
+
+        self.stdout.write(f"{options['queries']} queries of {options['terms']} words over {total} listings:")
+        timings = (('search', search_ms), (f'icontains, first {limit}', scan_ms), ('icontains, all', full_scan_ms))
+        for name, samples in timings:
+            self.stdout.write(
+                f"  {name:>20}: p50 {statistics.median(samples):.1f} ms, p95 {percentile(samples, 0.95):.1f} ms, "
+                f"max {max(samples):.1f} ms"
+            )
+        self.stdout.write(f"  recall@{limit}: {statistics.mean(recalls):.3f}, "
+                          f"precision@{limit}: {statistics.mean(precisions):.3f}")
+        if title_ranks:
+            self.stdout.write(f"  title matches in the top {limit} (of those possible): "
+                              f"{statistics.mean(title_ranks):.3f} over {len(title_ranks)} queries")
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from listings.management.commands.seed import BULK_TABLES, read_csv_generator
+from listings.models import Location, User
+from listings.regions import rebuild_regions
+
+# The tables both seed paths load; the per-row one has no payments.
+TABLES = [(label, model, csv_name) for label, model, csv_name, *_ in BULK_TABLES if label != 'Payment']
+
+
+def csv_ids(data_dir, csv_name):
+    return [row['id'] for row in read_csv_generator(os.path.join(data_dir, csv_name))]
+
+
+def remove_generated(data_dir, known_locations):
+    """Deletes what a seed run loaded from `data_dir`, with the locations and regions it added."""
+    # Listings, bookings and reviews all hang off the generated users.
+    User.objects.filter(id__in=csv_ids(data_dir, 'users.csv')).delete()
+    # generate_data keys locations on the place, so some may predate the run.
+    Location.objects.filter(id__in=csv_ids(data_dir, 'locations.csv')).exclude(id__in=known_locations).delete()
+    rebuild_regions()
+
+
+class Command(BaseCommand):
+    help = ("Times `seed` one get_or_create per row against `seed --bulk` on the same generate_data CSVs and "
+            "reports rows/sec of each. Each run starts from the same database: the generated rows are deleted "
+            "after it. Both include keeping the derived tables; the bulk path rebuilds them for the whole "
+            "database, so on a large one its figure is a lower bound.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=7, help="generate_data seed; its rows must not be loaded yet.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--locations', type=int, default=20)
+        parser.add_argument('--listings', type=int, default=200)
+        parser.add_argument('--bookings-per-listing', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as data_dir, open(os.devnull, 'w') as devnull:
+            call_command(
+                'generate_data', output_dir=data_dir, seed=options['seed'], users=options['users'],
+                locations=options['locations'], listings=options['listings'],
+                bookings_per_listing=options['bookings_per_listing'], stdout=devnull,
+            )
+            os.remove(os.path.join(data_dir, 'payments.csv'))
+            if User.objects.filter(id__in=csv_ids(data_dir, 'users.csv')).exists():
+                raise CommandError(f"Rows of --seed {options['seed']} are already in the database; pass another.")
+            known_locations = set(Location.objects.values_list('id', flat=True))
+            expected = {label: len(csv_ids(data_dir, csv_name)) for label, _, csv_name in TABLES}
+            rows = sum(expected.values())
+            self.stdout.write(", ".join(f"{count} {label.lower()}s" for label, count in expected.items()))
+
+            results = []
+            for name, seed_options in [
+                ('per-row', {}),
+                ('bulk', {'bulk': True, 'batch_size': options['batch_size'], 'workers': options['workers']}),
+            ]:
+                started = time.perf_counter()
+                try:
+                    call_command('seed', data_dir=data_dir, stdout=devnull, **seed_options)
+                    seconds = time.perf_counter() - started
+                    loaded = {
+                        label: model.objects.filter(id__in=csv_ids(data_dir, csv_name)).count()
+                        for label, model, csv_name in TABLES if label != 'Location'
+                    }
+                finally:
+                    remove_generated(data_dir, known_locations)
+                if any(loaded[label] != expected[label] for label in loaded):
+                    # Typically a generated location naming a place the
+                    # database holds under another id, which only --bulk merges.
+                    raise CommandError(f"{name}: loaded {loaded}, expected {expected}; "
+                                       f"run on a database without the generated places.")
+                results.append((name, seconds))
+                self.stdout.write(f"  {name:>7}: {rows} rows in {seconds:.1f}s ({rows / seconds:.0f} rows/s)")
+
+            (_, per_row_s), (_, bulk_s) = results
+            self.stdout.write(self.style.SUCCESS(f"bulk is {per_row_s / bulk_s:.1f}x the per-row rate"))
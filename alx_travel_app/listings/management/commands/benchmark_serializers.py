@@ -0,0 +1,74 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from listings.models import Booking, Listing
+from listings.renderers import FastJSONRenderer
+from listings.rows import compile_rows
+from listings.serializers import BookingSerializer, ListingSerializer
+
+TARGETS = {
+    'listings': (Listing, ListingSerializer),
+    'bookings': (Booking, BookingSerializer),
+}
+
+
+def best_of(repeat, fn):
+    """Runs `fn` `repeat` times; returns its last result and the median seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = ("Measures rows/sec of list serialization and JSON rendering: model instances through the "
+            "ModelSerializer and JSONRenderer, against .values() rows through the compiled fields and "
+            "FastJSONRenderer. Fails if the two produce different bytes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--expand', default='', help="As in ?expand=, e.g. location,host.")
+        parser.add_argument('--targets', default='listings,bookings', help="Comma-separated: listings, bookings.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        request = Request(APIRequestFactory().get('/', {'expand': options['expand']}))
+        for name in options['targets'].split(','):
+            if name not in TARGETS:
+                raise CommandError(f"Unknown target: {name}.")
+            model, serializer_class = TARGETS[name]
+            context = {'request': request}
+            plan = compile_rows(serializer_class(context=context))
+            if plan is None:
+                raise CommandError(f"{serializer_class.__name__} does not compile with expand={options['expand']!r}.")
+            columns, represent = plan
+            queryset = model.objects.order_by('-created_at', '-id')
+            expanded = [field for field in options['expand'].split(',') if field]
+            if expanded:
+                queryset = queryset.select_related(*expanded)
+
+            before, before_s = best_of(repeat, lambda: serializer_class(
+                list(queryset[:rows]), many=True, context=context).data)
+            after, after_s = best_of(repeat, lambda: [represent(row) for row in queryset.values(*columns)[:rows]])
+            before_json, before_render_s = best_of(repeat, lambda: JSONRenderer().render(before))
+            after_json, after_render_s = best_of(repeat, lambda: FastJSONRenderer().render(after))
+            if before_json != after_json:
+                raise CommandError(f"{name}: the compiled rows render differently from the serializer.")
+
+            count = len(before)
+            self.stdout.write(f"{name}: {count} rows, {len(before_json)} bytes")
+            for stage, old, new in [
+                ('query + serialize', before_s, after_s),
+                ('render', before_render_s, after_render_s),
+                ('total', before_s + before_render_s, after_s + after_render_s),
+            ]:
+                self.stdout.write(
+                    f"  {stage:>17}: {count / old:>9.0f} -> {count / new:>9.0f} rows/s ({old / new:.1f}x)"
+                )
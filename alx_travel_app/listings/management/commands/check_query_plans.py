@@ -0,0 +1,80 @@
+import json
+import re
+from datetime import date
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from listings.models import Payment, Role, Booking, BookingStatus, Listing, Review, BookedNight, SearchTerm
+
+
+def hot_queries():
+    """The lookups the API runs on every request, keyed by a readable name."""
+    some_id = uuid4()
+    start, end = date(2025, 1, 1), date(2025, 1, 8)
+    return {
+        'verify_payment: Payment by transaction_id': Payment.objects.filter(transaction_id='tx-ref'),
+        'PaymentListView: Payment by booking__guest': Payment.objects.filter(booking__guest_id=some_id),
+        'RoleSerializer.validate_name: Role by name': Role.objects.filter(name='host'),
+        'Booking overlap by listing and dates': Booking.objects.filter(
+            listing_id=some_id, start_date__lt=end, end_date__gt=start,
+            status__in=[BookingStatus.ACTIVE, BookingStatus.PENDING],
+        ),
+        'Listing by location and price': Listing.objects.filter(location_id=some_id, price_per_night__lte=100),
+        'Review by listing, newest first': Review.objects.filter(listing_id=some_id).order_by('-created_at'),
+        'Availability: booked nights in range': BookedNight.objects.filter(date__gte=start, date__lt=end),
+        'Listings in a country region': Listing.objects.filter(location__region__parent__parent_id=some_id),
+        'Search: postings by term': SearchTerm.objects.filter(term__in=['pool', 'wifi']).values('listing_id', 'weight'),
+    }
+
+
+def walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from walk(value)
+
+
+def full_scans(queryset):
+    """Returns the tables the database would read in full to answer `queryset`."""
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        return [
+            re.search(r'SCAN (\w+)', line).group(1)
+            for line in queryset.explain().splitlines()
+            if re.search(r'\bSCAN \w+', line) and 'INDEX' not in line
+        ]
+    if vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return [node['Relation Name'] for node in walk(plan) if node.get('Node Type') == 'Seq Scan']
+    if vendor == 'mysql':
+        plan = json.loads(queryset.explain(format='json'))
+        return [node['table_name'] for node in walk(plan) if node.get('access_type') == 'ALL']
+    raise CommandError(f"Don't know how to read {vendor} query plans.")
+
+
+class Command(BaseCommand):
+    help = "EXPLAINs the hot query paths and fails if any of them would scan a whole table."
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Tiny tables make a sequential scan look cheapest; the point
+                # here is whether an index *can* serve the query.
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset in hot_queries().items():
+                scanned = full_scans(queryset)
+                if scanned:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"✗ {name}: full scan of {', '.join(scanned)}"))
+                else:
+                    self.stdout.write(f"✓ {name}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries degrade to a full table scan.")
+        self.stdout.write(self.style.SUCCESS("✅ All hot queries use an index."))
@@ -0,0 +1,302 @@
+import csv
+import hashlib
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from listings.availability import RESERVING_STATUSES, booking_nights
+from listings.management.commands.seed import (
+    user_fields, location_fields, listing_fields, booking_fields, review_fields, payment_fields, write_batch,
+)
+from listings.ratings import recompute_ratings
+from listings.regions import rebuild_regions
+from listings.search import rebuild_search_index
+from listings.models import User, Location, Listing, Booking, Review, Payment, BookedNight
+
+# Rows are generated in fixed-size blocks, each with its own seeded RNG, so the
+# output depends only on --seed and the scale options, never on --batch-size,
+# and memory stays bounded by one block.
+BLOCK_SIZE = 1000
+
+FIRST_NAMES = ['Amina', 'Brian', 'Chloe', 'David', 'Esther', 'Femi', 'Grace', 'Hassan', 'Irene', 'Joseph',
+               'Kemi', 'Liam', 'Mercy', 'Noah', 'Olivia', 'Peter', 'Rahel', 'Samuel', 'Tendai', 'Wanjiru']
+LAST_NAMES = ['Abebe', 'Banda', 'Cohen', 'Diallo', 'Eze', 'Gathoni', 'Hailu', 'Kamau', 'Mensah', 'Moyo',
+              'Mwangi', 'Ndlovu', 'Okafor', 'Otieno', 'Phiri', 'Said', 'Smith', 'Tesfaye', 'Uwase', 'Zulu']
+PLACES = [
+    ('Kenya', 'Nairobi', 'Nairobi'), ('Kenya', 'Mombasa', 'Mombasa'), ('Ethiopia', 'Addis Ababa', 'Addis Ababa'),
+    ('Tanzania', 'Dar es Salaam', 'Dar es Salaam'), ('Nigeria', 'Lagos', 'Lagos'), ('Egypt', 'Cairo', 'Cairo'),
+    ('South Africa', 'Gauteng', 'Johannesburg'), ('South Africa', 'Western Cape', 'Cape Town'),
+    ('Rwanda', 'Kigali City', 'Kigali'), ('Uganda', 'Central', 'Kampala'), ('Ghana', 'Greater Accra', 'Accra'),
+    ('Zambia', 'Lusaka', 'Lusaka'), ('Morocco', 'Marrakesh-Safi', 'Marrakesh'), ('Senegal', 'Dakar', 'Dakar'),
+]
+ADJECTIVES = ['Cozy', 'Modern', 'Spacious', 'Quiet', 'Sunny', 'Charming', 'Rustic', 'Stylish', 'Bright', 'Historic']
+PLACE_TYPES = ['Studio', 'Loft', 'Apartment', 'Cottage', 'Villa', 'Cabin', 'Guesthouse', 'Suite', 'Bungalow']
+AMENITIES = ['wifi', 'pool', 'balcony', 'garden', 'parking', 'kitchen', 'workspace', 'fireplace', 'gym', 'sauna',
+             'rooftop terrace', 'ocean view', 'city view', 'air conditioning', 'washer', 'hot tub', 'breakfast',
+             'airport shuttle', 'pet friendly', 'self check-in', 'bbq grill', 'bathtub', 'projector', 'piano']
+COMMENTS = {
+    1: 'Not as described.', 2: 'Below expectations.', 3: 'Decent stay.',
+    4: 'Great location, would stay again.', 5: 'Amazing place! Very clean and comfortable.',
+}
+
+HEADERS = {
+    'users': ['id', 'username', 'first_name', 'last_name', 'email', 'is_staff', 'is_active', 'date_joined'],
+    'locations': ['id', 'country', 'state', 'city'],
+    'listings': ['id', 'title', 'price_per_night', 'description', 'image_url', 'created_at', 'updated_at', 'host', 'location'],
+    'bookings': ['id', 'start_date', 'end_date', 'total_price', 'status', 'created_at', 'updated_at', 'guest', 'listing'],
+    'reviews': ['id', 'rating', 'comment', 'created_at', 'updated_at', 'listing', 'guest'],
+    'payments': ['id', 'payment_status', 'amount', 'transaction_id', 'created_at', 'updated_at', 'booking'],
+}
+MODELS = {
+    'users': (User, user_fields), 'locations': (Location, location_fields), 'listings': (Listing, listing_fields),
+    'bookings': (Booking, booking_fields), 'reviews': (Review, review_fields), 'payments': (Payment, payment_fields),
+}
+
+
+def stable_uuid(seed, kind, index):
+    digest = hashlib.md5(f"{seed}:{kind}:{index}".encode()).digest()
+    return str(UUID(bytes=digest, version=4))
+
+
+def block_rng(seed, kind, block):
+    return random.Random(f"{seed}:{kind}:{block}")
+
+
+def timestamp(day, rng):
+    moment = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(seconds=rng.randrange(86400))
+    return moment.isoformat()
+
+
+class Generator:
+    """
+    Produces CSV-shaped rows (the format `seed` reads) for a synthetic dataset.
+
+    Every ID is derived from (seed, kind, index), so rows can reference each
+    other without keeping earlier tables in memory. Bookings are laid out per
+    listing one after another with random gaps, so they never overlap.
+    """
+
+    def __init__(self, seed, users, locations, listings, bookings_per_listing, review_rate, start):
+        self.seed = seed
+        self.users = users
+        self.hosts = max(1, users // 10)
+        self.locations = locations
+        self.listings = listings
+        self.bookings_per_listing = bookings_per_listing
+        self.review_rate = review_rate
+        self.start = start
+
+    def blocks(self, total):
+        for block in range(0, (total + BLOCK_SIZE - 1) // BLOCK_SIZE):
+            yield block, range(block * BLOCK_SIZE, min(total, (block + 1) * BLOCK_SIZE))
+
+    def place(self, index):
+        country, state, city = PLACES[index % len(PLACES)]
+        district = index // len(PLACES)
+        return country, state, city if district == 0 else f"{city} {district}"
+
+    def user_rows(self, block, indexes):
+        rng = block_rng(self.seed, 'users', block)
+        for i in indexes:
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            yield {
+                'id': stable_uuid(self.seed, 'user', i),
+                'username': f"user{self.seed}_{i}",
+                'first_name': first,
+                'last_name': last,
+                'email': f"{first}.{last}.{self.seed}_{i}@example.com".lower(),
+                'is_staff': False,
+                'is_active': True,
+                'date_joined': timestamp(self.start - timedelta(days=rng.randrange(365)), rng),
+            }
+
+    def location_id(self, index):
+        # Keyed on the place rather than the seed, so datasets generated with
+        # different seeds share their locations instead of duplicating them.
+        return stable_uuid('places', 'location', "|".join(self.place(index)))
+
+    def location_rows(self, block, indexes):
+        for i in indexes:
+            country, state, city = self.place(i)
+            yield {'id': self.location_id(i), 'country': country, 'state': state, 'city': city}
+
+    def listing_rows(self, block, indexes):
+        rng = block_rng(self.seed, 'listings', block)
+        # Separate stream, so adding amenities left the other fields unchanged.
+        amenity_rng = block_rng(self.seed, 'amenities', block)
+        for i in indexes:
+            location = rng.randrange(self.locations)
+            city = self.place(location)[2]
+            kind = rng.choice(PLACE_TYPES)
+            created = timestamp(self.start - timedelta(days=rng.randrange(180)), rng)
+            yield {
+                'id': stable_uuid(self.seed, 'listing', i),
+                'title': f"{rng.choice(ADJECTIVES)} {kind} in {city}",
+                'price_per_night': rng.randrange(15, 400),
+                'description': f"A {kind.lower()} in {city} for up to {rng.randrange(1, 9)} guests. "
+                               f"Features {', '.join(amenity_rng.sample(AMENITIES, amenity_rng.randrange(2, 6)))}.",
+                'image_url': f"https://example.com/images/listing{i}.jpg",
+                'created_at': created,
+                'updated_at': created,
+                'host': stable_uuid(self.seed, 'user', rng.randrange(self.hosts)),
+                'location': self.location_id(location),
+            }
+
+    def stay_rows(self, block, indexes):
+        """Returns the booking, review and payment rows for a block of listings."""
+        rng = block_rng(self.seed, 'stays', block)
+        bookings, reviews, payments = [], [], []
+        listings = self.listing_rows(block, indexes)
+        for i, listing in zip(indexes, listings):
+            day = self.start - timedelta(days=rng.randrange(90))
+            for n in range(rng.randrange(self.bookings_per_listing * 2 + 1)):
+                day += timedelta(days=rng.randrange(0, 10))
+                nights = rng.randrange(1, 8)
+                booking_id = stable_uuid(self.seed, f'booking:{i}', n)
+                guest = stable_uuid(self.seed, 'user', rng.randrange(self.users))
+                status = rng.choices(['active', 'pending', 'cancelled'], weights=[6, 2, 2])[0]
+                created = timestamp(day - timedelta(days=rng.randrange(1, 60)), rng)
+                total = listing['price_per_night'] * nights
+                bookings.append({
+                    'id': booking_id,
+                    'start_date': day.isoformat(),
+                    'end_date': (day + timedelta(days=nights)).isoformat(),
+                    'total_price': total,
+                    'status': status,
+                    'created_at': created,
+                    'updated_at': created,
+                    'guest': guest,
+                    'listing': listing['id'],
+                })
+                if status != 'cancelled':
+                    payments.append({
+                        'id': stable_uuid(self.seed, f'payment:{i}', n),
+                        'payment_status': 'success' if status == 'active' else 'pending',
+                        'amount': total,
+                        'transaction_id': stable_uuid(self.seed, f'tx:{i}', n),
+                        'created_at': created,
+                        'updated_at': created,
+                        'booking': booking_id,
+                    })
+                if status == 'active' and rng.random() < self.review_rate:
+                    rating = rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 8, 10])[0]
+                    reviewed = timestamp(day + timedelta(days=nights + rng.randrange(7)), rng)
+                    reviews.append({
+                        'id': stable_uuid(self.seed, f'review:{i}', n),
+                        'rating': rating,
+                        'comment': COMMENTS[rating],
+                        'created_at': reviewed,
+                        'updated_at': reviewed,
+                        'listing': listing['id'],
+                        'guest': guest,
+                    })
+                day += timedelta(days=nights)
+        return bookings, reviews, payments
+
+    def tables(self):
+        """Yields (table, rows) chunks in foreign key order."""
+        for block, indexes in self.blocks(self.users):
+            yield 'users', list(self.user_rows(block, indexes))
+        for block, indexes in self.blocks(self.locations):
+            yield 'locations', list(self.location_rows(block, indexes))
+        for block, indexes in self.blocks(self.listings):
+            yield 'listings', list(self.listing_rows(block, indexes))
+        for block, indexes in self.blocks(self.listings):
+            bookings, reviews, payments = self.stay_rows(block, indexes)
+            yield 'bookings', bookings
+            yield 'reviews', reviews
+            yield 'payments', payments
+
+
+class Command(BaseCommand):
+    help = "Generates a reproducible synthetic dataset, either as seed-compatible CSVs or straight into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--locations', type=int, default=100)
+        parser.add_argument('--listings', type=int, default=1000)
+        parser.add_argument('--bookings-per-listing', type=int, default=10, help="Average bookings per listing.")
+        parser.add_argument('--review-rate', type=float, default=0.3, help="Share of active bookings that get a review.")
+        parser.add_argument('--start-date', type=date.fromisoformat, default=date(2025, 1, 1),
+                            help="Dates are spread around this day (YYYY-MM-DD).")
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--output-dir', help="Write users.csv, listings.csv, ... here for `seed --bulk --data-dir`.")
+        target.add_argument('--database', action='store_true', help="Bulk insert straight into the database.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert (--database).")
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['locations']) < 1 and options['listings']:
+            raise CommandError("Listings need at least one user and one location.")
+        generator = Generator(
+            seed=options['seed'],
+            users=options['users'],
+            locations=options['locations'],
+            listings=options['listings'],
+            bookings_per_listing=options['bookings_per_listing'],
+            review_rate=options['review_rate'],
+            start=options['start_date'],
+        )
+        started = time.monotonic()
+        if options['output_dir']:
+            counts = self.write_csv(generator, options['output_dir'])
+        else:
+            counts = self.write_database(generator, options['batch_size'])
+
+        total = sum(counts.values())
+        elapsed = time.monotonic() - started
+        summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Generated {summary} in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
+
+    def write_csv(self, generator, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        files = {table: open(os.path.join(output_dir, f"{table}.csv"), 'w', newline='') for table in HEADERS}
+        counts = dict.fromkeys(HEADERS, 0)
+        try:
+            writers = {table: csv.DictWriter(f, fieldnames=HEADERS[table]) for table, f in files.items()}
+            for writer in writers.values():
+                writer.writeheader()
+            for table, rows in generator.tables():
+                writers[table].writerows(rows)
+                counts[table] += len(rows)
+                self.report(table, counts[table], len(rows))
+        finally:
+            for f in files.values():
+                f.close()
+        return counts
+
+    def write_database(self, generator, batch_size):
+        counts = dict.fromkeys(HEADERS, 0)
+        for table, rows in generator.tables():
+            model, parse = MODELS[table]
+            for offset in range(0, len(rows), batch_size):
+                counts[table] += write_batch(model, [model(**parse(row)) for row in rows[offset:offset + batch_size]])
+            # Bulk inserts skip the signals that maintain the derived tables:
+            # the search index, the availability calendar and the ratings.
+            if table == 'listings':
+                rebuild_search_index(listing_ids=[row['id'] for row in rows], batch_size=batch_size)
+            if table == 'bookings':
+                nights = [
+                    BookedNight(booking_id=row['id'], listing_id=row['listing'], date=night)
+                    for row in rows if row['status'] in RESERVING_STATUSES
+                    for night in booking_nights(row['start_date'], row['end_date'])
+                ]
+                for offset in range(0, len(nights), batch_size):
+                    write_batch(BookedNight, nights[offset:offset + batch_size])
+            if table == 'reviews' and rows:
+                recompute_ratings(listing_ids={row['listing'] for row in rows})
+            self.report(table, counts[table], len(rows))
+        # Places new locations in the region tree, folding any that name a
+        # place already in the database into it, and counts the listings.
+        rebuild_regions()
+        return counts
+
+    def report(self, table, count, added):
+        # Roughly one progress line per 100k rows of a table.
+        if count // 100000 != (count - added) // 100000:
+            self.stdout.write(f"[{table}] {count} rows")
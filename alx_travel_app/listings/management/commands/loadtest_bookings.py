@@ -0,0 +1,93 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+from listings.management.commands.benchmark_search import percentile
+from listings.models import Listing, Location, User
+from listings.regions import shift_listing_counts
+from listings.views import BookingViewSet
+
+create_booking = BookingViewSet.as_view({'post': 'create'})
+
+
+def post_booking(guest, listing_id, start_date, end_date):
+    """POSTs one booking through BookingViewSet; returns the status code and milliseconds taken."""
+    request = APIRequestFactory().post('/api/bookings/', {
+        'listing': str(listing_id), 'guest': str(guest.id),
+        'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+    }, format='json')
+    force_authenticate(request, user=guest)
+    started = time.perf_counter()
+    try:
+        status = create_booking(request).status_code
+    finally:
+        # Each thread has its own connection; close it before the pool
+        # thread goes away.
+        connection.close()
+    return status, (time.perf_counter() - started) * 1000
+
+
+def post_bookings(guest, listing_ids, start_date, end_date, concurrency):
+    """
+    Books `start_date` to `end_date` at each of `listing_ids` (repeats
+    allowed) from `concurrency` threads at once. The Celery tasks a booking
+    queues are not sent. Returns the status codes, the latencies and the
+    wall time.
+    """
+    started = time.perf_counter()
+    with mock.patch.multiple('listings.views', send_booking_confirmation_email=mock.DEFAULT,
+                             initialize_booking_payment=mock.DEFAULT):
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda listing_id: post_booking(guest, listing_id, start_date, end_date),
+                                    listing_ids))
+    return [status for status, _ in results], [ms for _, ms in results], time.perf_counter() - started
+
+
+def loadtest_listings(count, location):
+    """A throwaway host with `count` listings, for the load test to book."""
+    host = User.objects.create_user(username=f'loadtest-{uuid.uuid4().hex[:12]}')
+    listings = Listing.objects.bulk_create([
+        Listing(title=f'Load test {n}', price_per_night=100, host=host, location=location) for n in range(count)
+    ])
+    # Counted like saved listings, since deleting the host uncounts them.
+    shift_listing_counts({location.id: count})
+    return host, [listing.id for listing in listings]
+
+
+class Command(BaseCommand):
+    help = ("Fires parallel booking creates at one listing, which exactly one must win, then at as many "
+            "different listings, which must all succeed, and reports the throughput of both.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        location = Location.objects.first()
+        if location is None:
+            raise CommandError("No locations to put test listings in; run seed first.")
+        count, concurrency = options['requests'], options['concurrency']
+        host, listing_ids = loadtest_listings(count + 1, location)
+        contested, listing_ids = listing_ids[0], listing_ids[1:]
+        guest = User.objects.create_user(username=f'loadtest-{uuid.uuid4().hex[:12]}')
+        start_date, end_date = date(2099, 1, 1), date(2099, 1, 4)
+        try:
+            for name, targets in [('one listing', [contested] * count), ('different listings', listing_ids)]:
+                statuses, latencies, seconds = post_bookings(guest, targets, start_date, end_date, concurrency)
+                created = statuses.count(201)
+                self.stdout.write(
+                    f"{name:>18}: {created} created, {statuses.count(400)} rejected of {count}; "
+                    f"{count / seconds:.0f} req/s, p50 {percentile(latencies, 0.5):.1f} ms, "
+                    f"p95 {percentile(latencies, 0.95):.1f} ms"
+                )
+                expected = 1 if name == 'one listing' else count
+                if created != expected or statuses.count(400) != count - expected:
+                    raise CommandError(f"{name}: expected {expected} bookings to be created, got {created}.")
+        finally:
+            host.delete()
+            guest.delete()
@@ -0,0 +1,138 @@
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from listings.chapa_stub import make_server
+from listings.management.commands.benchmark_search import percentile
+from listings.models import Booking, Payment
+
+SERVERS = {
+    'gunicorn': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'alx_travel_app.wsgi:application', '--worker-class', 'sync',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+    ],
+    'uvicorn': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'alx_travel_app.asgi:application', '--workers', str(workers),
+        '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning',
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = ("Load tests the payment verification endpoint, which waits on the gateway, under gunicorn sync "
+            "workers and under uvicorn with the async views, against a local stub gateway with added latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='gunicorn,uvicorn', help="Comma-separated: gunicorn, uvicorn.")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes per server.")
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--latency-ms', type=int, default=200, help="Delay the stub gateway adds to each call.")
+        parser.add_argument('--port', type=int, default=8800, help="Port the app servers listen on.")
+
+    def handle(self, *args, **options):
+        servers = options['servers'].split(',')
+        unknown = set(servers) - SERVERS.keys()
+        if unknown:
+            raise CommandError(f"Unknown servers: {', '.join(sorted(unknown))}.")
+
+        stub = make_server(latency=options['latency_ms'] / 1000)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        host, stub_port = stub.server_address[:2]
+        booking = Booking.objects.first()
+        if booking is None:
+            raise CommandError("No bookings to attach test payments to; run seed first.")
+        # Payments the gateway keeps reporting as pending, so each request
+        # makes one read and one gateway call and writes nothing.
+        tx_refs = [str(uuid.uuid4()) for _ in range(options['requests'])]
+        for tx_ref in tx_refs:
+            stub.transactions[tx_ref] = {"amount": 100}
+            stub.statuses[tx_ref] = "pending"
+        Payment.objects.bulk_create(
+            [Payment(booking=booking, transaction_id=tx_ref, amount=100) for tx_ref in tx_refs], batch_size=500,
+        )
+
+        env = {
+            **os.environ,
+            'CHAPA_BASE_URL': f'http://{host}:{stub_port}/v1',
+            'CHAPA_SECRET_KEY': 'stub',
+            'CHAPA_POOL_SIZE': str(options['concurrency']),
+        }
+        self.stdout.write(
+            f"{options['requests']} verify requests, {options['concurrency']} at a time, "
+            f"{options['workers']} workers, gateway latency {options['latency_ms']} ms:"
+        )
+        try:
+            for name in servers:
+                self.stdout.write(f"  {name:>8}: {self.run_server(name, env, tx_refs, options)}")
+        finally:
+            stub.shutdown()
+            stub.server_close()
+            Payment.objects.filter(transaction_id__in=tx_refs).delete()
+
+    def run_server(self, name, env, tx_refs, options):
+        base_url = f"http://127.0.0.1:{options['port']}"
+        process = subprocess.Popen(
+            SERVERS[name](options['port'], options['workers']), cwd=settings.BASE_DIR, env=env,
+            start_new_session=True,
+        )
+        try:
+            self.wait_until_up(base_url, process)
+            elapsed, latencies, errors = self.load(base_url, tx_refs, options['concurrency'])
+        finally:
+            # The masters stop their workers; the group kill is for stragglers.
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+        return (
+            f"{len(tx_refs) / elapsed:.1f} req/s, p50 {statistics.median(latencies):.0f} ms, "
+            f"p95 {percentile(latencies, 0.95):.0f} ms, {errors} errors"
+        )
+
+    @staticmethod
+    def wait_until_up(base_url, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with status {process.returncode}.")
+            try:
+                requests.get(f"{base_url}/api/", timeout=5)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not come up within {timeout} seconds.")
+
+    @staticmethod
+    def load(base_url, tx_refs, concurrency):
+        """Returns (seconds taken, per-request latencies in ms, failed requests)."""
+        local = threading.local()
+
+        def verify(tx_ref):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                response = local.session.get(f"{base_url}/api/payments/verify/{tx_ref}/", timeout=120)
+                failed = response.status_code != 200
+            except requests.RequestException:
+                failed = True
+            return (time.perf_counter() - started) * 1000, failed
+
+        # Client threads rather than an async client: on a small machine the
+        # generator shares the CPU with the servers, and threads are cheaper.
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(verify, tx_refs))
+        return time.perf_counter() - started, [latency for latency, _ in results], sum(failed for _, failed in results)
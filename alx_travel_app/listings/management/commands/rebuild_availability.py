@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.availability import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the listing availability calendar from active and pending bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_availability(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Availability rebuilt: {total} booked nights."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from listings.regions import rebuild_regions
+
+
+class Command(BaseCommand):
+    help = "Merges duplicate locations and rebuilds the country/state/city region tree and its listing counts."
+
+    def handle(self, *args, **options):
+        merged, placed, recounted = rebuild_regions()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Regions rebuilt: {merged} duplicate locations merged, {placed} placed, {recounted} counts corrected."
+        ))
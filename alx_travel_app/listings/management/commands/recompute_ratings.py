@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = "Recomputes the listing rating aggregates from the reviews and fixes any that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = recompute_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Ratings recomputed: {fixed} listings corrected."))
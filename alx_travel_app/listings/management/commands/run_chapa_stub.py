@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from listings.chapa_stub import make_server
+
+
+class Command(BaseCommand):
+    help = "Runs a local stub of the Chapa API for development, tests and latency benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=int, default=0, help="Delay added to every response.")
+        parser.add_argument('--failure-rate', type=float, default=0, help="Share of requests answered with 503 (0-1).")
+
+    def handle(self, *args, **options):
+        server = make_server(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency_ms'] / 1000,
+            failure_rate=options['failure_rate'],
+            verbose=options['verbosity'] > 1,
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f"Chapa stub listening on http://{host}:{port} (set CHAPA_BASE_URL to it)"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,53 @@
+import time
+
+from celery.contrib.testing.worker import start_worker
+from celery.signals import task_prerun
+from django.core.management.base import BaseCommand, CommandError
+from alx_travel_app.celery import app
+from listings import metrics, tasks
+
+PERIODIC_TASKS = ['drain_email_outbox', 'reconcile_pending_payments', 'expire_stale_bookings']
+
+
+class Command(BaseCommand):
+    help = ("Starts a worker inside this process on the in-memory broker (CELERY_BROKER_URL=memory://) and sends "
+            "it tasks through the normal routing, to check queues, limits and task metrics without RabbitMQ.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('tasks', nargs='*', default=PERIODIC_TASKS,
+                            help="Task names in listings.tasks that take no arguments (default: the beat tasks).")
+        parser.add_argument('--timeout', type=float, default=120, help="Seconds to wait for each task.")
+
+    def handle(self, *args, **options):
+        if not app.conf.broker_url.startswith('memory://'):
+            raise CommandError("Set CELERY_BROKER_URL=memory:// (prefixed with the environment) to use this command.")
+        unknown = [name for name in options['tasks'] if not hasattr(tasks, name)]
+        if unknown:
+            raise CommandError(f"Unknown tasks: {', '.join(unknown)}.")
+        if app.conf.task_always_eager:
+            raise CommandError("CELERY_TASK_ALWAYS_EAGER runs tasks without the broker; unset it to use this command.")
+
+        queues = {}
+
+        def remember_queue(task_id=None, task=None, **kwargs):
+            queues[task_id] = task.request.delivery_info.get('routing_key')
+
+        task_prerun.connect(remember_queue, weak=False)
+        try:
+            with start_worker(app, pool='solo', perform_ping_check=False, loglevel='WARNING'):
+                for name in options['tasks']:
+                    started = time.monotonic()
+                    result = getattr(tasks, name).delay()
+                    try:
+                        value = result.get(timeout=options['timeout'])
+                    except Exception as e:
+                        value = f"{type(e).__name__}: {e}"
+                    self.stdout.write(
+                        f"{name}: queue {queues.get(result.id)}, {result.state} in "
+                        f"{time.monotonic() - started:.2f} s -> {value}"
+                    )
+        finally:
+            task_prerun.disconnect(remember_queue)
+
+        self.stdout.write('\n'.join(line for line in metrics.render().splitlines() if 'celery_task' in line
+                                    and not line.startswith('celery_task_duration_seconds_bucket')))
@@ -1,10 +1,18 @@
 import csv
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from uuid import UUID
 from datetime import datetime
 
 from django.core.management.base import BaseCommand
-from listings.models import User, Location, Listing, Booking, Review
+from django.db import connections, transaction
+from listings.availability import rebuild_availability
+from listings.ratings import recompute_ratings
+from listings.regions import rebuild_regions
+from listings.search import rebuild_search_index
+from listings.models import User, Location, Listing, Booking, Review, Payment
 
 def read_csv_generator(csv_file):
     with open(csv_file, 'r') as f:
@@ -28,21 +36,82 @@ def parse_datetime(value):
     except Exception:
         return None
 
+def user_fields(row):
+    return {
+        'id': parse_uuid(row['id']),
+        'username': row['username'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'email': row['email'],
+        'is_staff': parse_bool(row['is_staff']),
+        'is_active': parse_bool(row['is_active']),
+        'date_joined': row['date_joined'],
+    }
+
+def location_fields(row):
+    return {
+        'id': parse_uuid(row['id']),
+        'country': row['country'],
+        'state': row['state'],
+        'city': row['city'],
+    }
+
+def listing_fields(row):
+    return {
+        'id': parse_uuid(row['id']),
+        'title': row['title'],
+        'price_per_night': float(row['price_per_night']),
+        'description': row['description'],
+        'image_url': row['image_url'],
+        'created_at': parse_datetime(row['created_at']),
+        'updated_at': parse_datetime(row['updated_at']),
+        'host_id': parse_uuid(row['host']),
+        'location_id': parse_uuid(row['location']),
+    }
+
+def booking_fields(row):
+    return {
+        'id': parse_uuid(row['id']),
+        'start_date': parse_datetime(row['start_date']),
+        'end_date': parse_datetime(row['end_date']),
+        'total_price': float(row['total_price']),
+        'status': row['status'],
+        'created_at': parse_datetime(row['created_at']),
+        'updated_at': parse_datetime(row['updated_at']),
+        'guest_id': parse_uuid(row['guest']),
+        'listing_id': parse_uuid(row['listing']),
+    }
+
+def review_fields(row):
+    return {
+        'id': parse_uuid(row['id']),
+        'rating': int(row['rating']),
+        'comment': row['comment'],
+        'created_at': parse_datetime(row['created_at']),
+        'updated_at': parse_datetime(row['updated_at']),
+        'listing_id': parse_uuid(row['listing']),
+        'guest_id': parse_uuid(row['guest']),
+    }
+
+def payment_fields(row):
+    return {
+        'id': parse_uuid(row['id']),
+        'payment_status': row['payment_status'],
+        'amount': int(row['amount']),
+        'transaction_id': row['transaction_id'],
+        'created_at': parse_datetime(row['created_at']),
+        'updated_at': parse_datetime(row['updated_at']),
+        'booking_id': parse_uuid(row['booking']),
+    }
+
+def get_or_create_from(model, fields):
+    fields = dict(fields)
+    return model.objects.get_or_create(id=fields.pop('id'), defaults=fields)
+
 def populate_user_table(csv_file, stdout):
     for row in read_csv_generator(csv_file):
         try:
-            user, created = User.objects.get_or_create(
-                id=parse_uuid(row['id']),
-                defaults={
-                    'username': row['username'],
-                    'first_name': row['first_name'],
-                    'last_name': row['last_name'],
-                    'email': row['email'],
-                    'is_staff': parse_bool(row['is_staff']),
-                    'is_active': parse_bool(row['is_active']),
-                    'date_joined': row['date_joined'],
-                }
-            )
+            user, created = get_or_create_from(User, user_fields(row))
             action = "Created" if created else "Exists"
             stdout.write(f"[User] {action}: {user.username}")
         except Exception as e:
@@ -51,14 +120,7 @@ def populate_user_table(csv_file, stdout):
 def populate_location_table(csv_file, stdout):
     for row in read_csv_generator(csv_file):
         try:
-            location, created = Location.objects.get_or_create(
-                id=parse_uuid(row['id']),
-                defaults={
-                    'country': row['country'],
-                    'state': row['state'],
-                    'city': row['city'],
-                }
-            )
+            location, created = get_or_create_from(Location, location_fields(row))
             action = "Created" if created else "Exists"
             stdout.write(f"[Location] {action}: {location.city}")
         except Exception as e:
@@ -67,19 +129,7 @@ def populate_location_table(csv_file, stdout):
 def populate_listing_table(csv_file, stdout):
     for row in read_csv_generator(csv_file):
         try:
-            listing, created = Listing.objects.get_or_create(
-                id=parse_uuid(row['id']),
-                defaults={
-                    'title': row['title'],
-                    'price_per_night': float(row['price_per_night']),
-                    'description': row['description'],
-                    'image_url': row['image_url'],
-                    'created_at': parse_datetime(row['created_at']),
-                    'updated_at': parse_datetime(row['updated_at']),
-                    'host_id': parse_uuid(row['host']),
-                    'location_id': parse_uuid(row['location']),
-                }
-            )
+            listing, created = get_or_create_from(Listing, listing_fields(row))
             action = "Created" if created else "Exists"
             stdout.write(f"[Listing] {action}: {listing.title}")
         except Exception as e:
@@ -88,19 +138,7 @@ def populate_listing_table(csv_file, stdout):
 def populate_booking_table(csv_file, stdout):
     for row in read_csv_generator(csv_file):
         try:
-            booking, created = Booking.objects.get_or_create(
-                id=parse_uuid(row['id']),
-                defaults={
-                    'start_date': parse_datetime(row['start_date']),
-                    'end_date': parse_datetime(row['end_date']),
-                    'total_price': float(row['total_price']),
-                    'status': row['status'],
-                    'created_at': parse_datetime(row['created_at']),
-                    'updated_at': parse_datetime(row['updated_at']),
-                    'guest_id': parse_uuid(row['guest']),
-                    'listing_id': parse_uuid(row['listing']),
-                }
-            )
+            booking, created = get_or_create_from(Booking, booking_fields(row))
             action = "Created" if created else "Exists"
             stdout.write(f"[Booking] {action}: {booking.id}")
         except Exception as e:
@@ -109,29 +147,110 @@ def populate_booking_table(csv_file, stdout):
 def populate_review_table(csv_file, stdout):
     for row in read_csv_generator(csv_file):
         try:
-            review, created = Review.objects.get_or_create(
-                id=parse_uuid(row['id']),
-                defaults={
-                    'rating': int(row['rating']),
-                    'comment': row['comment'],
-                    'created_at': parse_datetime(row['created_at']),
-                    'updated_at': parse_datetime(row['updated_at']),
-                    'listing_id': parse_uuid(row['listing']),
-                    'guest_id': parse_uuid(row['guest']),
-                }
-            )
+            review, created = get_or_create_from(Review, review_fields(row))
             action = "Created" if created else "Exists"
             stdout.write(f"[Review] {action}: {review.id}")
         except Exception as e:
             stdout.write(f"[Review] Error: {e}")
 
+
+# Bulk mode: (label, model, csv file, field parser, {fk attribute: label of the referenced table})
+BULK_TABLES = [
+    ('User', User, 'users.csv', user_fields, {}),
+    ('Location', Location, 'locations.csv', location_fields, {}),
+    ('Listing', Listing, 'listings.csv', listing_fields, {'host_id': 'User', 'location_id': 'Location'}),
+    ('Booking', Booking, 'bookings.csv', booking_fields, {'guest_id': 'User', 'listing_id': 'Listing'}),
+    ('Review', Review, 'reviews.csv', review_fields, {'listing_id': 'Listing', 'guest_id': 'User'}),
+    ('Payment', Payment, 'payments.csv', payment_fields, {'booking_id': 'Booking'}),
+]
+
+def write_batch(model, objs):
+    with transaction.atomic():
+        model.objects.bulk_create(objs, ignore_conflicts=True)
+    return len(objs)
+
+def write_batch_in_thread(model, objs):
+    try:
+        return write_batch(model, objs)
+    finally:
+        # Worker threads each open their own connection; close it so the
+        # pool does not leave idle connections behind.
+        connections.close_all()
+
+def bulk_load(label, model, rows, parse, fk_checks, known_ids, stdout, batch_size=5000, workers=1):
+    """
+    Streams `rows` into `model` in batches of `batch_size`, each written with
+    bulk_create(ignore_conflicts=True) in its own transaction, so rows that
+    already exist are skipped. Foreign keys are checked against the ID sets
+    in `known_ids` rather than the database, and the IDs of loaded rows are
+    added to `known_ids[label]` for the tables loaded after this one.
+    Returns (rows written, rows skipped).
+    """
+    ids = known_ids.setdefault(label, set())
+    skipped = 0
+    started = time.monotonic()
+
+    def batches():
+        nonlocal skipped
+        while True:
+            batch = []
+            seen = 0
+            for row in islice(rows, batch_size):
+                seen += 1
+                try:
+                    fields = parse(row)
+                except Exception as e:
+                    stdout.write(f"[{label}] Skipped row: {e}")
+                    skipped += 1
+                    continue
+                missing = [attr for attr, ref in fk_checks.items() if fields[attr] not in known_ids[ref]]
+                if fields['id'] is None or missing:
+                    skipped += 1
+                    continue
+                ids.add(fields['id'])
+                batch.append(model(**fields))
+            if not seen:
+                return
+            if batch:
+                yield batch
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch in batches():
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += sum(future.result() for future in done)
+                elapsed = time.monotonic() - started
+                stdout.write(f"[{label}] {written} rows ({written / elapsed:.0f} rows/s)")
+            pending.add(executor.submit(write_batch_in_thread, model, batch))
+        written += sum(future.result() for future in pending)
+
+    elapsed = time.monotonic() - started
+    stdout.write(f"[{label}] Done: {written} rows, {skipped} skipped in {elapsed:.1f}s "
+                 f"({written / elapsed if elapsed else 0:.0f} rows/s)")
+    return written, skipped
+
 class Command(BaseCommand):
     help = "Populates the database with sample data from CSV files."
 
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(BASE_DIR, '..', 'data')
 
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk', action='store_true',
+                            help="Stream the CSVs through batched bulk inserts instead of one get_or_create per row.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert (bulk mode).")
+        parser.add_argument('--workers', type=int, default=1, help="Parallel insert threads per table (bulk mode).")
+        parser.add_argument('--data-dir', default=None,
+                            help="Directory holding the CSVs, e.g. the output of generate_data.")
+
     def handle(self, *args, **options):
+        if options['data_dir']:
+            self.data_dir = options['data_dir']
+        if options['bulk']:
+            return self.handle_bulk(options['batch_size'], options['workers'])
+
         users_csv = os.path.join(self.data_dir, 'users.csv')
         populate_user_table(users_csv, self.stdout)
 
@@ -148,3 +267,34 @@ class Command(BaseCommand):
         populate_review_table(reviews_csv, self.stdout)
 
         self.stdout.write(self.style.SUCCESS("✅ Database populated successfully!"))
+
+    def handle_bulk(self, batch_size, workers):
+        started = time.monotonic()
+        # IDs already in the database for every table that is referenced.
+        referenced = {ref for *_, fk_checks in BULK_TABLES for ref in fk_checks.values()}
+        known_ids = {
+            label: set(model.objects.values_list('id', flat=True).iterator(chunk_size=batch_size))
+            for label, model, *_ in BULK_TABLES if label in referenced
+        }
+
+        total = 0
+        for label, model, csv_name, parse, fk_checks in BULK_TABLES:
+            csv_file = os.path.join(self.data_dir, csv_name)
+            if not os.path.exists(csv_file):
+                self.stdout.write(f"[{label}] No {csv_name}, skipping.")
+                continue
+            rows = read_csv_generator(csv_file)
+            written, _ = bulk_load(label, model, rows, parse, fk_checks, known_ids, self.stdout,
+                                   batch_size=batch_size, workers=workers)
+            total += written
+
+        # Bulk inserts skip the model signals that maintain derived tables.
+        rebuild_regions()
+        rebuild_availability(batch_size=batch_size)
+        recompute_ratings()
+        rebuild_search_index(batch_size=batch_size)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Database populated successfully! {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)"
+        ))
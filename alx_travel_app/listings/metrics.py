@@ -0,0 +1,183 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_help = {}
+_types = {}
+_buckets = {}
+_collectors = []
+_shared = []
+
+
+def describe(name, text, kind='counter', buckets=None):
+    _help[name] = text
+    _types[name] = kind
+    if buckets is not None:
+        _buckets[name] = list(buckets)
+
+
+def increment(name, amount=1, **labels):
+    """Adds `amount` to the process-local counter `name` with the given labels."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += amount
+
+
+def observe(name, value, **labels):
+    """
+    Records `value` in the process-local histogram `name`, whose bucket
+    bounds were given to describe().
+    """
+    buckets = _buckets[name]
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        # Per-bucket counts, the +Inf bucket, then the sum and the count.
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(buckets) + 3)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+
+def histogram_samples(name, labels, counts):
+    bounds = [f'{bound:g}' for bound in _buckets[name]] + ['+Inf']
+    cumulative = 0
+    samples = []
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        samples.append((f'{name}_bucket', labels + (('le', bound),), cumulative))
+    samples.append((f'{name}_sum', labels, counts[-2]))
+    samples.append((f'{name}_count', labels, counts[-1]))
+    return samples
+
+
+def register_collector(collect):
+    """
+    Registers `collect()`, called on every scrape, which returns
+    [(name, labels dict, value)] for gauges read from the database.
+    """
+    _collectors.append(collect)
+    return collect
+
+
+def add_shared(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+class SharedCounter:
+    """
+    Counter kept in the cache rather than in the process, so Celery workers
+    and web processes add to the same value when the cache is shared (Redis).
+    Labels are declared upfront since cache keys cannot be listed; `values`
+    may be a callable returning them at scrape time.
+    """
+
+    def __init__(self, name, text, label, values):
+        describe(name, text)
+        self.name, self.label, self._values = name, label, values
+        _shared.append(self)
+
+    @property
+    def values(self):
+        return self._values() if callable(self._values) else self._values
+
+    def increment(self, value, amount=1):
+        add_shared(f'metrics:{self.name}:{value}', amount)
+
+    def samples(self):
+        values = self.values
+        stored = cache.get_many([f'metrics:{self.name}:{value}' for value in values])
+        return [(self.name, ((self.label, value),), stored.get(f'metrics:{self.name}:{value}', 0))
+                for value in values]
+
+
+class SharedHistogram:
+    """
+    A Prometheus histogram kept in the cache like SharedCounter, optionally
+    with one label whose values are declared the same way.
+    """
+    # Cache increments are integers, so the sum is kept in microseconds.
+    SCALE = 1000000
+
+    def __init__(self, name, text, buckets, label=None, values=(None,)):
+        describe(name, text, 'histogram')
+        self.name, self.buckets = name, list(buckets) + [float('inf')]
+        self.label, self._values = label, values
+        _shared.append(self)
+
+    @property
+    def values(self):
+        return self._values() if callable(self._values) else self._values
+
+    def observe(self, seconds, value=None):
+        for bound in self.buckets:
+            if seconds <= bound:
+                add_shared(self.key('bucket', value, bound), 1)
+        add_shared(self.key('sum', value), int(seconds * self.SCALE))
+        add_shared(self.key('count', value), 1)
+
+    def key(self, part, value=None, bound=None):
+        return (f'metrics:{self.name}:{part}' + ('' if value is None else f':{value}')
+                + ('' if bound is None else f':{bound}'))
+
+    def samples(self):
+        samples = []
+        for value in self.values:
+            labels = () if value is None else ((self.label, value),)
+            keys = [self.key('bucket', value, bound) for bound in self.buckets] + \
+                [self.key('sum', value), self.key('count', value)]
+            stored = cache.get_many(keys)
+            samples.extend(
+                (f'{self.name}_bucket', labels + (('le', '+Inf' if bound == float('inf') else f'{bound:g}'),),
+                 stored.get(self.key('bucket', value, bound), 0))
+                for bound in self.buckets
+            )
+            samples.append((f'{self.name}_sum', labels, stored.get(self.key('sum', value), 0) / self.SCALE))
+            samples.append((f'{self.name}_count', labels, stored.get(self.key('count', value), 0)))
+        return samples
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters), {key: list(counts) for key, counts in _histograms.items()}
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    by_name = defaultdict(list)
+    counters, histograms = snapshot()
+    for (name, labels), value in sorted(counters.items()):
+        by_name[name].append((name, labels, value))
+    for (name, labels), counts in sorted(histograms.items()):
+        by_name[name].extend(histogram_samples(name, labels, counts))
+    for collect in _collectors:
+        for name, labels, value in collect():
+            by_name[name].append((name, tuple(sorted(labels.items())), value))
+    for metric in _shared:
+        by_name[metric.name].extend(metric.samples())
+
+    lines = []
+    for name, samples in by_name.items():
+        if name in _help:
+            lines.append(f'# HELP {name} {_help[name]}')
+        lines.append(f'# TYPE {name} {_types.get(name, "counter")}')
+        for sample, labels, value in samples:
+            lines.append(f'{sample}{format_labels(labels)} {value:g}')
+    return '\n'.join(lines) + '\n'
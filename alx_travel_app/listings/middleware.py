@@ -0,0 +1,189 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection as db_connection, connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+from whitenoise import middleware
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WhiteNoiseMiddleware(middleware.WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs natively under ASGI. The stock middleware is
+    sync only, so Django would run every request behind it, async views
+    included, in a thread of its own with a new event loop.
+    """
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+metrics.describe('http_requests_total', "Requests by view, method and status.")
+metrics.describe('http_request_duration_seconds', "Wall time per request by view.", 'histogram', SECONDS_BUCKETS)
+metrics.describe('http_response_size_bytes', "Response body size by view.", 'histogram',
+                 [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304])
+metrics.describe('http_request_db_queries', "Database queries per sampled request by view.", 'histogram',
+                 [0, 1, 2, 5, 10, 20, 50, 100, 200])
+metrics.describe('http_request_db_seconds', "Database time per sampled request by view.", 'histogram',
+                 SECONDS_BUCKETS)
+metrics.describe('http_request_serializer_seconds', "Serializer time per sampled request by view.", 'histogram',
+                 SECONDS_BUCKETS)
+
+# The profile of the request being handled, when it was sampled. Context
+# variables follow the request into sync_to_async threads, so queries and
+# serializers there are attributed to it too.
+current_sample = ContextVar('current_sample', default=None)
+SLOW_QUERIES_LOGGED = 5
+
+
+class Sample:
+    def __init__(self):
+        self.queries = []
+        self.serializer_seconds = 0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries.append((time.perf_counter() - started, sql))
+
+
+def add_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed(serializer_data):
+    def data(serializer):
+        sample = current_sample.get()
+        if sample is None or sample.serializing:
+            return serializer_data(serializer)
+        sample.serializing = True
+        started = time.perf_counter()
+        try:
+            return serializer_data(serializer)
+        finally:
+            sample.serializer_seconds += time.perf_counter() - started
+            sample.serializing = False
+    data.timed = True
+    return data
+
+
+def instrument():
+    """
+    Hooks the recorders in once per process: every database connection
+    reports its queries, and `.data` of DRF serializers, where they do
+    their work, reports its time. Both cost a context variable lookup while
+    no request is sampled.
+    """
+    connection_created.connect(add_query_recorder, dispatch_uid='instrumentation_query_recorder')
+    for connection in connections.all(initialized_only=True):
+        add_query_recorder(connection)
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = property(timed(BaseSerializer.data.fget))
+
+
+class InstrumentationMiddleware:
+    """
+    Records the wall time, status and response size of every request, per
+    view, in the metrics served on /internal/metrics/. A share of requests
+    (INSTRUMENTATION_SAMPLE_RATE) also records its query count, database
+    time and serializer time. Requests slower than SLOW_REQUEST_SECONDS are
+    logged, with their slowest queries when sampled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.INSTRUMENTATION_SAMPLE_RATE
+        self.slow_seconds = settings.SLOW_REQUEST_SECONDS
+        instrument()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = Sample() if random.random() < self.sample_rate else None
+        if sample is not None:
+            add_query_recorder(db_connection)
+        token = current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        self.record(request, response, time.perf_counter() - started, sample)
+        return response
+
+    async def __acall__(self, request):
+        sample = Sample() if random.random() < self.sample_rate else None
+        token = current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        self.record(request, response, time.perf_counter() - started, sample)
+        return response
+
+    def record(self, request, response, elapsed, sample):
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        metrics.increment('http_requests_total', view=view, method=request.method, status=str(response.status_code))
+        metrics.observe('http_request_duration_seconds', elapsed, view=view)
+        if not response.streaming:
+            metrics.observe('http_response_size_bytes', len(response.content), view=view)
+        if sample is not None:
+            metrics.observe('http_request_db_queries', len(sample.queries), view=view)
+            metrics.observe('http_request_db_seconds', sum(seconds for seconds, _ in sample.queries), view=view)
+            metrics.observe('http_request_serializer_seconds', sample.serializer_seconds, view=view)
+        if elapsed >= self.slow_seconds:
+            self.log_slow_request(request, response, view, elapsed, sample)
+
+    @staticmethod
+    def log_slow_request(request, response, view, elapsed, sample):
+        if sample is None:
+            logger.warning("Slow request %s %s (%s): %.0f ms, status %s; queries not sampled",
+                           request.method, request.path, view, elapsed * 1000, response.status_code)
+            return
+        slowest = sorted(sample.queries, key=lambda query: query[0], reverse=True)[:SLOW_QUERIES_LOGGED]
+        logger.warning(
+            "Slow request %s %s (%s): %.0f ms, status %s, %d queries in %.0f ms, serializers %.0f ms; "
+            "slowest queries:\n%s",
+            request.method, request.path, view, elapsed * 1000, response.status_code, len(sample.queries),
+            sum(seconds for seconds, _ in sample.queries) * 1000, sample.serializer_seconds * 1000,
+            '\n'.join(f"  {seconds * 1000:.1f} ms  {sql[:500]}" for seconds, sql in slowest),
+        )
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:49
+
+import django.db.models.deletion
+import uuid
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def backfill_booked_nights(apps, schema_editor):
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    nights = []
+    bookings = Booking.objects.filter(status__in=['active', 'pending']) \
+        .values_list('id', 'listing_id', 'start_date', 'end_date')
+    for booking_id, listing_id, start_date, end_date in bookings.iterator():
+        for n in range((end_date - start_date).days):
+            nights.append(BookedNight(booking_id=booking_id, listing_id=listing_id,
+                                      date=start_date + timedelta(days=n)))
+        if len(nights) >= 1000:
+            BookedNight.objects.bulk_create(nights)
+            nights = []
+    BookedNight.objects.bulk_create(nights)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_role_user_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='listings.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'listing'], name='listings_bo_date_57184a_idx'), models.Index(fields=['listing', 'date'], name='listings_bo_listing_c54afc_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_booked_nights, migrations.RunPython.noop),
+    ]
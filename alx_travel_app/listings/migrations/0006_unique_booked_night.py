@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:50
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_double_booked_nights(apps, schema_editor):
+    # Bookings made before overlap checks existed may share nights; the
+    # earliest booking keeps the night so the unique constraint can be added.
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    clashes = BookedNight.objects.values('listing_id', 'date') \
+        .annotate(n=Count('id')).filter(n__gt=1)
+    for clash in clashes.iterator():
+        nights = BookedNight.objects.filter(listing_id=clash['listing_id'], date=clash['date']) \
+            .order_by('booking__created_at', 'booking_id')
+        BookedNight.objects.filter(id__in=list(nights.values_list('id', flat=True)[1:])).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_bookednight'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookednight',
+            name='listings_bo_listing_c54afc_idx',
+        ),
+        migrations.RunPython(drop_double_booked_nights, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bookednight',
+            constraint=models.UniqueConstraint(fields=('listing', 'date'), name='unique_booked_night'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_unique_booked_night'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='listings_bo_created_2bd87f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['created_at', 'id'], name='listings_li_created_dd6edd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at', 'id'], name='listings_pa_created_110856_idx'),
+        ),
+    ]
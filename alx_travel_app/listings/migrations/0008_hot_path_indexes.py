@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'start_date', 'end_date', 'status'], name='listings_bo_listing_b8bdf8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['location', 'price_per_night'], name='listings_li_locatio_5aefa9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['transaction_id'], name='listings_pa_transac_0240af_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', 'created_at'], name='listings_re_listing_e2bc39_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['name'], name='listings_ro_name_3ba087_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:00
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    stats = Review.objects.values('listing_id').annotate(
+        review_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{r}_count': Count('id', filter=Q(rating=r)) for r in range(1, 6)},
+    )
+    for row in stats.iterator():
+        listing_id = row.pop('listing_id')
+        row['rating_avg'] = row['rating_sum'] / row['review_count']
+        Listing.objects.filter(id=listing_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rating_1_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_2_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_3_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_4_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_5_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['rating_avg', 'id'], name='listings_li_rating__e6bed7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['review_count', 'id'], name='listings_li_review__aadc4f_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
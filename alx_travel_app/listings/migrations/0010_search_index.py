@@ -0,0 +1,66 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:05
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the tokenizer and weights in listings/search.py as of this
+# migration, so later changes there do not change what it builds.
+TOKEN = re.compile(r'\w+')
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or the to up with'.split())
+MAX_TERM_LENGTH = 64
+TITLE_WEIGHT = 3
+K1 = 1.2
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN.findall((text or '').lower())
+        if len(token) > 1 and len(token) <= MAX_TERM_LENGTH and token not in STOPWORDS
+    ]
+
+
+def term_weights(title, description):
+    frequencies = Counter(tokenize(description))
+    for token in tokenize(title):
+        frequencies[token] += TITLE_WEIGHT
+    return {term: tf * (K1 + 1) / (tf + K1) for term, tf in frequencies.items()}
+
+
+def build_search_index(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    SearchTerm = apps.get_model('listings', 'SearchTerm')
+    terms = []
+    for listing_id, title, description in Listing.objects.values_list('id', 'title', 'description').iterator():
+        terms.extend(SearchTerm(listing_id=listing_id, term=term, weight=weight)
+                     for term, weight in term_weights(title, description).items())
+        if len(terms) >= 1000:
+            SearchTerm.objects.bulk_create(terms)
+            terms = []
+    SearchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='listings.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'listing', 'weight'], name='listings_se_term_f18975_idx')],
+                'constraints': [models.UniqueConstraint(fields=('term', 'listing'), name='unique_search_term')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
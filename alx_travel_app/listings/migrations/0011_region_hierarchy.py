@@ -0,0 +1,78 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:18
+
+import django.db.models.deletion
+import uuid
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Frozen copies of listings/regions.py as of this migration, so later
+# changes there do not change the keys it writes.
+def clean_name(name):
+    return ' '.join(name.split())
+
+
+def region_key(*names):
+    return '/'.join(clean_name(name).casefold().replace('/', '%2F') for name in names)
+
+
+def merge_locations_into_regions(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Location = apps.get_model('listings', 'Location')
+    Region = apps.get_model('listings', 'Region')
+
+    # Fold locations naming the same place into the first one.
+    groups = defaultdict(list)
+    for location in Location.objects.order_by('id'):
+        groups[region_key(location.country, location.state, location.city)].append(location)
+    for locations in groups.values():
+        keep, duplicates = locations[0], [location.id for location in locations[1:]]
+        if duplicates:
+            Listing.objects.filter(location_id__in=duplicates).update(location_id=keep.id)
+            Location.objects.filter(id__in=duplicates).delete()
+
+    # Build the tree and count the listings under each node.
+    per_location = dict(Listing.objects.values_list('location_id').annotate(Count('id')).order_by())
+    regions = {}
+    for location in Location.objects.all():
+        names = [clean_name(location.country), clean_name(location.state), clean_name(location.city)]
+        parent = None
+        for depth, kind in enumerate(['country', 'state', 'city'], start=1):
+            key = region_key(*names[:depth])
+            if key not in regions:
+                regions[key] = Region.objects.create(key=key, name=names[depth - 1], kind=kind, parent=parent)
+            parent = regions[key]
+            parent.listing_count += per_location.get(location.id, 0)
+        location.country, location.state, location.city = names
+        location.region = parent
+        location.save()
+    for region in regions.values():
+        region.save(update_fields=['listing_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('country', 'Country'), ('state', 'State'), ('city', 'City')], max_length=10)),
+                ('key', models.CharField(max_length=700, unique=True)),
+                ('listing_count', models.IntegerField(default=0)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='listings.region')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='region',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='listings.region'),
+        ),
+        migrations.RunPython(merge_locations_into_regions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:33
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tx_ref', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], max_length=200)),
+                ('source', models.CharField(choices=[('webhook', 'Webhook'), ('verify', 'Verify'), ('reconcile', 'Reconcile')], max_length=20)),
+                ('payload', models.JSONField(default=dict)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_status', 'updated_at'], name='listings_pa_payment_91afdd_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentevent',
+            constraint=models.UniqueConstraint(fields=('tx_ref', 'status'), name='unique_payment_event'),
+        ),
+    ]
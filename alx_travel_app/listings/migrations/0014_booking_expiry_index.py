@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_payment_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'created_at'], name='listings_bo_status_5903d2_idx'),
+        ),
+    ]
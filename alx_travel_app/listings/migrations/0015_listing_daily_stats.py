@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:52
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_booking_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingDailyStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('nights_booked', models.IntegerField(default=0)),
+                ('check_ins', models.IntegerField(default=0)),
+                ('revenue', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['updated_at'], name='listings_bo_updated_d69572_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['updated_at'], name='listings_li_updated_28d1ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at'], name='listings_pa_updated_818e1b_idx'),
+        ),
+        migrations.AddField(
+            model_name='listingdailystats',
+            name='host',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='listingdailystats',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='listings.listing'),
+        ),
+        migrations.AddIndex(
+            model_name='listingdailystats',
+            index=models.Index(fields=['host', 'date'], name='listings_li_host_id_06fe14_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='listingdailystats',
+            constraint=models.UniqueConstraint(fields=('listing', 'date'), name='unique_listing_daily_stats'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:55
+
+import django.core.validators
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_listing_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRule',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('seasonal', 'Seasonal'), ('weekend', 'Weekend'), ('length_of_stay', 'Length Of Stay')], max_length=20)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('price_per_night', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('min_nights', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1)])),
+                ('discount_percent', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_rules', to='listings.listing')),
+            ],
+        ),
+    ]
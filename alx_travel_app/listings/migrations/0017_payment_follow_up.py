@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0016_price_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='follow_up',
+            field=models.CharField(blank=True, choices=[('reactivate', 'Reactivate'), ('refund', 'Refund')], default='', max_length=20),
+        ),
+    ]
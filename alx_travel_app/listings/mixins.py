@@ -0,0 +1,168 @@
+import hashlib
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .cache import cache_is_shared, get_version, make_key, read_through
+from .middleware import timed
+from .rows import compile_rows
+from .serializers import requested_expansions
+
+
+class ExpandQuerysetMixin:
+    """
+    Plans the joins for the relations a client asked to expand: forward
+    foreign keys are select_related and anything else is prefetched, so an
+    expanded list costs the same number of queries whatever the page size.
+    """
+
+    def get_queryset(self):
+        return self.plan_related(super().get_queryset())
+
+    def plan_related(self, queryset):
+        expandable = getattr(self.get_serializer_class().Meta, 'expandable_fields', {})
+        joins, prefetches = [], []
+        for name in requested_expansions(self.request, expandable):
+            field = queryset.model._meta.get_field(name)
+            if field.many_to_one or field.one_to_one:
+                joins.append(name)
+            else:
+                prefetches.append(name)
+        if joins:
+            queryset = queryset.select_related(*joins)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+
+class RowListMixin:
+    """
+    Serves lists from .values() rows through the compiled serializer fields
+    (see rows.compile_rows), which renders the same data without building
+    model instances. Falls back to the serializer when a field needs the
+    instance.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def list_response(self, queryset):
+        plan = compile_rows(self.get_serializer())
+        if plan is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        columns, represent = plan
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        if get_ordering is not None:
+            # The cursor is built from the ordering fields of the last row.
+            columns = columns + [field.lstrip('-') for field in get_ordering(self.request, queryset, self)]
+        # Timed like serializer.data, for the request instrumentation.
+        represent_rows = timed(lambda rows: [represent(row) for row in rows])
+        rows = queryset.values(*dict.fromkeys(columns))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(represent_rows(page))
+        return Response(represent_rows(list(rows)))
+
+
+class CachedReadMixin:
+    """
+    Serves list and retrieve responses through the read cache under
+    `cache_namespace`, keyed on the full request URL. Writes to the models
+    a namespace depends on invalidate it (see signals.CACHE_DEPENDENCIES).
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = make_key(self.cache_namespace, self.action, request.build_absolute_uri())
+        data = read_through(self.cache_namespace, key, lambda: handler(request, *args, **kwargs).data)
+        return Response(data)
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+class ConditionalRequestMixin:
+    """
+    Answers GETs carrying If-None-Match/If-Modified-Since with 304 before
+    serializing anything, and refuses PUT/PATCH with 412 when If-Match or
+    If-Unmodified-Since no longer matches the stored row.
+
+    A detail ETag covers the row's pk and `updated_at`, so it survives until
+    the row is written. A list ETag covers the request URL and the version
+    of `etag_namespace` (the view's `cache_namespace` by default), which
+    writes to every model the list shows move (see
+    signals.CACHE_DEPENDENCIES), so checking it costs one cache read and no
+    query. Lists carry no Last-Modified, and no ETag either unless the cache
+    is shared: a per-process cache never sees the versions workers move.
+    """
+    etag_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        if not cache_is_shared():
+            return super().list(request, *args, **kwargs)
+        namespace = self.etag_namespace or self.cache_namespace
+        etag = make_etag(request.build_absolute_uri(), request.accepted_renderer.format, get_version(namespace))
+        return self.conditional(etag, None, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.object_validators(instance)
+        return self.conditional(etag, last_modified, super().retrieve, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        if not {'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE'} & request.META.keys():
+            return self.with_validators(super().update(request, *args, **kwargs))
+        with transaction.atomic():
+            # Lock the row before reading it so two edits made from the same
+            # ETag cannot both pass the check.
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            self.get_queryset().model.objects.select_for_update().filter(**{self.lookup_field: lookup}).exists()
+            etag, last_modified = self.object_validators(self.get_object())
+            response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+            if response is not None:
+                return response
+            return self.with_validators(super().update(request, *args, **kwargs))
+
+    def get_object(self):
+        # Fetched once per request: the conditional check and the handler
+        # share the row.
+        if getattr(self, 'conditional_object', None) is None:
+            self.conditional_object = super().get_object()
+        return self.conditional_object
+
+    def object_validators(self, instance):
+        return make_etag(instance._meta.label, instance.pk, instance.updated_at.isoformat()), instance.updated_at
+
+    def with_validators(self, response):
+        instance = getattr(self, 'conditional_object', None)
+        if instance is not None and response.status_code == 200:
+            etag, last_modified = self.object_validators(instance)
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def conditional(self, etag, last_modified, handler, request, *args, **kwargs):
+        # HTTP dates have whole-second precision.
+        timestamp = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
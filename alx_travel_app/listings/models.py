@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MinValueValidator, MaxValueValidator
 from uuid import uuid4
 
 class UserRole(models.TextChoices):
@@ -11,6 +12,11 @@ class Role(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name']),
+        ]
+
 class User(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     phone_number = models.CharField(max_length=20, blank=True)
@@ -20,12 +26,37 @@ class User(AbstractUser):
         return self.username, self.role
 
 
+class RegionKind(models.TextChoices):
+    COUNTRY = 'country'
+    STATE = 'state'
+    CITY = 'city'
+
+class Region(models.Model):
+    # Country -> state -> city tree built from the locations, with the number
+    # of listings under each node, kept in sync by signals.py (see regions.py).
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=10, choices=RegionKind.choices)
+    # Normalized path, e.g. "kenya/nairobi/westlands"
+    key = models.CharField(max_length=700, unique=True)
+    listing_count = models.IntegerField(default=0)
+
+    # Foreign keys
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='children')
+
+    def __str__(self):
+        return self.name
+
 class Location(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     country = models.CharField(max_length=200)
     state = models.CharField(max_length=200)
     city = models.CharField(max_length=200)
 
+    # The city node of this location; being one-to-one, it also keeps two
+    # locations from naming the same place.
+    region = models.OneToOneField(Region, on_delete=models.PROTECT, blank=True, null=True, editable=False)
+
     def __str__(self):
         return f"{self.country}, {self.state}, {self.city}"
 
@@ -38,10 +69,31 @@ class Listing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Review aggregates, maintained incrementally by the review signals and
+    # reconciled by the recompute_ratings command
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+
     # Foreign keys
     host = models.ForeignKey(User, on_delete=models.CASCADE)
     location = models.ForeignKey(Location, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['location', 'price_per_night']),
+            models.Index(fields=['rating_avg', 'id']),
+            models.Index(fields=['review_count', 'id']),
+            # listings whose stats rollups are out of date
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.location}"
 
@@ -64,12 +116,67 @@ class Booking(models.Model):
     guest = models.ForeignKey(User, on_delete=models.CASCADE)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['listing', 'start_date', 'end_date', 'status']),
+            # expiry of unpaid bookings
+            models.Index(fields=['status', 'created_at']),
+            # bookings changed since the last stats rollup
+            models.Index(fields=['updated_at']),
+        ]
+
     def __str__(self):
         return f"{self.listing} - {self.guest}, {self.status}, {self.total_price}"
 
+class BookedNight(models.Model):
+    # Availability index and reservation table: one row per night a listing is
+    # held by an active or pending booking, kept in sync by signals.py.
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    date = models.DateField()
+
+    # Foreign keys
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'listing']),
+        ]
+        constraints = [
+            # A night can only be held once, which makes concurrent overlapping
+            # bookings fail in the database instead of both succeeding.
+            models.UniqueConstraint(fields=['listing', 'date'], name='unique_booked_night'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing} - {self.date}"
+
+class SearchTerm(models.Model):
+    # Inverted index for listing search: one row per term a listing's title or
+    # description contains, weighted by how often and where, kept in sync by
+    # signals.py (see search.py).
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    # Foreign keys
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            # Covers the ranking query, which reads only these columns.
+            models.Index(fields=['term', 'listing', 'weight']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'listing'], name='unique_search_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} - {self.listing_id}"
+
 class Review(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
-    rating = models.IntegerField()
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -78,6 +185,11 @@ class Review(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
     guest = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['listing', 'created_at']),
+        ]
+
     def __str__(self):
         return f"{self.listing} - {self.guest} - {self.rating}"
 
@@ -86,16 +198,153 @@ class PaymentStatus(models.TextChoices):
     SUCCESS = 'success'
     FAILED = 'failed'
 
+class PaymentFollowUp(models.TextChoices):
+    REACTIVATE = 'reactivate'
+    REFUND = 'refund'
+
 class Payment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     payment_status = models.CharField(max_length=200, choices=PaymentStatus.choices, default=PaymentStatus.PENDING)
     amount = models.IntegerField()
     transaction_id = models.CharField(max_length=200)
+    # Set when the gateway reports a success for a payment already failed,
+    # e.g. by booking expiry: the booking can be reactivated if its nights
+    # are still free, otherwise the guest is owed a refund.
+    follow_up = models.CharField(max_length=20, choices=PaymentFollowUp.choices, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     # Foreign key
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['transaction_id']),
+            # reconciliation picks the pending payments checked longest ago
+            models.Index(fields=['payment_status', 'updated_at']),
+            # payments changed since the last stats rollup
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking} - {self.payment_status} - {self.amount}"
+
+class PaymentEventSource(models.TextChoices):
+    WEBHOOK = 'webhook'
+    VERIFY = 'verify'
+    RECONCILE = 'reconcile'
+
+class PaymentEvent(models.Model):
+    # Idempotency log of gateway outcomes: each final status of a transaction
+    # is applied once, whichever of the webhook, the verify callback or the
+    # reconciliation task reports it first (see payments.apply_payment_result).
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    tx_ref = models.CharField(max_length=200)
+    status = models.CharField(max_length=200, choices=PaymentStatus.choices)
+    source = models.CharField(max_length=20, choices=PaymentEventSource.choices)
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tx_ref', 'status'], name='unique_payment_event'),
+        ]
+
+    def __str__(self):
+        return f"{self.tx_ref} - {self.status} ({self.source})"
+
+class EmailStatus(models.TextChoices):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+class OutboundEmail(models.Model):
+    # Email outbox: tasks queue messages here and drain_email_outbox sends
+    # them in batches over one connection (see outbox.py).
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    # One message per key, e.g. "booking-confirmation:<booking id>:<email>"
+    dedup_key = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=10, choices=EmailStatus.choices, default=EmailStatus.PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} - {self.subject}, {self.status}"
+
+class ListingDailyStats(models.Model):
+    # Daily rollup per listing behind the host dashboard, rebuilt by
+    # rollups.py for the listings whose bookings or payments changed. Days
+    # with nothing booked have no row.
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    date = models.DateField()
+    # Nights held by active bookings, active bookings checking in, and the
+    # successful payments of those bookings.
+    nights_booked = models.IntegerField(default=0)
+    check_ins = models.IntegerField(default=0)
+    revenue = models.IntegerField(default=0)
+
+    # Foreign keys; the host is copied from the listing so host stats read
+    # this table alone.
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE)
+    host = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['host', 'date']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'date'], name='unique_listing_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.listing} - {self.date}"
+
+class RollupWatermark(models.Model):
+    # How far a rollup has read the rows it aggregates, by updated_at.
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} - {self.value}"
+
+class PriceRuleKind(models.TextChoices):
+    SEASONAL = 'seasonal'
+    WEEKEND = 'weekend'
+    LENGTH_OF_STAY = 'length_of_stay'
+
+class PriceRule(models.Model):
+    # Host pricing on top of price_per_night, compiled into a rate table per
+    # listing by pricing.py. Seasonal and weekend rules set the nightly price
+    # of the nights from start_date up to end_date (Friday and Saturday
+    # nights only for weekend rules); length of stay rules take
+    # discount_percent off stays of at least min_nights checking in within
+    # the dates. Either date may be left open.
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=PriceRuleKind.choices)
+    start_date = models.DateField(blank=True, null=True)
+    end_date = models.DateField(blank=True, null=True)
+    price_per_night = models.IntegerField(blank=True, null=True, validators=[MinValueValidator(0)])
+    min_nights = models.IntegerField(blank=True, null=True, validators=[MinValueValidator(1)])
+    discount_percent = models.IntegerField(
+        blank=True, null=True, validators=[MinValueValidator(1), MaxValueValidator(100)],
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Foreign key
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='price_rules')
+
     def __str__(self):
-        return f"{self.booking} - {self.payment_status} - {self.amount}"
\ No newline at end of file
+        return f"{self.listing_id} - {self.kind} {self.start_date} - {self.end_date}"
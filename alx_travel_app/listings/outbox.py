@@ -0,0 +1,162 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from . import metrics
+from .models import EmailStatus, OutboundEmail
+
+sends = metrics.SharedCounter(
+    'email_outbox_sends_total', "Outbox delivery attempts by result.", 'result', ['sent', 'retry', 'failed'],
+)
+send_seconds = metrics.SharedHistogram(
+    'email_outbox_send_seconds', "Time to hand one message to the mail server.",
+    [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+metrics.describe('email_outbox_pending', "Messages waiting in the outbox.", 'gauge')
+metrics.describe('email_outbox_oldest_pending_seconds', "Age of the oldest message waiting in the outbox.", 'gauge')
+
+
+@metrics.register_collector
+def outbox_depth():
+    pending = OutboundEmail.objects.filter(status=EmailStatus.PENDING)
+    count = pending.count()
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest'] if count else None
+    return [
+        ('email_outbox_pending', {}, count),
+        ('email_outbox_oldest_pending_seconds', {}, (timezone.now() - oldest).total_seconds() if oldest else 0),
+    ]
+
+
+def enqueue_email(recipient, subject, body, dedup_key):
+    """
+    Queues one message. A message whose `dedup_key` was queued before is
+    dropped, so retried or duplicated tasks email each recipient once.
+    """
+    enqueue_emails([{'recipient': recipient, 'subject': subject, 'body': body, 'dedup_key': dedup_key}])
+
+
+def enqueue_emails(messages):
+    """Queues many messages, dicts of enqueue_email's arguments, in one insert."""
+    now = timezone.now()
+    OutboundEmail.objects.bulk_create(
+        [OutboundEmail(next_attempt_at=now, **message) for message in messages],
+        ignore_conflicts=True,
+    )
+
+
+def claim_batch(batch_size):
+    """
+    Leases up to `batch_size` due messages to this worker by pushing their
+    next attempt past the lease, so concurrent drains skip them and a worker
+    that dies mid-batch only delays them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(id__in=[email.id for email in batch]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+            )
+    for email in batch:
+        email.attempts += 1
+    return batch
+
+
+def wait_for_rate_limit():
+    """
+    Blocks until one more message fits in this second's budget of
+    EMAIL_OUTBOX_RATE_LIMIT, counted in the cache. All workers share the
+    budget only when the cache is shared (Redis); with the per-process
+    default each worker process gets a whole budget.
+    """
+    limit = settings.EMAIL_OUTBOX_RATE_LIMIT
+    if not limit:
+        return
+    while True:
+        now = time.time()
+        window = f'outbox:rate:{int(now)}'
+        cache.add(window, 0, timeout=5)
+        try:
+            if cache.incr(window) <= limit:
+                return
+        except ValueError:
+            continue
+        time.sleep(1 - now % 1)
+
+
+def backoff(attempts):
+    delay = min(settings.EMAIL_OUTBOX_BACKOFF_MAX_SECONDS, settings.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def record_failure(email, error):
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        changes = {'status': EmailStatus.FAILED}
+        sends.increment('failed')
+    else:
+        changes = {'next_attempt_at': timezone.now() + backoff(email.attempts)}
+        sends.increment('retry')
+    OutboundEmail.objects.filter(id=email.id).update(last_error=str(error)[:1000], **changes)
+
+
+def send_batch(batch):
+    """
+    Sends `batch` over a single mail server connection. Returns the number
+    sent; failures are rescheduled with exponential backoff.
+    """
+    sent = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            record_failure(email, e)
+        return 0
+    try:
+        for email in batch:
+            wait_for_rate_limit()
+            message = EmailMessage(email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.recipient],
+                                   connection=connection)
+            started = time.monotonic()
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                record_failure(email, e)
+                continue
+            send_seconds.observe(time.monotonic() - started)
+            sent.append(email.id)
+    finally:
+        connection.close()
+        if sent:
+            OutboundEmail.objects.filter(id__in=sent).update(status=EmailStatus.SENT, sent_at=timezone.now())
+            sends.increment('sent', len(sent))
+    return len(sent)
+
+
+def drain_outbox(batch_size=None, time_budget=None):
+    """
+    Sends due messages a batch at a time until none are left or
+    `time_budget` seconds have passed. Returns the number sent.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    time_budget = settings.EMAIL_OUTBOX_DRAIN_INTERVAL if time_budget is None else time_budget
+    deadline = time.monotonic() + time_budget
+    sent = 0
+    while time.monotonic() < deadline:
+        batch = claim_batch(batch_size)
+        if not batch:
+            break
+        sent += send_batch(batch)
+    return sent
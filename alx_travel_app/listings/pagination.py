@@ -0,0 +1,130 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def row_value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def keyset_filter(ordering, key):
+    """
+    Builds the filter for rows strictly after `key` in `ordering`, e.g. for
+    ('-created_at', '-id'):
+        created_at <= c AND (created_at < c OR (created_at = c AND id < i))
+    The leading bound lets the database use the index as a plain range scan.
+    """
+    names = [field.lstrip('-') for field in ordering]
+    after = Q()
+    for i, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition = Q(**{f'{names[i]}__{lookup}': key[i]})
+        for name, value in zip(names[:i], key[:i]):
+            condition &= Q(**{name: value})
+        after |= condition
+    first = 'lte' if ordering[0].startswith('-') else 'gte'
+    return Q(**{f'{names[0]}__{first}': key[0]}) & after
+
+
+def flip(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on a composite unique key, by default
+    ('-created_at', '-id').
+
+    DRF's CursorPagination positions on the first field only and skips ties
+    with an offset; here the cursor carries the full key of the boundary row,
+    so every page, however deep, is one indexed range scan. Views can set
+    `pagination_ordering`; its last field must be unique.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        ordering = flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(keyset_filter(ordering, cursor['key']))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """
+        `?ordering=<field>` or `?ordering=-<field>` sorts by one of the view's
+        `ordering_fields`, with the id as tie-breaker so the key stays unique.
+        """
+        requested = request.query_params.get(self.ordering_param)
+        if requested and requested.lstrip('-') in getattr(view, 'ordering_fields', ()):
+            tie_breaker = '-id' if requested.startswith('-') else 'id'
+            return (requested, tie_breaker)
+        return tuple(getattr(view, 'pagination_ordering', self.ordering))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor({'key': self.get_key(self.page[-1]), 'reverse': False})
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor({'key': self.get_key(self.page[0]), 'reverse': True})
+
+    def get_key(self, row):
+        return [row_value(row, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, cursor):
+        key = [
+            value.isoformat() if isinstance(value, date)
+            else str(value) if isinstance(value, UUID)
+            else value
+            for value in cursor['key']
+        ]
+        payload = json.dumps({'k': key, 'r': int(cursor['reverse'])}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            key, reverse = payload['k'], bool(payload.get('r'))
+            if not isinstance(key, list) or len(key) != len(self.ordering):
+                raise ValueError
+            key = [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, key)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'key': key, 'reverse': reverse}
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import hmac
+import uuid
+import os
+from datetime import timedelta
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import metrics
+from .availability import is_available
+from .cache import invalidate
+from .gateway import get_async_client, get_client
+from .models import Booking, BookingStatus, Payment, PaymentEvent, PaymentEventSource, PaymentFollowUp, PaymentStatus
+
+# Gateway statuses that settle a transaction; anything else leaves it pending.
+FINAL_STATUSES = {"success": PaymentStatus.SUCCESS, "failed": PaymentStatus.FAILED}
+MISSING_CONFIG = {
+    "status": "error",
+    "data": "Missing CHAPA_SECRET_KEY or CHAPA_BASE_URL environment variables."
+}
+
+late_successes = metrics.SharedCounter(
+    'late_payment_successes_total', "Successes reported for payments already failed, by follow-up.",
+    'follow_up', PaymentFollowUp.values,
+)
+
+
+def chapa_payload(booking, tx_ref):
+    app_url = os.environ.get("APP_URL")
+    port = os.environ.get("APP_PORT")
+    return_url = f"{app_url}:{port}/api/payments/verify/{tx_ref}/"
+
+    return {
+        "amount": booking.total_price,
+        "email": booking.guest.email,
+        "first_name": booking.guest.first_name,
+        "last_name": booking.guest.last_name,
+        "phone_number": getattr(booking.guest, "phone_number", None) or "",
+        "tx_ref": tx_ref,
+        "return_url": return_url,
+        "customization": {
+            "title": f"payment- {booking.listing.title[:5]}",
+            "description": f"Staying from {booking.start_date} to {booking.end_date}"
+        }
+    }
+
+
+def claim_payment(booking):
+    """
+    Returns the pending Payment whose tx_ref initializes the booking's
+    checkout, created on the first call, or None once the booking has a
+    checkout URL (then set on `booking`). The booking row is locked while
+    checking, so a retried or duplicated task and the async view all send
+    Chapa the same tx_ref, which it accepts once.
+    """
+    with transaction.atomic():
+        locked = Booking.objects.select_for_update().only("payment_url").get(pk=booking.pk)
+        if locked.payment_url:
+            booking.payment_url = locked.payment_url
+            return None
+        payment = Payment.objects.filter(booking=booking, payment_status=PaymentStatus.PENDING).first()
+        if payment is None:
+            payment = Payment.objects.create(
+                booking=booking,
+                transaction_id=str(uuid.uuid4()),
+                amount=booking.total_price,
+            )
+    return payment
+
+
+def checkout_response(booking):
+    return {"status": "success", "data": {"checkout_url": booking.payment_url}}
+
+
+def create_chapa_payment(booking):
+    client = get_client()
+    if not client.configured:
+        return MISSING_CONFIG
+
+    payment = claim_payment(booking)
+    if payment is None:
+        return checkout_response(booking)
+    chapa_data = client.initialize(chapa_payload(booking, payment.transaction_id))
+
+    if chapa_data.get("status") == "success":
+        booking.payment_url = chapa_data["data"]["checkout_url"]
+        booking.save(update_fields=["payment_url", "updated_at"])
+    return chapa_data
+
+
+async def acreate_chapa_payment(booking):
+    """create_chapa_payment for async views; `booking` needs guest and listing loaded."""
+    client = get_async_client()
+    if not client.configured:
+        return MISSING_CONFIG
+
+    payment = await sync_to_async(claim_payment)(booking)
+    if payment is None:
+        return checkout_response(booking)
+    chapa_data = await client.initialize(chapa_payload(booking, payment.transaction_id))
+
+    if chapa_data.get("status") == "success":
+        booking.payment_url = chapa_data["data"]["checkout_url"]
+        await booking.asave(update_fields=["payment_url", "updated_at"])
+    return chapa_data
+
+
+def verified_status(chapa_data):
+    """The final PaymentStatus in a Chapa verify response, or None while undecided."""
+    if not chapa_data or chapa_data.get("status") != "success":
+        return None
+    return FINAL_STATUSES.get((chapa_data.get("data") or {}).get("status"))
+
+
+def valid_webhook_signature(request):
+    """Checks the HMAC-SHA256 of the raw body, keyed with CHAPA_WEBHOOK_SECRET."""
+    if not settings.CHAPA_WEBHOOK_SECRET:
+        return False
+    expected = hmac.new(settings.CHAPA_WEBHOOK_SECRET.encode(), request.body, hashlib.sha256).hexdigest()
+    return any(
+        hmac.compare_digest(expected, request.headers.get(header, ""))
+        for header in ("x-chapa-signature", "chapa-signature")
+    )
+
+
+def apply_payment_result(tx_ref, status, source, payload=None):
+    """
+    Settles the pending payment of `tx_ref` as `status` and, on success,
+    activates its booking and emails the guest once the transaction commits.
+    Whichever of the webhook, the verify callback and reconciliation reports
+    an outcome first applies it; repeats find nothing pending, or collide on
+    the PaymentEvent log, and change nothing. A success for a payment that
+    already failed, e.g. one paid just as its booking expired, is logged and
+    flagged for follow-up (see flag_late_success) rather than dropped.
+    Returns the payment's status afterwards, or None for an unknown tx_ref.
+    """
+    from .tasks import send_payment_confirmation_email
+
+    with transaction.atomic():
+        pending = list(
+            Payment.objects.select_for_update()
+            .filter(transaction_id=tx_ref, payment_status=PaymentStatus.PENDING)
+            .values_list("id", "booking_id")
+        )
+        late = not pending and status == PaymentStatus.SUCCESS and Payment.objects.filter(
+            transaction_id=tx_ref, payment_status=PaymentStatus.FAILED,
+        ).exists()
+        if pending or late:
+            try:
+                with transaction.atomic():
+                    PaymentEvent.objects.create(tx_ref=tx_ref, status=status, source=source, payload=payload or {})
+            except IntegrityError:
+                pending, late = [], False
+        if late:
+            flag_late_success(tx_ref)
+        if pending:
+            now = timezone.now()
+            booking_ids = [booking_id for _, booking_id in pending]
+            Payment.objects.filter(id__in=[payment_id for payment_id, _ in pending]).update(
+                payment_status=status, updated_at=now,
+            )
+            if status == PaymentStatus.SUCCESS:
+                Booking.objects.filter(id__in=booking_ids, status=BookingStatus.PENDING).update(
+                    status=BookingStatus.ACTIVE, updated_at=now,
+                )
+                invalidate('bookings')
+                for booking_id, email in Booking.objects.filter(id__in=booking_ids).values_list("id", "guest__email"):
+                    transaction.on_commit(
+                        lambda email=email, booking_id=booking_id: send_payment_confirmation_email.delay(email, booking_id)
+                    )
+        return Payment.objects.filter(transaction_id=tx_ref).values_list("payment_status", flat=True).first()
+
+
+def flag_late_success(tx_ref):
+    """
+    Flags the failed payments of `tx_ref`, which the gateway now reports as
+    paid, to reactivate their booking when its nights are still free and to
+    refund the guest otherwise. Runs in apply_payment_result's transaction.
+    """
+    late = Payment.objects.select_for_update().select_related("booking").filter(
+        transaction_id=tx_ref, payment_status=PaymentStatus.FAILED, follow_up="",
+    )
+    for payment in late:
+        booking = payment.booking
+        free = is_available(booking.listing_id, booking.start_date, booking.end_date, exclude_booking=booking)
+        payment.follow_up = PaymentFollowUp.REACTIVATE if free else PaymentFollowUp.REFUND
+        payment.save(update_fields=["follow_up", "updated_at"])
+        transaction.on_commit(lambda follow_up=payment.follow_up: late_successes.increment(follow_up))
+
+
+async def verify_many(tx_refs):
+    """Verifies transactions concurrently. Returns [(tx_ref, response or None)]."""
+    client = get_async_client()
+
+    async def verify(tx_ref):
+        try:
+            return tx_ref, await client.verify(tx_ref)
+        except requests.RequestException:
+            return tx_ref, None
+
+    return await asyncio.gather(*(verify(tx_ref) for tx_ref in tx_refs))
+
+
+def reconcile_payments(batch_size=None):
+    """
+    Asks the gateway about a batch of payments left pending for longer than
+    PAYMENT_RECONCILE_AFTER seconds, e.g. because a webhook was lost, and
+    applies the outcomes. Those still undecided go to the back of the line.
+    Returns the number of payments settled.
+    """
+    batch_size = batch_size or settings.PAYMENT_RECONCILE_BATCH_SIZE
+    now = timezone.now()
+    tx_refs = list(
+        Payment.objects.filter(
+            payment_status=PaymentStatus.PENDING,
+            updated_at__lt=now - timedelta(seconds=settings.PAYMENT_RECONCILE_AFTER),
+        )
+        .order_by("updated_at")
+        .values_list("transaction_id", flat=True)[:batch_size]
+    )
+    if not tx_refs or not get_client().configured:
+        return 0
+    settled = 0
+    undecided = []
+    for tx_ref, chapa_data in asyncio.run(verify_many(tx_refs)):
+        status = verified_status(chapa_data)
+        if status is None:
+            undecided.append(tx_ref)
+            continue
+        apply_payment_result(tx_ref, status, PaymentEventSource.RECONCILE, chapa_data)
+        settled += 1
+    Payment.objects.filter(transaction_id__in=undecided, payment_status=PaymentStatus.PENDING).update(updated_at=now)
+    return settled
@@ -7,7 +7,7 @@ class IsHost(permissions.BasePermission):
         return obj.host == request.user
 
 class IsGuestOrListingHost(permissions.BasePermission):
-    def has_permission(self, request, view, obj):
+    def has_object_permission(self, request, view, obj):
         isHost = obj.listing.host == request.user
         isGuest = obj.guest == request.user
         if request.method in permissions.SAFE_METHODS and isHost:
@@ -0,0 +1,157 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .cache import get_versions
+from .models import PriceRule, PriceRuleKind
+
+# Friday and Saturday nights, by the weekday of the night's date.
+WEEKEND_DAYS = (4, 5)
+RULE_FIELDS = ['listing_id', 'kind', 'start_date', 'end_date', 'price_per_night', 'min_nights', 'discount_percent']
+
+
+def weekend_nights(start, end):
+    """Friday and Saturday nights from `start` up to `end`, counted without walking the nights."""
+    weeks, extra = divmod((end - start).days, 7)
+    first = start.weekday()
+    return weeks * len(WEEKEND_DAYS) + sum((first + day) % 7 in WEEKEND_DAYS for day in range(extra))
+
+
+def compile_rules(price_per_night, rules):
+    """
+    Compiles a listing's price rules, dicts of RULE_FIELDS oldest first,
+    into a rate table (starts, weekday_rates, weekend_rates, discounts).
+    Segment i runs from starts[i] up to starts[i + 1], or on for the last
+    one, at weekday_rates[i] a night and weekend_rates[i] on Friday and
+    Saturday nights. Where rules of one kind overlap, the one starting
+    latest wins, then the newest; weekend rules beat seasonal ones on the
+    nights they cover. `discounts` holds the length of stay rules as
+    (start_date, end_date, min_nights, percent), largest percent first.
+    """
+    nightly = [rule for rule in rules if rule['kind'] != PriceRuleKind.LENGTH_OF_STAY]
+    bounds = {date.min}
+    for rule in nightly:
+        bounds.add(rule['start_date'] or date.min)
+        if rule['end_date']:
+            bounds.add(rule['end_date'])
+    bounds = sorted(bounds)
+    weekday_rates = [price_per_night] * len(bounds)
+    weekend_rates = [None] * len(bounds)
+    # sorted() is stable, so of the rules starting on the same day the newer
+    # ones are applied last.
+    for rule in sorted(nightly, key=lambda rule: rule['start_date'] or date.min):
+        rates = weekend_rates if rule['kind'] == PriceRuleKind.WEEKEND else weekday_rates
+        first = bisect_left(bounds, rule['start_date'] or date.min)
+        last = bisect_left(bounds, rule['end_date']) if rule['end_date'] else len(bounds)
+        rates[first:last] = [rule['price_per_night']] * (last - first)
+
+    starts, weekdays, weekends = [], [], []
+    for start, weekday, weekend in zip(bounds, weekday_rates, weekend_rates):
+        weekend = weekday if weekend is None else weekend
+        if starts and (weekdays[-1], weekends[-1]) == (weekday, weekend):
+            continue
+        starts.append(start)
+        weekdays.append(weekday)
+        weekends.append(weekend)
+    discounts = sorted(
+        ((rule['start_date'], rule['end_date'], rule['min_nights'], rule['discount_percent'])
+         for rule in rules if rule['kind'] == PriceRuleKind.LENGTH_OF_STAY),
+        key=lambda discount: -discount[3],
+    )
+    return starts, weekdays, weekends, discounts
+
+
+def price_stay(table, start, end):
+    """
+    Prices the nights from `start` up to `end` with a compiled rate table,
+    one step per segment the stay crosses however many nights it has. The
+    length of stay discount is the largest one the stay qualifies for by
+    its check-in date and nights, rounded down.
+    """
+    starts, weekday_rates, weekend_rates, discounts = table
+    nights = (end - start).days
+    index = bisect_right(starts, start) - 1
+    segments = []
+    day = start
+    while day < end:
+        until = min(end, starts[index + 1]) if index + 1 < len(starts) else end
+        weekend = weekend_nights(day, until)
+        weekday = (until - day).days - weekend
+        segments.append({
+            'start': day,
+            'end': until,
+            'nights': weekday + weekend,
+            'weekend_nights': weekend,
+            'price_per_night': weekday_rates[index],
+            'weekend_price_per_night': weekend_rates[index],
+            'amount': weekday * weekday_rates[index] + weekend * weekend_rates[index],
+        })
+        day, index = until, index + 1
+
+    subtotal = sum(segment['amount'] for segment in segments)
+    percent = next((
+        percent for rule_start, rule_end, min_nights, percent in discounts
+        if nights >= min_nights and (rule_start is None or rule_start <= start) and (rule_end is None or start < rule_end)
+    ), 0)
+    discount = subtotal * percent // 100
+    return {
+        'nights': nights,
+        'subtotal': subtotal,
+        'discount_percent': percent,
+        'discount': discount,
+        'total': subtotal - discount,
+        'segments': segments,
+    }
+
+
+def table_namespace(listing_id):
+    return f'pricing:{listing_id}'
+
+
+def rate_tables(listings):
+    """
+    {listing id: rate table} for `listings`, pairs of (id, price_per_night).
+    Tables are cached per listing under a version its rule changes move
+    (see signals.py) and keyed on the base price too, which bulk updates
+    change without signals. The missing ones are compiled from one query.
+    """
+    prices = dict(listings)
+    versions = get_versions([table_namespace(listing_id) for listing_id in prices])
+    keys = {
+        listing_id: f'readcache:{table_namespace(listing_id)}:v{versions[table_namespace(listing_id)]}:{price}'
+        for listing_id, price in prices.items()
+    }
+    cached = cache.get_many(list(keys.values()))
+    tables = {listing_id: cached[key] for listing_id, key in keys.items() if key in cached}
+    missing = [listing_id for listing_id in prices if listing_id not in tables]
+    metrics.increment('read_cache_requests_total', len(tables), namespace='pricing', result='hit')
+    if not missing:
+        return tables
+
+    metrics.increment('read_cache_requests_total', len(missing), namespace='pricing', result='miss')
+    rules = defaultdict(list)
+    for rule in PriceRule.objects.filter(listing_id__in=missing).order_by('created_at', 'id').values(*RULE_FIELDS):
+        rules[rule['listing_id']].append(rule)
+    compiled = {listing_id: compile_rules(prices[listing_id], rules[listing_id]) for listing_id in missing}
+    cache.set_many({keys[listing_id]: table for listing_id, table in compiled.items()},
+                   timeout=settings.READ_CACHE_TIMEOUT)
+    tables.update(compiled)
+    return tables
+
+
+def quote_listings(listings, start, end):
+    """Quotes for a stay from `start` up to `end` at each of `listings`, pairs of (id, price_per_night)."""
+    listings = list(listings)
+    tables = rate_tables(listings)
+    return [
+        {'listing': listing_id, 'start': start, 'end': end, **price_stay(tables[listing_id], start, end)}
+        for listing_id, _ in listings
+    ]
+
+
+def quote_stay(listing, start, end):
+    return quote_listings([(listing.id, listing.price_per_night)], start, end)[0]
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Now
+
+from .cache import invalidate
+from .models import Listing, Review
+
+RATINGS = range(1, 6)
+AGGREGATE_FIELDS = ['review_count', 'rating_sum', 'rating_avg'] + [f'rating_{r}_count' for r in RATINGS]
+
+
+def apply_review(listing_id, rating, sign):
+    """
+    Adds (sign=1) or removes (sign=-1) one review from a listing's aggregates
+    in a single UPDATE, so concurrent reviews cannot lose increments.
+    """
+    review_count = F('review_count') + sign
+    rating_sum = F('rating_sum') + sign * rating
+    changes = {
+        'review_count': review_count,
+        'rating_sum': rating_sum,
+        # Right-hand sides read the pre-update row, hence the recomputed count.
+        'rating_avg': Coalesce(
+            Cast(rating_sum, FloatField()) / NullIf(review_count, 0), Value(0.0), output_field=FloatField()
+        ),
+        'updated_at': Now(),
+    }
+    if rating in RATINGS:
+        changes[f'rating_{rating}_count'] = F(f'rating_{rating}_count') + sign
+    Listing.objects.filter(id=listing_id).update(**changes)
+
+
+def aggregates_for(listing_ids):
+    stats = Review.objects.filter(listing_id__in=listing_ids).values('listing_id').annotate(
+        review_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{r}_count': Count('id', filter=Q(rating=r)) for r in RATINGS},
+    )
+    result = {}
+    for row in stats:
+        listing_id = row.pop('listing_id')
+        row['rating_avg'] = row['rating_sum'] / row['review_count']
+        result[listing_id] = row
+    return result
+
+
+def recompute_ratings(listing_ids=None, batch_size=1000):
+    """
+    Recomputes the aggregates from the reviews table in batches of listings
+    and rewrites only the listings that drifted. Returns how many were fixed.
+    """
+    listings = Listing.objects.order_by('id')
+    if listing_ids is not None:
+        listings = listings.filter(id__in=listing_ids)
+    empty = dict.fromkeys(AGGREGATE_FIELDS, 0)
+
+    fixed = 0
+    last_id = None
+    while True:
+        batch = listings.filter(id__gt=last_id) if last_id else listings
+        current = list(batch.values('id', *AGGREGATE_FIELDS)[:batch_size])
+        if not current:
+            if fixed:
+                invalidate('listings', 'bookings')
+            return fixed
+        last_id = current[-1]['id']
+
+        expected = aggregates_for([row['id'] for row in current])
+        stale = []
+        for row in current:
+            listing_id = row.pop('id')
+            wanted = expected.get(listing_id, empty)
+            if any(row[field] != wanted[field] for field in AGGREGATE_FIELDS):
+                stale.append(Listing(id=listing_id, **wanted))
+        if stale:
+            with transaction.atomic():
+                Listing.objects.bulk_update(stale, AGGREGATE_FIELDS)
+                Listing.objects.filter(id__in=[listing.id for listing in stale]).update(updated_at=Now())
+            fixed += len(stale)
@@ -0,0 +1,187 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .cache import invalidate
+from .models import Listing, Location, Region, RegionKind
+
+LEVELS = [RegionKind.COUNTRY, RegionKind.STATE, RegionKind.CITY]
+# How a listing reaches a region of each kind: plain FK equality joins.
+LISTING_LOOKUPS = {
+    RegionKind.CITY: 'location__region',
+    RegionKind.STATE: 'location__region__parent',
+    RegionKind.COUNTRY: 'location__region__parent__parent',
+}
+
+
+def clean_name(name):
+    return ' '.join(name.split())
+
+
+def region_key(*names):
+    return '/'.join(clean_name(name).casefold().replace('/', '%2F') for name in names)
+
+
+def location_key(location):
+    return region_key(location.country, location.state, location.city)
+
+
+def resolve_region(country, state, city, known=None):
+    """
+    Returns the city Region for a place, creating whichever of its country,
+    state and city nodes are missing. `known` is an optional {key: Region}
+    cache that is read and filled.
+    """
+    names = (country, state, city)
+    keys = [region_key(*names[:depth]) for depth in range(1, 4)]
+    if known is None:
+        known = Region.objects.in_bulk(keys, field_name='key')
+    parent = None
+    for kind, name, key in zip(LEVELS, names, keys):
+        region = known.get(key)
+        if region is None:
+            region, _ = Region.objects.get_or_create(
+                key=key, defaults={'name': clean_name(name), 'kind': kind, 'parent': parent},
+            )
+            known[key] = region
+        parent = region
+    return parent
+
+
+def region_chain(region_id):
+    """Returns the ids of a city region and its state and country."""
+    if region_id is None:
+        return []
+    chain = Region.objects.filter(id=region_id).values_list('id', 'parent_id', 'parent__parent_id').first()
+    return [region for region in chain or [] if region is not None]
+
+
+def location_chain(location_id):
+    region_id = Location.objects.filter(id=location_id).values_list('region_id', flat=True).first()
+    return region_chain(region_id)
+
+
+def shift_listing_count(chain, delta):
+    if chain and delta:
+        Region.objects.filter(id__in=chain).update(listing_count=F('listing_count') + delta)
+
+
+def shift_listing_counts(location_deltas):
+    """
+    shift_listing_count for {location_id: delta}, with the chains of all
+    the locations read in one query, e.g. after bulk listing writes.
+    """
+    deltas = defaultdict(int)
+    chains = Location.objects.filter(id__in=[location_id for location_id, delta in location_deltas.items() if delta]) \
+        .values_list('id', 'region_id', 'region__parent_id', 'region__parent__parent_id')
+    for location_id, *chain in chains:
+        for region_id in chain:
+            if region_id is not None:
+                deltas[region_id] += location_deltas[location_id]
+    by_delta = defaultdict(list)
+    for region_id, delta in deltas.items():
+        by_delta[delta].append(region_id)
+    for delta, region_ids in by_delta.items():
+        shift_listing_count(region_ids, delta)
+
+
+def prune_regions(chain):
+    """
+    Deletes the nodes of `chain` (city first) left without a location or
+    children, e.g. the old place of a renamed or deleted location.
+    """
+    for region_id in chain:
+        deleted, _ = Region.objects.filter(id=region_id, children__isnull=True, location__isnull=True).delete()
+        if not deleted:
+            break
+
+
+def listings_in_region(region, queryset=None):
+    queryset = Listing.objects.all() if queryset is None else queryset
+    return queryset.filter(**{LISTING_LOOKUPS[region.kind]: region})
+
+
+def region_tree():
+    """Returns every region as nested dicts, countries first, by name."""
+    nodes = {}
+    roots = []
+    rows = Region.objects.order_by('name').values('id', 'name', 'kind', 'listing_count', 'parent_id')
+    for row in rows:
+        nodes[row['id']] = {**row, 'children': []}
+    for node in nodes.values():
+        parent = nodes.get(node.pop('parent_id'))
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+
+def merge_duplicate_locations():
+    """
+    Folds locations naming the same place (ignoring case and spacing) into
+    one, moving their listings over. Returns the number of rows removed.
+    """
+    groups = defaultdict(list)
+    for location in Location.objects.order_by('id'):
+        groups[location_key(location)].append(location)
+    removed = 0
+    for locations in groups.values():
+        if len(locations) < 2:
+            continue
+        # Keep the one already placed in the tree, if any.
+        keep = next((location for location in locations if location.region_id), locations[0])
+        duplicates = [location.id for location in locations if location.id != keep.id]
+        with transaction.atomic():
+            Listing.objects.filter(location_id__in=duplicates).update(location=keep)
+            Location.objects.filter(id__in=duplicates).delete()
+        removed += len(duplicates)
+    return removed
+
+
+def recount_regions():
+    """Recomputes every node's listing count. Returns how many changed."""
+    per_city = dict(
+        Listing.objects.values_list('location__region_id').annotate(Count('id')).order_by()
+    )
+    regions = list(Region.objects.all())
+    totals = defaultdict(int)
+    by_id = {region.id: region for region in regions}
+    for city in (region for region in regions if region.kind == RegionKind.CITY):
+        count = per_city.get(city.id, 0)
+        node = city
+        while node is not None:
+            totals[node.id] += count
+            node = by_id.get(node.parent_id)
+    changed = []
+    for region in regions:
+        if region.listing_count != totals[region.id]:
+            region.listing_count = totals[region.id]
+            changed.append(region)
+    Region.objects.bulk_update(changed, ['listing_count'], batch_size=1000)
+    if changed:
+        invalidate('regions')
+    return len(changed)
+
+
+@transaction.atomic
+def rebuild_regions():
+    """
+    Merges duplicate locations, places every location in the tree, drops
+    nodes left without locations and recounts. Bulk loads skip the signals
+    that do this incrementally, so they call it afterwards.
+    Returns (locations merged, locations placed, counts changed).
+    """
+    merged = merge_duplicate_locations()
+    known = {region.key: region for region in Region.objects.all()}
+    placed = 0
+    for location in Location.objects.select_related('region'):
+        key = location_key(location)
+        if location.region is None or location.region.key != key:
+            region = resolve_region(location.country, location.state, location.city, known)
+            Location.objects.filter(id=location.id).update(region=region)
+            placed += 1
+    for kind in reversed(LEVELS):
+        empty = Region.objects.filter(kind=kind, children__isnull=True)
+        if kind == RegionKind.CITY:
+            empty = empty.filter(location__isnull=True)
+        empty.delete()
+    return merged, placed, recount_regions()
@@ -0,0 +1,101 @@
+import csv
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Floats orjson spells differently from the json module ("1e-7" for 1e-07,
+# "0.00001" for 1e-05) all match this, anchored on the characters that
+# precede a number in compact JSON; output containing it is rendered again
+# the slow way, which costs time only when it was a string that matched.
+FLOAT_MISMATCH = re.compile(rb'[:,\[]-?(?:\d+(?:\.\d+)?e-|0\.0000)')
+# Spreadsheets run cells starting with these as formulas.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson, producing the same bytes as the
+    default compact output. Indented output (the browsable API, or
+    `; indent=` in Accept), anything orjson cannot encode and floats it
+    spells differently go through JSONRenderer, as does everything when
+    orjson is not installed. Unlike JSONRenderer, NaN and infinity become
+    null instead of raising.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Dates go through the DRF encoder, which formats them its own way.
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if FLOAT_MISMATCH.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these so the output is also valid JavaScript.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class Lines:
+    """File-like object for csv.writer that hands back what it writes."""
+
+    def write(self, line):
+        return line
+
+
+def rows_of(data):
+    """(columns, chunks) for rendering plain data, e.g. an error response."""
+    rows = data if isinstance(data, list) else [data]
+    columns = list(dict.fromkeys(name for row in rows for name in row))
+    return columns, [[tuple(row.get(name) for name in columns) for row in rows]]
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Renders rows as CSV with a header line. `stream` renders export chunks
+    lazily (see exports.export_response); `render` handles ordinary data
+    such as errors.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.stream(*rows_of(data)))
+
+    def stream(self, columns, chunks):
+        writer = csv.writer(Lines())
+        yield writer.writerow(columns).encode()
+        for chunk in chunks:
+            yield ''.join(writer.writerow([self.cell(value) for value in row]) for row in chunk).encode()
+
+    @staticmethod
+    def cell(value):
+        if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+            return "'" + value
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renders rows as newline-delimited JSON objects, like CSVRenderer."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b''.join(self.stream(*rows_of(data)))
+
+    def stream(self, columns, chunks):
+        json = FastJSONRenderer()
+        for chunk in chunks:
+            yield b''.join(json.render(dict(zip(columns, row))) + b'\n' for row in chunk)
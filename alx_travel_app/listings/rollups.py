@@ -0,0 +1,174 @@
+import calendar
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Booking, BookingStatus, Listing, ListingDailyStats, Payment, PaymentStatus, RollupWatermark
+
+WATERMARK = 'listing_daily_stats'
+STATS_FIELDS = ['nights_booked', 'check_ins', 'revenue']
+ONE_DAY = timedelta(days=1)
+
+
+def daily_stats(listing_ids):
+    """{(listing_id, date): [nights_booked, check_ins, revenue]} from the bookings and payments."""
+    paid = dict(
+        Payment.objects.filter(booking__listing_id__in=listing_ids, payment_status=PaymentStatus.SUCCESS)
+        .values('booking_id').annotate(total=Sum('amount')).values_list('booking_id', 'total')
+    )
+    stats = defaultdict(lambda: [0, 0, 0])
+    bookings = Booking.objects.filter(listing_id__in=listing_ids, status=BookingStatus.ACTIVE).values_list(
+        'id', 'listing_id', 'start_date', 'end_date',
+    )
+    for booking_id, listing_id, start_date, end_date in bookings:
+        day = start_date
+        while day < end_date:
+            stats[listing_id, day][0] += 1
+            day += ONE_DAY
+        stats[listing_id, start_date][1] += 1
+        stats[listing_id, start_date][2] += paid.get(booking_id, 0)
+    return stats
+
+
+def rebuild_stats(listing_ids):
+    """Rewrites the daily stats of `listing_ids` from scratch. Returns the number of rows written."""
+    hosts = dict(Listing.objects.filter(id__in=listing_ids).values_list('id', 'host_id'))
+    rows = [
+        ListingDailyStats(
+            listing_id=listing_id, host_id=hosts[listing_id], date=day, **dict(zip(STATS_FIELDS, values)),
+        )
+        for (listing_id, day), values in daily_stats(list(hosts)).items()
+    ]
+    with transaction.atomic():
+        ListingDailyStats.objects.filter(listing_id__in=listing_ids).delete()
+        ListingDailyStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def changed_listings(since, until):
+    """Listings whose own row, bookings or payments were written in (since, until]."""
+    window = {'updated_at__gt': since, 'updated_at__lte': until}
+    listing_ids = set(Listing.objects.filter(**window).values_list('id', flat=True))
+    listing_ids.update(Booking.objects.filter(**window).values_list('listing_id', flat=True).distinct())
+    listing_ids.update(Payment.objects.filter(**window).values_list('booking__listing_id', flat=True).distinct())
+    return sorted(listing_ids)
+
+
+def update_rollups(batch_size=None):
+    """
+    Rebuilds the daily stats of the listings that changed since the last
+    run, in batches of ROLLUP_BATCH_SIZE listings. Each run rereads the
+    last ROLLUP_OVERLAP seconds before the watermark, since a row's
+    updated_at is set before its transaction commits. The first run only
+    starts the watermark; history is loaded by backfill_rollups. Returns
+    the number of listings rebuilt.
+    """
+    batch_size = batch_size or settings.ROLLUP_BATCH_SIZE
+    now = timezone.now()
+    watermark, created = RollupWatermark.objects.get_or_create(name=WATERMARK, defaults={'value': now})
+    if created:
+        return 0
+    listing_ids = changed_listings(watermark.value - timedelta(seconds=settings.ROLLUP_OVERLAP), now)
+    for start in range(0, len(listing_ids), batch_size):
+        rebuild_stats(listing_ids[start:start + batch_size])
+    RollupWatermark.objects.filter(name=WATERMARK).update(value=now)
+    return len(listing_ids)
+
+
+def backfill_rollups(chunk_size=1000, progress=None):
+    """
+    Rebuilds the daily stats of every listing, `chunk_size` listings at a
+    time, then moves the watermark to the start of the backfill so
+    update_rollups carries on from there. Calls `progress(listings, rows)`
+    after each chunk. Returns the totals.
+    """
+    started = timezone.now()
+    listings = Listing.objects.order_by('id')
+    last_id = None
+    done = rows = 0
+    while True:
+        batch = listings.filter(id__gt=last_id) if last_id else listings
+        listing_ids = list(batch.values_list('id', flat=True)[:chunk_size])
+        if not listing_ids:
+            break
+        rows += rebuild_stats(listing_ids)
+        done += len(listing_ids)
+        last_id = listing_ids[-1]
+        if progress:
+            progress(done, rows)
+    RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': started})
+    return done, rows
+
+
+def month_starts(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def month_end(month):
+    return month.replace(day=calendar.monthrange(month.year, month.month)[1])
+
+
+def occupancy(nights, listings, days):
+    return round(nights / (listings * days), 4) if listings and days else 0
+
+
+def host_stats(host, start, end):
+    """
+    Occupancy, check-ins and revenue of `host`'s listings for the months
+    from `start` to `end`, per month and per listing, read from the daily
+    rollups. Occupancy is over the listings the host has now.
+    """
+    end = month_end(end)
+    rollups = ListingDailyStats.objects.filter(host=host, date__gte=start, date__lte=end)
+    sums = {field: Sum(field) for field in STATS_FIELDS}
+    by_month = {
+        row.pop('month'): row
+        for row in rollups.annotate(month=TruncMonth('date')).values('month').annotate(**sums).order_by()
+    }
+    by_listing = {row.pop('listing_id'): row for row in rollups.values('listing_id').annotate(**sums).order_by()}
+    listings = list(Listing.objects.filter(host=host).order_by('title', 'id').values('id', 'title'))
+    empty = dict.fromkeys(STATS_FIELDS, 0)
+    days = (end - start).days + 1
+
+    months = []
+    for month in month_starts(start, end):
+        totals = by_month.get(month, empty)
+        months.append({
+            'month': month.strftime('%Y-%m'),
+            **totals,
+            'occupancy_rate': occupancy(totals['nights_booked'], len(listings), month_end(month).day),
+        })
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'listings': len(listings),
+        **{field: sum(month[field] for month in months) for field in STATS_FIELDS},
+        'occupancy_rate': occupancy(sum(month['nights_booked'] for month in months), len(listings), days),
+        'months': months,
+        'by_listing': [
+            {
+                'listing': listing['id'],
+                'title': listing['title'],
+                **by_listing.get(listing['id'], empty),
+                'occupancy_rate': occupancy(by_listing.get(listing['id'], empty)['nights_booked'], 1, days),
+            }
+            for listing in listings
+        ],
+    }
+
+
+def default_months():
+    """The last twelve months, this one included."""
+    end = timezone.localdate().replace(day=1)
+    start = end
+    for _ in range(11):
+        start = (start - ONE_DAY).replace(day=1)
+    return start, end
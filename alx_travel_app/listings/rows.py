@@ -0,0 +1,121 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+class Row:
+    """Attribute access to a .values() row, for SerializerMethodField methods."""
+    __slots__ = ('row', 'prefix')
+
+    def __init__(self, row, prefix):
+        self.row, self.prefix = row, prefix
+
+    def __getattr__(self, name):
+        try:
+            return self.row[self.prefix + name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def pk_value(value):
+    return value
+
+
+def datetime_representation(field):
+    """
+    DateTimeField.to_representation with the output format and timezone
+    looked up once rather than per value, for aware datetimes in ISO 8601.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def to_representation(value):
+        if not value or value.utcoffset() is None:
+            return field.to_representation(value)
+        try:
+            value = value.astimezone(field_timezone).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
+
+
+def read_value(column, to_representation):
+    def read(row):
+        value = row[column]
+        # Like Serializer.to_representation, None skips the field's own step.
+        return None if value is None else to_representation(value)
+    return read
+
+
+def read_nested(column, represent):
+    def read(row):
+        return None if row[column] is None else represent(row)
+    return read
+
+
+def read_method(method, prefix):
+    return lambda row: method(Row(row, prefix))
+
+
+def compile_rows(serializer, prefix=''):
+    """
+    Compiles a ModelSerializer into (columns, represent): the .values()
+    columns its readable fields need, and a function turning one such row
+    into the dict `serializer.data` would hold for the model instance. Each
+    field still formats its own values, so the output is the same; only
+    the model instances and per-field attribute lookups are skipped.
+
+    Plain model fields, primary key relations and nested (not many)
+    ModelSerializers compile; a SerializerMethodField compiles when
+    `Meta.row_sources` names the fields its method reads. Returns None for
+    anything else, and callers fall back to the serializer.
+    """
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return None
+    meta = serializer.Meta
+    opts = meta.model._meta
+    row_sources = getattr(meta, 'row_sources', {})
+    columns, readers = [], []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.SerializerMethodField):
+            if field.field_name not in row_sources:
+                return None
+            columns.extend(prefix + name for name in row_sources[field.field_name])
+            readers.append((field.field_name, read_method(getattr(field.parent, field.method_name), prefix)))
+            continue
+        if len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        column = prefix + field.source
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            # values() gives the related pk, which is what the field returns.
+            to_representation = field.pk_field.to_representation if field.pk_field else pk_value
+            columns.append(column)
+            readers.append((field.field_name, read_value(column, to_representation)))
+        elif isinstance(field, serializers.ModelSerializer):
+            nested = compile_rows(field, f'{column}__')
+            if nested is None:
+                return None
+            columns.append(column)
+            columns.extend(nested[0])
+            readers.append((field.field_name, read_nested(column, nested[1])))
+        elif isinstance(field, (serializers.BaseSerializer, serializers.RelatedField)) or model_field.is_relation:
+            return None
+        else:
+            to_representation = (datetime_representation(field) if isinstance(field, serializers.DateTimeField)
+                                 else field.to_representation)
+            columns.append(column)
+            readers.append((field.field_name, read_value(column, to_representation)))
+
+    def represent(row):
+        return {name: read(row) for name, read in readers}
+
+    return list(dict.fromkeys(columns)), represent
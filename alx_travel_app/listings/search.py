@@ -0,0 +1,138 @@
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from .models import Listing, SearchTerm
+
+TOKEN = re.compile(r'\w+')
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or the to up with'.split())
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+# A title word counts as much as this many description words.
+TITLE_WEIGHT = 3
+# Term frequency saturation, as in BM25: the 2nd and 3rd mention of a word
+# add less than the first.
+K1 = 1.2
+LISTING_COUNT_TIMEOUT = 300
+SELECTIVE_TERM_RATIO = 4
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN.findall((text or '').lower())
+        if len(token) > 1 and len(token) <= MAX_TERM_LENGTH and token not in STOPWORDS
+    ]
+
+
+def term_weights(title, description):
+    """Returns {term: weight} for one listing."""
+    frequencies = Counter(tokenize(description))
+    for token in tokenize(title):
+        frequencies[token] += TITLE_WEIGHT
+    return {term: tf * (K1 + 1) / (tf + K1) for term, tf in frequencies.items()}
+
+
+def index_listing(listing):
+    """Brings the index rows of one listing in line with its current text."""
+    wanted = term_weights(listing.title, listing.description)
+    existing = dict(SearchTerm.objects.filter(listing=listing).values_list('term', 'weight'))
+    removed = existing.keys() - wanted.keys()
+    added = [SearchTerm(listing=listing, term=term, weight=weight)
+             for term, weight in wanted.items() if term not in existing]
+    changed = [term for term, weight in wanted.items() if term in existing and existing[term] != weight]
+    with transaction.atomic():
+        if removed:
+            SearchTerm.objects.filter(listing=listing, term__in=removed).delete()
+        if added:
+            SearchTerm.objects.bulk_create(added)
+        for term in changed:
+            SearchTerm.objects.filter(listing=listing, term=term).update(weight=wanted[term])
+
+
+def rebuild_search_index(listing_ids=None, batch_size=1000):
+    """
+    Re-indexes all listings, or those in `listing_ids`, a batch at a time.
+    Returns the number of index rows written.
+    """
+    listings = Listing.objects.order_by('id')
+    if listing_ids is not None:
+        listings = listings.filter(id__in=listing_ids)
+    written = 0
+    last_id = None
+    while True:
+        batch = listings.filter(id__gt=last_id) if last_id else listings
+        rows = list(batch.values_list('id', 'title', 'description')[:batch_size])
+        if not rows:
+            return written
+        last_id = rows[-1][0]
+        terms = [
+            SearchTerm(listing_id=listing_id, term=term, weight=weight)
+            for listing_id, title, description in rows
+            for term, weight in term_weights(title, description).items()
+        ]
+        with transaction.atomic():
+            SearchTerm.objects.filter(listing_id__in=[row[0] for row in rows]).delete()
+            SearchTerm.objects.bulk_create(terms, batch_size=batch_size)
+        written += len(terms)
+
+
+def listing_count():
+    # Only feeds the idf, so a few minutes stale is fine.
+    return cache.get_or_set('search:listing_count', Listing.objects.count, LISTING_COUNT_TIMEOUT)
+
+
+def search_listings(query, queryset=None, limit=20):
+    """
+    Returns the listings of `queryset` whose title or description contain
+    every term of `query`, best first, each with a `search_score`: the sum
+    over the terms of the saturated, title-boosted term frequency times the
+    term's inverse document frequency.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    frequencies = dict(
+        SearchTerm.objects.filter(term__in=terms).values_list('term').annotate(Count('id')).order_by()
+    )
+    if len(frequencies) < len(terms):
+        return []
+
+    total = max(listing_count(), max(frequencies.values()))
+    idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in frequencies.items()}
+    rarest = min(terms, key=frequencies.get)
+
+    matches = SearchTerm.objects.filter(term__in=terms)
+    if frequencies[rarest] * SELECTIVE_TERM_RATIO < sum(frequencies.values()):
+        # Every match contains the rarest term, so when it is selective only
+        # its postings are candidates and the common terms are looked up for
+        # those listings alone instead of being aggregated in full.
+        matches = matches.filter(listing_id__in=SearchTerm.objects.filter(term=rarest).values('listing_id'))
+    queryset = Listing.objects.all() if queryset is None else queryset
+    if queryset.query.has_filters():
+        matches = matches.filter(listing_id__in=queryset.values('id'))
+    ranked = list(
+        matches.values('listing_id')
+        .annotate(
+            hits=Count('id'),
+            score=Sum(
+                Case(*[When(term=term, then=F('weight') * Value(idf[term])) for term in terms],
+                     output_field=FloatField())
+            ),
+        )
+        .filter(hits=len(terms))
+        .order_by('-score', 'listing_id')
+        .values_list('listing_id', 'score')[:limit]
+    )
+
+    listings = queryset.in_bulk([listing_id for listing_id, _ in ranked])
+    results = []
+    for listing_id, score in ranked:
+        listing = listings.get(listing_id)
+        if listing is not None:
+            listing.search_score = score
+            results.append(listing)
+    return results
@@ -1,5 +1,94 @@
+from uuid import UUID
+
 from rest_framework import serializers
-from .models import User, Listing, Booking, Payment, Location, Role, UserRole
+from .models import User, Listing, Booking, Payment, Location, Region, Role, UserRole, PriceRule, PriceRuleKind
+from .availability import is_available
+from .regions import region_key
+from .rollups import default_months
+
+BOOKED_DATES_MESSAGE = "Listing is already booked for the selected dates."
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+MAX_QUOTE_NIGHTS = 365
+MAX_QUOTE_LISTINGS = 100
+
+
+def requested_expansions(request, expandable):
+    """
+    Returns the names from `?expand=a,b` that `expandable` allows. Expansion
+    only applies to reads, so writes keep taking plain ids.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return []
+    names = (name.strip() for name in request.query_params.get('expand', '').split(','))
+    return [name for name in dict.fromkeys(names) if name in expandable]
+
+
+class ExpandableFieldsMixin:
+    """
+    Swaps foreign key ids for nested objects when the client asks for them
+    with `?expand=`. `Meta.expandable_fields` maps each field to the
+    serializer used for it.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in requested_expansions(self.context.get('request'), expandable):
+            self.fields[name] = expandable[name](read_only=True)
+
+
+def parse_id(value):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of writes in one pass. The objects the items' primary
+    key fields name are loaded with one query per field rather than one per
+    item. Given `instances` ({id: instance}), each item updates the
+    instance its "id" names. Errors come back as a list in item order, {}
+    for valid items, like any many=True serializer.
+    """
+
+    def __init__(self, *args, instances=None, **kwargs):
+        self.instances = instances
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.load_related(data)
+        return super().to_internal_value(data)
+
+    def load_related(self, data):
+        for name, field in self.child.fields.items():
+            if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.read_only or field.pk_field:
+                continue
+            ids = {parse_id(item.get(name)) for item in data if isinstance(item, dict)} - {None}
+            field.to_internal_value = preloaded(field, field.get_queryset().in_bulk(ids))
+
+    def run_child_validation(self, data):
+        if self.instances is not None:
+            instance = self.instances.get(parse_id(data.get('id'))) if isinstance(data, dict) else None
+            if instance is None:
+                raise serializers.ValidationError({'id': ["Not found."]})
+            self.child.instance = instance
+            self.child.initial_data = data
+        return super().run_child_validation(data)
+
+
+def preloaded(field, objects):
+    """PrimaryKeyRelatedField.to_internal_value reading `objects` ({pk: object}) instead of the database."""
+    def to_internal_value(data):
+        if isinstance(data, bool):
+            field.fail('incorrect_type', data_type=type(data).__name__)
+        instance = objects.get(parse_id(data))
+        if instance is None:
+            field.fail('does_not_exist', pk_value=data)
+        return instance
+    return to_internal_value
+
 
 class RoleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -33,17 +122,143 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = ['id', 'country', 'state', 'city', 'region']
+        read_only_fields = ['id', 'region']
+
+    def validate(self, attrs):
+        names = [attrs.get(field, getattr(self.instance, field, '')) for field in ('country', 'state', 'city')]
+        duplicates = Location.objects.filter(region__key=region_key(*names))
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("Location already exists.")
+        return attrs
+
+class RegionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Region
+        fields = ['id', 'name', 'kind', 'listing_count', 'parent']
+        read_only_fields = fields
+
+class HostSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+
+class GuestSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'email']
+
+class ListingSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    rating_histogram = serializers.SerializerMethodField()
+
     class Meta:
         model = Listing
-        fields = ['id', 'title', 'price_per_night', 'description', 'image_url', 'location', 'host', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'price_per_night', 'description', 'image_url', 'location', 'host',
+                  'review_count', 'rating_avg', 'rating_histogram', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'review_count', 'rating_avg', 'created_at', 'updated_at']
+        expandable_fields = {'location': LocationSerializer, 'host': HostSerializer}
+        row_sources = {'rating_histogram': [f'rating_{rating}_count' for rating in range(1, 6)]}
+
+    def get_rating_histogram(self, obj):
+        return {str(rating): getattr(obj, f'rating_{rating}_count') for rating in range(1, 6)}
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    city = serializers.CharField(required=False)
+    max_price = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError("'end' must be after 'start'.")
+        return attrs
+
+class HostStatsSerializer(serializers.Serializer):
+    start = serializers.DateField(input_formats=['%Y-%m'], required=False)
+    end = serializers.DateField(input_formats=['%Y-%m'], required=False)
+
+    def validate(self, attrs):
+        start, end = default_months()
+        start, end = attrs.get('start', start), attrs.get('end', end)
+        if end < start:
+            raise serializers.ValidationError("'end' must not be before 'start'.")
+        if (end.year - start.year) * 12 + end.month - start.month >= 36:
+            raise serializers.ValidationError("At most 36 months at a time.")
+        return {'start': start, 'end': end}
+
+class ListingSearchSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    city = serializers.CharField(required=False)
+    max_price = serializers.IntegerField(required=False, min_value=0)
 
-class BookingSerializer(serializers.ModelSerializer):
+class QuoteSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError("'end' must be after 'start'.")
+        if (attrs['end'] - attrs['start']).days > MAX_QUOTE_NIGHTS:
+            raise serializers.ValidationError(f"At most {MAX_QUOTE_NIGHTS} nights at a time.")
+        return attrs
+
+class BatchQuoteSerializer(QuoteSerializer):
+    ids = serializers.CharField()
+
+    def validate_ids(self, ids):
+        try:
+            ids = list(dict.fromkeys(UUID(listing_id.strip()) for listing_id in ids.split(',') if listing_id.strip()))
+        except ValueError:
+            raise serializers.ValidationError("Must be comma-separated listing ids.")
+        if not ids:
+            raise serializers.ValidationError("Must name at least one listing.")
+        if len(ids) > MAX_QUOTE_LISTINGS:
+            raise serializers.ValidationError(f"At most {MAX_QUOTE_LISTINGS} listings at a time.")
+        return ids
+
+class PriceRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PriceRule
+        fields = ['id', 'kind', 'start_date', 'end_date', 'price_per_night', 'min_nights', 'discount_percent',
+                  'listing', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'listing', 'created_at', 'updated_at']
+
+    def validate(self, attrs):
+        rule = {field: attrs.get(field, getattr(self.instance, field, None)) for field in self.Meta.fields}
+        if rule['start_date'] and rule['end_date'] and rule['end_date'] <= rule['start_date']:
+            raise serializers.ValidationError("'end_date' must be after 'start_date'.")
+        if rule['kind'] == PriceRuleKind.LENGTH_OF_STAY:
+            required = ['min_nights', 'discount_percent']
+        else:
+            required = ['price_per_night']
+        missing = {field: "Required for this kind of rule." for field in required if rule[field] is None}
+        if missing:
+            raise serializers.ValidationError(missing)
+        return attrs
+
+class BookingSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['id', 'start_date', 'end_date', 'status', 'total_price', 'payment_url',  'guest', 'listing', 'created_at', 'updated_at']
         read_only_fields = ['id', 'payment_url', 'total_price', 'status', 'created_at', 'updated_at']
+        expandable_fields = {'listing': ListingSerializer, 'guest': GuestSerializer}
+
+    def validate(self, attrs):
+        # Cheap early rejection; the unique constraint on BookedNight is what
+        # actually guarantees no overlap when requests race.
+        listing = attrs.get('listing', getattr(self.instance, 'listing', None))
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        # Bulk writes check the whole batch at once (see bulk.py).
+        if listing and start_date and end_date and end_date > start_date and not self.context.get('bulk'):
+            if not is_available(listing, start_date, end_date, exclude_booking=self.instance):
+                raise serializers.ValidationError(BOOKED_DATES_MESSAGE)
+        return attrs
 
     def validate_booking_days(self, days):
         if days < 1:
@@ -51,13 +266,8 @@ class BookingSerializer(serializers.ModelSerializer):
         return days
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = "__all__"
-
-class LocationSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Location
-        fields = ['id', 'country', 'state', 'city']
-        read_only_fields = ['id']
\ No newline at end of file
+        expandable_fields = {'booking': BookingSerializer}
\ No newline at end of file
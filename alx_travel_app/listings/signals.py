@@ -0,0 +1,140 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .availability import sync_booking_nights
+from .cache import invalidate
+from .models import Booking, Listing, Location, PriceRule, Review, User
+from .pricing import table_namespace
+from .ratings import apply_review
+from .regions import clean_name, location_chain, prune_regions, region_chain, resolve_region, shift_listing_count
+from .rollups import rebuild_stats
+from .search import index_listing
+
+# Read cache namespaces whose responses embed each model: listings inline
+# their location and host on ?expand= and their review aggregates; the
+# region tree counts listings. Nothing is cached under 'bookings'; its
+# version is the booking list ETag, and bookings inline their listing and
+# guest on ?expand=.
+CACHE_DEPENDENCIES = {
+    Listing: ['listings', 'regions', 'bookings'],
+    Location: ['listings', 'locations', 'regions', 'bookings'],
+    User: ['listings', 'bookings'],
+    Review: ['listings', 'bookings'],
+    Booking: ['bookings'],
+}
+
+
+@receiver(post_save, sender=Booking)
+def update_booked_nights(sender, instance, **kwargs):
+    # Deleted bookings take their nights with them through the FK cascade.
+    sync_booking_nights(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def rebuild_listing_stats(sender, instance, origin=None, **kwargs):
+    # Deletes leave no updated_at for the rollup task to find. Deleting the
+    # listing itself takes its stats with it.
+    if isinstance(origin, Listing) or getattr(origin, 'model', None) is Listing:
+        return
+    transaction.on_commit(lambda: rebuild_stats([instance.listing_id]))
+
+
+@receiver(post_save, sender=PriceRule)
+@receiver(post_delete, sender=PriceRule)
+def invalidate_rate_table(sender, instance, **kwargs):
+    invalidate(table_namespace(instance.listing_id))
+
+
+@receiver(post_save, sender=Listing)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'title', 'description'} & set(update_fields):
+        return
+    index_listing(instance)
+
+
+@receiver(pre_save, sender=Location)
+def place_location_in_region_tree(sender, instance, **kwargs):
+    instance.country, instance.state, instance.city = (
+        clean_name(instance.country), clean_name(instance.state), clean_name(instance.city)
+    )
+    previous = Location.objects.filter(pk=instance.pk).values_list('region_id', flat=True).first()
+    instance._previous_region_chain = region_chain(previous)
+    instance.region = resolve_region(instance.country, instance.state, instance.city)
+
+
+@receiver(post_save, sender=Location)
+def move_location_listings(sender, instance, created, **kwargs):
+    new_chain = region_chain(instance.region_id)
+    old_chain = getattr(instance, '_previous_region_chain', [])
+    if created or old_chain == new_chain:
+        return
+    moved = Listing.objects.filter(location=instance).count()
+    shift_listing_count(old_chain, -moved)
+    shift_listing_count(new_chain, moved)
+    prune_regions(old_chain)
+
+
+@receiver(post_delete, sender=Location)
+def prune_location_regions(sender, instance, **kwargs):
+    prune_regions(region_chain(instance.region_id))
+
+
+@receiver(pre_save, sender=Listing)
+def remember_previous_location(sender, instance, update_fields=None, **kwargs):
+    if update_fields and 'location' not in update_fields:
+        instance._previous_location_id = instance.location_id
+        return
+    instance._previous_location_id = Listing.objects.filter(pk=instance.pk).values_list('location_id', flat=True).first()
+
+
+@receiver(post_save, sender=Listing)
+def count_listing_in_regions(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_location_id', None)
+    if previous == instance.location_id:
+        return
+    if previous:
+        shift_listing_count(location_chain(previous), -1)
+    shift_listing_count(location_chain(instance.location_id), 1)
+    instance._previous_location_id = instance.location_id
+
+
+@receiver(post_delete, sender=Listing)
+def uncount_listing_in_regions(sender, instance, **kwargs):
+    shift_listing_count(location_chain(instance.location_id), -1)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    previous = Review.objects.filter(pk=instance.pk).values('listing_id', 'rating').first()
+    instance._previous_rating = previous
+
+
+@receiver(post_save, sender=Review)
+def add_review_to_listing(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    current = {'listing_id': instance.listing_id, 'rating': instance.rating}
+    if previous == current:
+        return
+    if previous:
+        apply_review(previous['listing_id'], previous['rating'], -1)
+    apply_review(instance.listing_id, instance.rating, 1)
+    instance._previous_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_listing(sender, instance, **kwargs):
+    apply_review(instance.listing_id, instance.rating, -1)
+
+
+def invalidate_read_cache(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(*CACHE_DEPENDENCIES[sender])
+
+
+# Connected after the receivers above so the rating aggregates are already
+# written when the listing caches drop.
+for model in CACHE_DEPENDENCIES:
+    post_save.connect(invalidate_read_cache, sender=model, dispatch_uid=f'invalidate_read_cache_{model.__name__}')
+    post_delete.connect(invalidate_read_cache, sender=model, dispatch_uid=f'invalidate_read_cache_{model.__name__}')
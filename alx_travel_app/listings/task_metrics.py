@@ -0,0 +1,51 @@
+import time
+
+from celery import current_app
+from celery.signals import task_failure, task_postrun, task_prerun, task_retry, task_success
+
+from . import metrics
+
+
+def task_names():
+    return sorted(name for name in current_app.tasks if name.startswith('listings.'))
+
+
+succeeded = metrics.SharedCounter('celery_task_succeeded_total', "Tasks that finished.", 'task', task_names)
+failed = metrics.SharedCounter(
+    'celery_task_failed_total', "Tasks that raised, including soft time limits.", 'task', task_names,
+)
+retried = metrics.SharedCounter('celery_task_retried_total', "Task retries scheduled.", 'task', task_names)
+duration = metrics.SharedHistogram(
+    'celery_task_duration_seconds', "Task run time, whatever the outcome.",
+    [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300], 'task', task_names,
+)
+
+# Start times of the tasks running in this worker process, by task id.
+_started = {}
+
+
+@task_prerun.connect(dispatch_uid='task_metrics_prerun')
+def start_timer(task_id=None, **kwargs):
+    _started[task_id] = time.monotonic()
+
+
+@task_postrun.connect(dispatch_uid='task_metrics_postrun')
+def record_duration(task_id=None, task=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        duration.observe(time.monotonic() - started, task.name)
+
+
+@task_success.connect(dispatch_uid='task_metrics_success')
+def count_success(sender=None, **kwargs):
+    succeeded.increment(sender.name)
+
+
+@task_failure.connect(dispatch_uid='task_metrics_failure')
+def count_failure(sender=None, **kwargs):
+    failed.increment(sender.name)
+
+
+@task_retry.connect(dispatch_uid='task_metrics_retry')
+def count_retry(sender=None, **kwargs):
+    retried.increment(sender.name)
@@ -1,32 +1,118 @@
+import requests
 from celery import shared_task
-from django.core.mail import send_mail
-from django.conf import settings
 from .models import Booking
+from .expiry import expire_stale_bookings as expire_bookings
+from .outbox import drain_outbox, enqueue_email, enqueue_emails
+from .payments import create_chapa_payment, reconcile_payments
+from .rollups import update_rollups
 
 
-@shared_task
+@shared_task(soft_time_limit=10, time_limit=20)
 def send_booking_confirmation_email(booking_id):
     """
     Sends a booking confirmation email to the guest of a specified booking.
 
     This function retrieves the booking by its ID, constructs a confirmation
-    email message, and sends the email to the booking guest.
+    email message, and queues it in the outbox for the guest; the message is
+    sent by drain_email_outbox, once per booking and recipient.
 
     Parameters:
         booking_id (int): The ID of the booking for which the confirmation email
         needs to be sent.
     """
-    booking = Booking.objects.get(id=booking_id)
-    subject = "Booking Confirmation"
-    message = f"Your booking for {booking.listing.title} has been confirmed. Thank you for booking with us!"
-    booking.guest.email_user(
-        subject,
-        message,
-    )
+    booking = Booking.objects.select_related('guest', 'listing').get(id=booking_id)
+    enqueue_email(**booking_confirmation(booking))
 
 
-@shared_task
+@shared_task(soft_time_limit=60, time_limit=90)
+def send_booking_confirmation_emails(booking_ids):
+    """
+    send_booking_confirmation_email for a batch of bookings, e.g. from the
+    bulk booking endpoint: one query and one outbox insert for all of them.
+    """
+    bookings = Booking.objects.select_related('guest', 'listing').filter(id__in=booking_ids)
+    enqueue_emails([booking_confirmation(booking) for booking in bookings])
+    return len(booking_ids)
+
+
+def booking_confirmation(booking):
+    return {
+        'recipient': booking.guest.email,
+        'subject': "Booking Confirmation",
+        'body': f"Your booking for {booking.listing.title} has been confirmed. Thank you for booking with us!",
+        'dedup_key': f"booking-confirmation:{booking.id}:{booking.guest.email}",
+    }
+
+
+@shared_task(soft_time_limit=10, time_limit=20)
 def send_payment_confirmation_email(user_email, booking_id):
     subject = "Booking Payment Confirmation"
     message = f"Your payment for booking {booking_id} was successful. Thank you for booking with us!"
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user_email])
\ No newline at end of file
+    enqueue_email(user_email, subject, message, dedup_key=f"payment-confirmation:{booking_id}:{user_email}")
+
+
+@shared_task(soft_time_limit=60, time_limit=90)
+def drain_email_outbox():
+    """
+    Sends the queued emails in batches over one mail server connection,
+    within EMAIL_OUTBOX_RATE_LIMIT. Runs periodically from celery beat.
+    """
+    return drain_outbox()
+
+
+@shared_task(soft_time_limit=120, time_limit=180)
+def reconcile_pending_payments():
+    """
+    Verifies a batch of long-pending payments with Chapa, in case their
+    webhook never arrived, and settles them. Runs periodically from celery
+    beat.
+    """
+    return reconcile_payments()
+
+
+@shared_task(soft_time_limit=120, time_limit=180)
+def expire_stale_bookings():
+    """
+    Cancels bookings left unpaid for BOOKING_PENDING_TTL seconds, fails their
+    payments and frees their nights. Runs periodically from celery beat;
+    returns the counts of bookings, payments and nights expired.
+    """
+    return expire_bookings()
+
+
+@shared_task(soft_time_limit=120, time_limit=180)
+def update_listing_rollups():
+    """
+    Rebuilds the daily stats of the listings whose bookings or payments
+    changed since the last run. Runs periodically from celery beat; returns
+    the number of listings rebuilt.
+    """
+    return update_rollups()
+
+
+@shared_task(
+    autoretry_for=(requests.RequestException,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=6,
+    # Up to three gateway attempts of CHAPA_READ_TIMEOUT each, plus backoff.
+    soft_time_limit=60,
+    time_limit=90,
+)
+def initialize_booking_payment(booking_id):
+    """
+    Initializes the Chapa checkout for a booking and stores the checkout URL
+    on it.
+
+    Gateway connection errors are retried with exponential backoff and jitter.
+    Every attempt for a booking uses the tx_ref of its pending payment (see
+    payments.claim_payment), so a retried or duplicated task does not open a
+    second transaction, and one for a booking that already has a checkout
+    URL returns it.
+
+    Parameters:
+        booking_id (UUID): The ID of the booking to initialize the payment for.
+    """
+    booking = Booking.objects.select_related('guest', 'listing').get(id=booking_id)
+    return create_chapa_payment(booking)
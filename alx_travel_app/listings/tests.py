@@ -1,3 +1,597 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+from uuid import uuid4
 
-# Create your tests here.
+import requests
+from celery.contrib.testing.worker import start_worker
+from celery.signals import task_prerun
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from alx_travel_app.celery import app
+
+from . import task_metrics, tasks
+from .availability import is_available
+from .chapa_stub import make_server
+from .expiry import expire_batch
+from .gateway import AsyncChapaClient, ChapaClient
+from .payments import acreate_chapa_payment, apply_payment_result, create_chapa_payment, verify_many
+from .management.commands.check_query_plans import full_scans
+from .management.commands.loadtest_bookings import loadtest_listings, post_bookings
+from .models import (
+    BookedNight, Booking, BookingStatus, Listing, Location, OutboundEmail, Payment, PaymentEvent, PaymentEventSource,
+    PaymentFollowUp, PaymentStatus, User,
+)
+
+
+def make_user(username):
+    return User.objects.create_user(username=username, email=f'{username}@example.com')
+
+
+def make_listing(host, title='Listing', city='Addis Ababa', price_per_night=100):
+    location, _ = Location.objects.get_or_create(country='Ethiopia', state='Addis Ababa', city=city)
+    return Listing.objects.create(title=title, price_per_night=price_per_night, host=host, location=location)
+
+
+def make_booking(listing, guest, start_date, end_date, status=BookingStatus.PENDING):
+    return Booking.objects.create(
+        listing=listing, guest=guest, start_date=start_date, end_date=end_date,
+        total_price=listing.price_per_night * (end_date - start_date).days, status=status,
+    )
+
+
+# A cache every process on this machine shares, as Redis would be.
+SHARED_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'alx_travel_app_test_cache'),
+}}
+
+
+def no_tasks():
+    """Keeps booking creates from publishing their Celery tasks."""
+    return mock.patch.multiple(
+        'listings.views',
+        send_booking_confirmation_email=mock.DEFAULT,
+        initialize_booking_payment=mock.DEFAULT,
+    )
+
+
+class BookedNightTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host')
+        self.guest = make_user('guest')
+        self.listing = make_listing(self.host, 'Loft')
+        self.other = make_listing(self.host, 'Cabin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def test_moving_a_booking_to_another_listing_moves_its_nights(self):
+        start, end = date(2030, 1, 1), date(2030, 1, 4)
+        booking = make_booking(self.listing, self.guest, start, end)
+
+        response = self.client.patch(f'/api/bookings/{booking.id}/', {'listing': str(self.other.id)}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(BookedNight.objects.filter(booking=booking).values_list('listing_id', 'date')),
+            [(self.other.id, date(2030, 1, day)) for day in (1, 2, 3)],
+        )
+        self.assertTrue(is_available(self.listing, start, end))
+        self.assertFalse(is_available(self.other, start, end))
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints run the same queries whatever the page size, ?expand= included."""
+    rows = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = make_user('guest')
+        for n in range(cls.rows):
+            listing = make_listing(make_user(f'host{n}'), f'Listing {n}', city=f'City {n % 5}')
+            booking = make_booking(listing, cls.guest, date(2030, 1, 1), date(2030, 1, 3))
+            Payment.objects.create(booking=booking, amount=booking.total_price, transaction_id=f'tx-{n}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def assertQueriesIndependentOfPageSize(self, url, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {**params, 'limit': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url, {**params, 'limit': 20})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_listings(self):
+        self.assertQueriesIndependentOfPageSize('/api/listings/')
+
+    def test_expanded_listings(self):
+        self.assertQueriesIndependentOfPageSize('/api/listings/', expand='location,host')
+
+    def test_bookings(self):
+        self.assertQueriesIndependentOfPageSize('/api/bookings/')
+        self.assertQueriesIndependentOfPageSize('/api/bookings/', expand='listing,guest')
+
+    def test_payments(self):
+        self.assertQueriesIndependentOfPageSize('/api/payments/')
+        self.assertQueriesIndependentOfPageSize('/api/payments/', expand='booking')
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class ConditionalListTests(TestCase):
+    """List ETags come from cache versions, which writes move."""
+
+    def setUp(self):
+        cache.clear()
+        self.guest = make_user('guest')
+        self.listing = make_listing(make_user('host'))
+        self.booking = make_booking(self.listing, self.guest, date(2030, 1, 1), date(2030, 1, 3))
+        self.client = APIClient()
+        self.client.force_authenticate(self.guest)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertNotModified(self, url, etag):
+        # Answered from the cache, without counting or reading the list.
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unchanged_lists_are_not_modified_without_queries(self):
+        for url in ['/api/listings/', '/api/bookings/?expand=listing,guest']:
+            self.assertNotModified(url, self.etag(url))
+
+    def test_booking_writes_change_the_booking_list_etag(self):
+        url = '/api/bookings/'
+        etag = self.etag(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_booking(self.listing, self.guest, date(2030, 2, 1), date(2030, 2, 3))
+        self.assertNotEqual(self.etag(url), etag)
+
+        # Queryset updates, which send no signals, too.
+        etag = self.etag(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_batch(timezone.now() + timedelta(days=1), 10)
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_listing_writes_change_the_expanded_booking_list_etag(self):
+        url = '/api/bookings/?expand=listing'
+        etag = self.etag(url)
+        self.listing.title = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.save()
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_lists_carry_no_etag_with_a_per_process_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            response = self.client.get('/api/bookings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class ConditionalListProcessTests(TransactionTestCase):
+    """A list ETag moves with writes made by other processes, such as workers."""
+
+    def test_a_write_in_another_process_changes_the_list_etag(self):
+        cache.clear()
+        guest = make_user('guest')
+        make_booking(make_listing(make_user('host')), guest, date(2030, 1, 1), date(2030, 1, 3))
+        client = APIClient()
+        client.force_authenticate(guest)
+        etag = client.get('/api/bookings/')['ETag']
+
+        # The child opens its own connection and expires the booking.
+        connection.close()
+        child = multiprocessing.get_context('fork').Process(
+            target=expire_batch, args=(timezone.now() + timedelta(days=1), 10))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+
+        self.assertEqual(Booking.objects.get().status, BookingStatus.CANCELLED)
+        response = client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class RegionTreeTests(TestCase):
+    """The region tree follows renamed and deleted locations."""
+
+    def setUp(self):
+        self.listing = make_listing(make_user('host'), city='Addis')
+        self.client = APIClient()
+
+    def tree(self):
+        def paths(nodes, prefix=()):
+            for node in nodes:
+                path = prefix + (node['name'],)
+                yield path, node['listing_count']
+                yield from paths(node['children'], path)
+
+        return dict(paths(self.client.get('/api/regions/').data))
+
+    def test_renaming_a_location_drops_its_old_node(self):
+        location = self.listing.location
+        location.city = 'Adama'
+        with self.captureOnCommitCallbacks(execute=True):
+            location.save()
+        self.assertEqual(self.tree(), {
+            ('Ethiopia',): 1, ('Ethiopia', 'Addis Ababa'): 1, ('Ethiopia', 'Addis Ababa', 'Adama'): 1,
+        })
+
+        location.state, location.city = 'Oromia', 'Adama'
+        with self.captureOnCommitCallbacks(execute=True):
+            location.save()
+        self.assertEqual(self.tree(), {('Ethiopia',): 1, ('Ethiopia', 'Oromia'): 1, ('Ethiopia', 'Oromia', 'Adama'): 1})
+
+    def test_deleting_a_location_drops_its_nodes(self):
+        make_listing(self.listing.host, city='Adama')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.delete()
+            self.listing.location.delete()
+        self.assertEqual(self.tree(), {
+            ('Ethiopia',): 1, ('Ethiopia', 'Addis Ababa'): 1, ('Ethiopia', 'Addis Ababa', 'Adama'): 1,
+        })
+
+
+class PaymentExpiryTests(TestCase):
+    """Expiry asks the gateway before failing a payment, and late successes are kept."""
+
+    def setUp(self):
+        self.guest = make_user('guest')
+        self.listing = make_listing(make_user('host'))
+        self.booking = make_booking(self.listing, self.guest, date(2030, 1, 1), date(2030, 1, 3))
+        Booking.objects.filter(id=self.booking.id).update(created_at=timezone.now() - timedelta(days=1))
+        self.payment = Payment.objects.create(booking=self.booking, amount=200, transaction_id='tx-1')
+
+    def expire(self, chapa_data):
+        async def verify_many(tx_refs):
+            return [(tx_ref, chapa_data) for tx_ref in tx_refs]
+
+        with mock.patch('listings.expiry.verify_many', verify_many), \
+                mock.patch('listings.expiry.get_client') as get_client:
+            get_client.return_value.configured = True
+            return expire_batch(timezone.now(), 10)
+
+    def assertStatuses(self, booking_status, payment_status):
+        self.booking.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.booking.status, self.payment.payment_status), (booking_status, payment_status))
+
+    def test_a_booking_paid_before_expiry_is_kept(self):
+        self.expire({'status': 'success', 'data': {'status': 'success'}})
+        self.assertStatuses(BookingStatus.ACTIVE, PaymentStatus.SUCCESS)
+        self.assertEqual(BookedNight.objects.filter(booking=self.booking).count(), 2)
+
+    def test_a_booking_the_gateway_reports_unpaid_expires(self):
+        changed = self.expire({'status': 'failed', 'message': 'Invalid transaction or Transaction not found'})
+        self.assertEqual(changed, {'booking': 1, 'payment': 1, 'night': 2})
+        self.assertStatuses(BookingStatus.CANCELLED, PaymentStatus.FAILED)
+
+    def test_a_booking_waits_while_the_gateway_is_unreachable(self):
+        self.assertEqual(self.expire(None), {})
+        self.assertStatuses(BookingStatus.PENDING, PaymentStatus.PENDING)
+
+    def test_a_success_after_expiry_is_flagged_for_reactivation(self):
+        self.expire({'status': 'failed'})
+
+        for _ in range(2):
+            status = apply_payment_result('tx-1', PaymentStatus.SUCCESS, PaymentEventSource.WEBHOOK, {'n': 1})
+            self.assertEqual(status, PaymentStatus.FAILED)
+
+        self.assertEqual(PaymentEvent.objects.filter(tx_ref='tx-1', status=PaymentStatus.SUCCESS).count(), 1)
+        self.assertStatuses(BookingStatus.CANCELLED, PaymentStatus.FAILED)
+        self.assertEqual(self.payment.follow_up, PaymentFollowUp.REACTIVATE)
+
+    def test_a_success_after_the_nights_were_rebooked_is_flagged_for_refund(self):
+        self.expire({'status': 'failed'})
+        make_booking(self.listing, make_user('other'), date(2030, 1, 2), date(2030, 1, 4))
+
+        apply_payment_result('tx-1', PaymentStatus.SUCCESS, PaymentEventSource.VERIFY)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.follow_up, PaymentFollowUp.REFUND)
+
+
+class AsyncGatewayClientTests(SimpleTestCase):
+    """AsyncChapaClient keeps one pool per event loop, against the Chapa stub."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address[:2]
+        cls.base_url = f'http://{host}:{port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.gateway = AsyncChapaClient(self.base_url, 'secret')
+
+    def run_calls(self, count=5):
+        """Verifies `count` transactions at once in a new loop; returns the pool each call used."""
+        async def calls():
+            pools = []
+
+            async def verify(n):
+                await self.gateway.verify(f'tx-{n}')
+                pools.append(await self.gateway.http())
+
+            await asyncio.gather(*(verify(n) for n in range(count)))
+            return pools
+
+        return asyncio.run(calls())
+
+    def test_calls_on_one_loop_share_a_pool_closed_when_the_loop_ends(self):
+        pools = self.run_calls()
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+        self.assertTrue(pools[0].is_closed)
+        self.assertEqual(len(self.gateway._clients), 0)
+
+    def test_loops_in_different_threads_get_their_own_pools(self):
+        with ThreadPoolExecutor(4) as executor:
+            pools = [run[0] for run in executor.map(lambda _: self.run_calls(), range(8))]
+        self.assertEqual(len({id(pool) for pool in pools}), 8)
+        self.assertTrue(all(pool.is_closed for pool in pools))
+        self.assertEqual(len(self.gateway._clients), 0)
+
+
+class HTMLErrorHandler(BaseHTTPRequestHandler):
+    """Answers everything with a 502 HTML page, as a proxy in front of Chapa might."""
+
+    def do_GET(self):
+        body = b'<html><body>502 Bad Gateway</body></html>'
+        self.send_response(502)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncGatewayErrorTests(SimpleTestCase):
+    """A response that is not JSON surfaces as a requests exception."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), HTMLErrorHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address[:2]
+        cls.gateway = AsyncChapaClient(f'http://{host}:{port}', 'secret', max_retries=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_calls_raise_a_request_exception(self):
+        with self.assertRaises(requests.RequestException):
+            asyncio.run(self.gateway.verify('tx-1'))
+        with self.assertRaises(requests.RequestException):
+            asyncio.run(self.gateway.initialize({'tx_ref': 'tx-1'}))
+
+    def test_verify_many_reports_the_transaction_as_unknown(self):
+        with mock.patch('listings.payments.get_async_client', return_value=self.gateway):
+            self.assertEqual(asyncio.run(verify_many(['tx-1', 'tx-2'])), [('tx-1', None), ('tx-2', None)])
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_an_index(self):
+        output = StringIO()
+        try:
+            call_command('check_query_plans', stdout=output)
+        except CommandError:
+            self.fail(output.getvalue())
+
+    def test_a_full_scan_is_detected(self):
+        self.assertEqual(full_scans(Listing.objects.filter(description='Quiet')), ['listings_listing'])
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Parallel creates through BookingViewSet, each thread on its own connection."""
+    requests = 200
+    concurrency = 50
+
+    def setUp(self):
+        self.guest = make_user('guest')
+        self.location = Location.objects.create(country='Ethiopia', state='Addis Ababa', city='Addis Ababa')
+        self.start, self.end = date(2030, 1, 1), date(2030, 1, 4)
+
+    def test_exactly_one_of_many_parallel_creates_for_one_listing_wins(self):
+        _, [listing_id] = loadtest_listings(1, self.location)
+
+        statuses, _, _ = post_bookings(self.guest, [listing_id] * self.requests, self.start, self.end, self.concurrency)
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(400), self.requests - 1)
+        self.assertEqual(Booking.objects.filter(listing_id=listing_id).count(), 1)
+        self.assertEqual(BookedNight.objects.filter(listing_id=listing_id).count(), 3)
+
+    def test_parallel_creates_for_different_listings_all_succeed(self):
+        _, listing_ids = loadtest_listings(self.requests, self.location)
+
+        statuses, _, _ = post_bookings(self.guest, listing_ids, self.start, self.end, self.concurrency)
+
+        self.assertEqual(statuses, [201] * self.requests)
+        self.assertEqual(BookedNight.objects.filter(listing_id__in=listing_ids).count(), 3 * self.requests)
+
+
+class PaymentInitializationTests(TransactionTestCase):
+    """Every initialization of a booking's checkout sends Chapa the same tx_ref."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server(latency=0.05)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        host, port = cls.server.server_address[:2]
+        cls.base_url = f'http://{host}:{port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.transactions.clear()
+        self.booking = make_booking(make_listing(make_user('host')), make_user('guest'),
+                                    date(2030, 1, 1), date(2030, 1, 3))
+        self.gateway = ChapaClient(self.base_url, 'secret')
+        for name, client in [('get_client', self.gateway),
+                             ('get_async_client', AsyncChapaClient(self.base_url, 'secret'))]:
+            patcher = mock.patch(f'listings.payments.{name}', return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def load(self):
+        return Booking.objects.select_related('guest', 'listing').get(id=self.booking.id)
+
+    def assertOneTransaction(self):
+        payment = Payment.objects.get()
+        self.assertEqual(list(self.server.transactions), [payment.transaction_id])
+        self.assertEqual(self.load().payment_url, f'{self.base_url}/checkout/{payment.transaction_id}')
+
+    def test_concurrent_task_and_view_initializations_open_one_transaction(self):
+        def initialize(n):
+            try:
+                if n % 2:
+                    return asyncio.run(acreate_chapa_payment(self.load()))
+                return create_chapa_payment(self.load())
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(initialize, range(16)))
+
+        self.assertIn('success', [result['status'] for result in results])
+        self.assertOneTransaction()
+
+    def test_a_retry_reuses_the_tx_ref(self):
+        with mock.patch.object(self.gateway, 'initialize', side_effect=requests.ReadTimeout()):
+            with self.assertRaises(requests.ReadTimeout):
+                create_chapa_payment(self.load())
+
+        result = create_chapa_payment(self.load())
+        self.assertEqual(result['status'], 'success')
+        self.assertOneTransaction()
+
+        # Once stored, the checkout URL is returned without calling Chapa.
+        with mock.patch.object(self.gateway, 'initialize') as initialize:
+            self.assertEqual(create_chapa_payment(self.load()),
+                             {'status': 'success', 'data': {'checkout_url': result['data']['checkout_url']}})
+        initialize.assert_not_called()
+
+
+class CeleryWorkerTests(TransactionTestCase):
+    """
+    Tasks sent through the normal routing to a worker on the in-memory
+    broker, as run_tasks_in_memory does, which runs in a thread of the test
+    process with its own database connection.
+    """
+    # Keys as the app reads them from Django settings.
+    conf = {'CELERY_BROKER_URL': 'memory://', 'CELERY_TASK_ALWAYS_EAGER': False}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.previous_conf = {name: app.conf.get(name) for name in cls.conf}
+        app.conf.update(cls.conf)
+        cls.worker = start_worker(app, pool='solo', perform_ping_check=False, loglevel='WARNING')
+        cls.worker.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.__exit__(None, None, None)
+        app.conf.update(cls.previous_conf)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.queues = {}
+        task_prerun.connect(self.remember_queue)
+        self.addCleanup(task_prerun.disconnect, self.remember_queue)
+
+    def remember_queue(self, task_id=None, task=None, **kwargs):
+        self.queues[task_id] = task.request.delivery_info.get('routing_key')
+
+    def run_task(self, task, *args):
+        result = task.delay(*args)
+        result.get(timeout=30, propagate=False)
+        return result, self.queues[result.id]
+
+    def counts(self, metric):
+        """{task: value} of a task counter, or of a task histogram's count."""
+        return {dict(labels)['task']: value for name, labels, value in metric.samples()
+                if value and name in (metric.name, f'{metric.name}_count')}
+
+    def test_tasks_run_on_their_queues_and_are_counted(self):
+        listing = make_listing(make_user('host'))
+        booking = make_booking(listing, make_user('guest'), date(2030, 1, 1), date(2030, 1, 3))
+
+        for task, args, queue in [
+            (tasks.send_booking_confirmation_emails, [[str(booking.id)]], 'email'),
+            (tasks.drain_email_outbox, [], 'email'),
+            (tasks.reconcile_pending_payments, [], 'payments'),
+            (tasks.expire_stale_bookings, [], 'maintenance'),
+            (tasks.update_listing_rollups, [], 'maintenance'),
+        ]:
+            result, routed = self.run_task(task, *args)
+            self.assertEqual((result.state, routed), ('SUCCESS', queue), task.name)
+
+        self.assertEqual(OutboundEmail.objects.filter(recipient=booking.guest.email).count(), 1)
+        self.assertEqual(self.counts(task_metrics.succeeded), dict.fromkeys([
+            'listings.tasks.send_booking_confirmation_emails', 'listings.tasks.drain_email_outbox',
+            'listings.tasks.reconcile_pending_payments', 'listings.tasks.expire_stale_bookings',
+            'listings.tasks.update_listing_rollups',
+        ], 1))
+        self.assertEqual(self.counts(task_metrics.failed), {})
+        self.assertEqual(self.counts(task_metrics.duration), self.counts(task_metrics.succeeded))
+
+    def test_failures_and_retries_are_counted(self):
+        result, queue = self.run_task(tasks.send_booking_confirmation_email, str(uuid4()))
+        self.assertEqual((result.state, queue), ('FAILURE', 'email'))
+
+        booking_id = str(uuid4())
+        with mock.patch('listings.tasks.Booking.objects.select_related') as bookings, \
+                mock.patch('listings.tasks.create_chapa_payment',
+                           side_effect=[requests.ConnectionError(), {'status': 'success'}]):
+            result, queue = self.run_task(tasks.initialize_booking_payment, booking_id)
+        self.assertEqual((result.state, result.result, queue), ('SUCCESS', {'status': 'success'}, 'payments'))
+
+        self.assertEqual(self.counts(task_metrics.failed), {'listings.tasks.send_booking_confirmation_email': 1})
+        self.assertEqual(self.counts(task_metrics.retried), {'listings.tasks.initialize_booking_payment': 1})
+        self.assertEqual(self.counts(task_metrics.succeeded), {'listings.tasks.initialize_booking_payment': 1})
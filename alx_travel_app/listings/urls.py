@@ -1,5 +1,6 @@
 from .views import ListingViewSet, BookingViewSet, verify_payment, UserViewSet, LocationViewSet, \
-    PaymentListView, RoleViewSet
+    PaymentListView, PaymentExportView, RoleViewSet, RegionViewSet, initialize_payment, \
+    chapa_webhook, HostStatsView, PriceRuleViewSet
 from rest_framework_nested import routers
 from django.urls import path
 
@@ -7,12 +8,20 @@ from django.urls import path
 router = routers.DefaultRouter()
 router.register('users', UserViewSet)
 router.register('locations', LocationViewSet)
+router.register('regions', RegionViewSet)
 router.register('listings', ListingViewSet)
 router.register('bookings', BookingViewSet)
 router.register('roles', RoleViewSet)
+listing_router = routers.NestedSimpleRouter(router, 'listings', lookup='listing')
+listing_router.register('price-rules', PriceRuleViewSet, basename='listing-price-rules')
 urlpatterns = [
     *router.urls,
+    *listing_router.urls,
+    path("hosts/me/stats/", HostStatsView.as_view(), name="host_stats"),
     path("payments/", PaymentListView.as_view(), name="payment_list"),
+    path("payments/export/", PaymentExportView.as_view(), name="payment_export"),
+    path("payments/initialize/<uuid:booking_id>/", initialize_payment, name="initialize_payment"),
     path("payments/verify/<str:tx_ref>/", verify_payment, name="verify_payment"),
+    path("payments/webhook/", chapa_webhook, name="chapa_webhook"),
 ]
 
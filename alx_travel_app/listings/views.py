@@ -1,23 +1,56 @@
-import uuid
-import os
+import json
+
 import requests
-from django.http import JsonResponse
-from rest_framework import viewsets, permissions
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import viewsets, permissions, serializers
 from rest_framework.generics import ListAPIView
-from rest_framework.decorators import api_view
-from rest_framework.status import HTTP_205_RESET_CONTENT, HTTP_400_BAD_REQUEST
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_205_RESET_CONTENT, HTTP_400_BAD_REQUEST
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.views import APIView
 from .serializers import ListingSerializer, BookingSerializer, PaymentSerializer, UserSerializer, \
-    LocationSerializer, RoleSerializer
-from .models import User, Listing, Booking, Payment, PaymentStatus, Location, BookingStatus, Role
-from .tasks import send_booking_confirmation_email, send_payment_confirmation_email
+    LocationSerializer, RoleSerializer, AvailabilitySearchSerializer, ListingSearchSerializer, RegionSerializer, \
+    HostStatsSerializer, QuoteSerializer, BatchQuoteSerializer, PriceRuleSerializer, BOOKED_DATES_MESSAGE
+from .models import User, Listing, Booking, Payment, PaymentEventSource, PaymentStatus, Location, BookingStatus, Role, \
+    Region, PriceRule
+from .tasks import send_booking_confirmation_email, initialize_booking_payment
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from .permissions import IsHost, IsGuestOrListingHost
+from .availability import available_listings
+from .gateway import get_async_client
+from .payments import FINAL_STATUSES, acreate_chapa_payment, apply_payment_result, valid_webhook_signature, \
+    verified_status
+from .search import search_listings
+from .regions import listings_in_region, region_tree
+from .rollups import host_stats
+from .pricing import quote_listings, quote_stay
+from .bulk import create_bookings, create_listings, update_bookings, update_listings
+from .cache import make_key, read_through
+from .exports import BOOKING_COLUMNS, PAYMENT_COLUMNS, export_response
+from .renderers import CSVRenderer, NDJSONRenderer
+from .mixins import CachedReadMixin, ConditionalRequestMixin, ExpandQuerysetMixin, RowListMixin
+from . import metrics
+
+VERIFY_RESPONSE_STATUS = {
+    PaymentStatus.PENDING: "pending",
+    PaymentStatus.SUCCESS: "success",
+    PaymentStatus.FAILED: "error",
+}
 
 
 class RoleViewSet(viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
+    pagination_ordering = ('id',)
 
     def perform_create(self, serializer):
         new_role = serializer.validated_data.get('name').lower()
@@ -40,6 +73,7 @@ class RegisterView(APIView):
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_ordering = ('-date_joined', '-id')
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -60,20 +94,131 @@ class LogoutView(APIView):
             return JsonResponse({"success": False, "error": str(e)}, status=HTTP_400_BAD_REQUEST)
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(CachedReadMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
+    pagination_ordering = ('id',)
+    cache_namespace = 'locations'
+
+class RegionViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Region.objects.all()
+    serializer_class = RegionSerializer
+
+    def list(self, request):
+        # The whole country -> state -> city tree with listing counts; small
+        # enough to build in one query and serve from the cache.
+        return Response(read_through('regions', make_key('regions', 'tree'), region_tree))
 
-class ListingViewSet(viewsets.ModelViewSet):
+class ListingViewSet(ConditionalRequestMixin, CachedReadMixin, ExpandQuerysetMixin, RowListMixin,
+                     viewsets.ModelViewSet):
     queryset = Listing.objects.all()
     serializer_class = ListingSerializer
+    cache_namespace = 'listings'
     permission_classes = [permissions.IsAuthenticated, IsHost]
+    ordering_fields = ['rating_avg', 'review_count']
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in ('list', 'available', 'search'):
+            return queryset
+        min_rating = self.request.query_params.get('min_rating')
+        if min_rating is not None:
+            try:
+                queryset = queryset.filter(rating_avg__gte=float(min_rating))
+            except ValueError:
+                raise serializers.ValidationError({'min_rating': "Must be a number."})
+        region_id = self.request.query_params.get('region')
+        if region_id is not None:
+            try:
+                region = Region.objects.get(id=region_id)
+            except (Region.DoesNotExist, DjangoValidationError):
+                raise serializers.ValidationError({'region': "Unknown region."})
+            queryset = listings_in_region(region, queryset)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        params = AvailabilitySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return self.list_response(self.plan_related(self.filter_queryset(available_listings(**params.validated_data))))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        params = ListingSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset())
+        if params.validated_data.get('city'):
+            queryset = queryset.filter(location__city__iexact=params.validated_data['city'])
+        if params.validated_data.get('max_price') is not None:
+            queryset = queryset.filter(price_per_night__lte=params.validated_data['max_price'])
+
+        listings = search_listings(params.validated_data['q'], queryset, limit=self.paginator.get_page_size(request))
+        results = self.get_serializer(listings, many=True).data
+        for result, listing in zip(results, listings):
+            result['score'] = round(listing.search_score, 4)
+        return Response({"results": results})
+
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """The price of a stay from ?start= up to ?end=, night rules and discounts applied."""
+        params = QuoteSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(quote_stay(self.get_object(), params.validated_data['start'], params.validated_data['end']))
+
+    @action(detail=False, methods=['get'])
+    def quotes(self, request):
+        """Quotes for each of ?ids=a,b,c in one call, e.g. for a page of search results; unknown ids are left out."""
+        params = BatchQuoteSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ids = params.validated_data['ids']
+        prices = dict(Listing.objects.filter(id__in=ids).values_list('id', 'price_per_night'))
+        listings = [(listing_id, prices[listing_id]) for listing_id in ids if listing_id in prices]
+        return Response({"results": quote_listings(
+            listings, params.validated_data['start'], params.validated_data['end'],
+        )})
+
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk(self, request):
+        """
+        Creates (POST) or updates (PATCH, each item naming its "id") a list
+        of up to BULK_MAX_ITEMS listings in one transaction. Nothing is
+        written unless every item is valid; errors are listed per item.
+        """
+        context = self.get_serializer_context()
+        if request.method == 'POST':
+            listings = create_listings(request.data, context)
+        else:
+            listings = update_listings(request.data, context, request.user)
+        return Response(
+            {"results": ListingSerializer(listings, many=True, context=context).data},
+            status=HTTP_201_CREATED if request.method == 'POST' else HTTP_200_OK,
+        )
+
+class PriceRuleViewSet(viewsets.ModelViewSet):
+    """The price rules of one of the signed-in host's listings."""
+    serializer_class = PriceRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_listing(self):
+        try:
+            return Listing.objects.get(id=self.kwargs['listing_pk'], host=self.request.user)
+        except (Listing.DoesNotExist, DjangoValidationError):
+            raise Http404
 
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # The schema generator has no listing in the URL.
+            return PriceRule.objects.none()
+        return PriceRule.objects.filter(listing=self.get_listing())
 
-class BookingViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        serializer.save(listing=self.get_listing())
+
+class BookingViewSet(ConditionalRequestMixin, ExpandQuerysetMixin, RowListMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated, IsGuestOrListingHost]
+    etag_namespace = 'bookings'
 
 
     def perform_create(self, serializer):
@@ -83,101 +228,182 @@ class BookingViewSet(viewsets.ModelViewSet):
             guest = serializer.validated_data.get('guest')
         start_date = serializer.validated_data.get('start_date')
         end_date = serializer.validated_data.get('end_date')
-        total_days = serializer.validate_booking_days((end_date - start_date).days)
-        total_price = listing.price_per_night * total_days
+        serializer.validate_booking_days((end_date - start_date).days)
+        total_price = quote_stay(listing, start_date, end_date)['total']
 
-        booking = serializer.save(
+        booking = self._save_reserving_nights(
+            serializer,
             guest=guest,
             listing=listing,
             total_price=total_price,
             status=BookingStatus.PENDING
         )
         send_booking_confirmation_email.delay(booking.id)
-        try:
-            create_chapa_payment(booking)
-        except requests.RequestException as e:
-            print(f"[Chapa Payment Error]({e})")
+        # The checkout URL is fetched by a worker; clients pick it up from
+        # the booking's payment endpoint.
+        initialize_booking_payment.delay(booking.id)
         return booking
 
-class PaymentListView(ListAPIView):
+    def perform_update(self, serializer):
+        self._save_reserving_nights(serializer)
+
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk(self, request):
+        """
+        Books (POST) or updates (PATCH, each item naming its "id") a list of
+        up to BULK_MAX_ITEMS stays for the user in one transaction, checking
+        them against the calendar and each other at once. Nothing is written
+        unless every item is valid; errors are listed per item.
+        """
+        context = self.get_serializer_context()
+        if request.method == 'POST':
+            bookings = create_bookings(request.data, context, request.user)
+        else:
+            bookings = update_bookings(request.data, context, request.user)
+        return Response(
+            {"results": BookingSerializer(bookings, many=True, context=context).data},
+            status=HTTP_201_CREATED if request.method == 'POST' else HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """Streams the bookings the user made or received as a guest or host, as ?format=csv or ndjson."""
+        queryset = Booking.objects.filter(Q(guest=request.user) | Q(listing__host=request.user))
+        return export_response(request, queryset, BOOKING_COLUMNS, 'bookings')
+
+    @action(detail=True, methods=['get'])
+    def payment(self, request, pk=None):
+        booking = self.get_object()
+        return Response({
+            "booking": booking.id,
+            "status": "ready" if booking.payment_url else "pending",
+            "payment_url": booking.payment_url or None,
+        })
+
+    def _save_reserving_nights(self, serializer, **kwargs):
+        # The booking and its nights are written in one transaction; a racing
+        # request that grabbed any of the nights first makes this one fail on
+        # the BookedNight unique constraint and roll back.
+        try:
+            with transaction.atomic():
+                return serializer.save(**kwargs)
+        except IntegrityError:
+            raise serializers.ValidationError(BOOKED_DATES_MESSAGE)
+
+class PaymentListView(ExpandQuerysetMixin, RowListMixin, ListAPIView):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(booking__guest=self.request.user)
-
-def create_chapa_payment(booking):
-    secret_key = os.environ.get("CHAPA_SECRET_KEY")
-    chapa_url = os.environ.get("CHAPA_BASE_URL")
-    if not secret_key or not chapa_url:
-        return {
-            "status": "error",
-            "data": "Missing CHAPA_SECRET_KEY or CHAPA_BASE_URL environment variables."
-        }
-
-    tx_ref = str(uuid.uuid4())
-    app_url = os.environ.get("APP_URL")
-    port = os.environ.get("APP_PORT")
-    return_url = f"{app_url}:{port}/api/payment/verify/{tx_ref}/"
-
-    chapa_payload = {
-        "amount": booking.total_price,
-        "email": booking.guest.email,
-        "first_name": booking.guest.first_name,
-        "last_name": booking.guest.last_name,
-        "phone_number": getattr(booking.guest, "phone_number", None) or "",
-        "tx_ref": tx_ref,
-        "return_url": return_url,
-        "customization": {
-            "title": f"payment- {booking.listing.title[:5]}",
-            "description": f"Staying from {booking.start_date} to {booking.end_date}"
-        }
-    }
-
-    headers = {
-        "Authorization": f"Bearer {secret_key}",
-        "Content-Type": "application/json",
-    }
-
-    response = requests.post(f"{chapa_url}/transaction/initialize", json=chapa_payload, headers=headers)
-    chapa_data = response.json()
-
-    if chapa_data.get("status") == "success":
-        booking.payment_url = chapa_data["data"]["checkout_url"]
-        booking.save()
-        Payment.objects.create(
-            booking=booking,
-            transaction_id=tx_ref,
-            amount=booking.total_price,
-        )
-    return chapa_data
+        return super().get_queryset().filter(booking__guest=self.request.user)
+
+
+class PaymentExportView(PaymentListView):
+    """Streams the payments PaymentListView lists, as ?format=csv or ndjson."""
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get(self, request, *args, **kwargs):
+        return export_response(request, self.get_queryset(), PAYMENT_COLUMNS, 'payments')
+
 
+class HostStatsView(APIView):
+    """
+    The signed-in host's occupancy, check-ins and revenue per month and per
+    listing, for ?start=YYYY-MM&end=YYYY-MM (the last twelve months by
+    default), read from the daily rollups.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = HostStatsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(host_stats(request.user, params.validated_data['start'], params.validated_data['end']))
 
-@api_view(["GET"])
-def verify_payment(request, tx_ref):
-    secret_key = os.environ.get("CHAPA_SECRET_KEY")
-    chapa_url = os.environ.get("CHAPA_BASE_URL")
-    headers = {
-        "Authorization": f"Bearer {secret_key}",
-    }
+
+async def authenticate(request):
+    """JWT authentication for the async views below, which DRF cannot serve."""
     try:
-        response = requests.get(f"{chapa_url}/transaction/verify/{tx_ref}", headers=headers)
-        chapa_data = response.json()
-        try:
-            payment = Payment.objects.get(transaction_id=tx_ref)
-        except Payment.DoesNotExist:
-            return JsonResponse({"status": "error", "data": "Payment not found"})
-
-        if chapa_data.get("status") == "success" and chapa_data.get("data").get("status") == "success":
-            payment.payment_status = PaymentStatus.SUCCESS
-            payment.save()
-            # send email using celery
-            send_payment_confirmation_email.delay(payment.booking.guest.email, payment.booking.id)
-            return JsonResponse({"status": "success", "data": chapa_data})
-        else:
-            payment.payment_status = PaymentStatus.FAILED
-            payment.save()
-            return JsonResponse({"status": "error", "data": chapa_data})
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+@csrf_exempt
+@require_POST
+async def initialize_payment(request, booking_id):
+    """
+    Initializes the Chapa checkout of one of the user's pending bookings
+    while the client waits, instead of through the worker. The gateway call
+    is awaited, so under ASGI it does not hold a thread.
+    """
+    user = await authenticate(request)
+    if user is None:
+        return JsonResponse({"status": "error", "data": "Authentication credentials were not provided or are invalid."},
+                            status=401)
+    try:
+        booking = await Booking.objects.select_related('guest', 'listing').aget(id=booking_id, guest=user)
+    except Booking.DoesNotExist:
+        return JsonResponse({"status": "error", "data": "Booking not found"}, status=404)
+    if booking.payment_url:
+        return JsonResponse({"status": "success", "data": {"checkout_url": booking.payment_url}})
+    if booking.status != BookingStatus.PENDING:
+        return JsonResponse({"status": "error", "data": "Booking is not awaiting payment"}, status=HTTP_400_BAD_REQUEST)
+    try:
+        return JsonResponse(await acreate_chapa_payment(booking))
     except requests.RequestException as e:
-        return JsonResponse({"status": "error", "data": str(e)})
\ No newline at end of file
+        return JsonResponse({"status": "error", "data": str(e)}, status=502)
+
+
+@require_GET
+async def verify_payment(request, tx_ref):
+    """
+    Chapa's return URL. Reports the local status of the payment, asking the
+    gateway only while it is still pending, which is rare once the webhook
+    has delivered the outcome.
+    """
+    payment = await Payment.objects.filter(transaction_id=tx_ref).afirst()
+    if payment is None:
+        return JsonResponse({"status": "error", "data": "Payment not found"})
+
+    if payment.payment_status == PaymentStatus.PENDING:
+        try:
+            chapa_data = await get_async_client().verify(tx_ref)
+        except requests.RequestException as e:
+            return JsonResponse({"status": "error", "data": str(e)})
+        status = verified_status(chapa_data)
+        if status is not None:
+            payment.payment_status = await sync_to_async(apply_payment_result)(
+                tx_ref, status, PaymentEventSource.VERIFY, chapa_data,
+            )
+
+    data = {"tx_ref": tx_ref, "booking": payment.booking_id, "payment_status": payment.payment_status}
+    return JsonResponse({"status": VERIFY_RESPONSE_STATUS[payment.payment_status], "data": data})
+
+
+@csrf_exempt
+@require_POST
+def chapa_webhook(request):
+    """Receives Chapa's signed charge events and settles the payment once."""
+    if not valid_webhook_signature(request):
+        return JsonResponse({"status": "error", "data": "Invalid signature"}, status=401)
+    try:
+        event = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"status": "error", "data": "Invalid JSON"}, status=HTTP_400_BAD_REQUEST)
+    tx_ref = event.get("tx_ref") if isinstance(event, dict) else None
+    if not tx_ref:
+        return JsonResponse({"status": "error", "data": "'tx_ref' is required."}, status=HTTP_400_BAD_REQUEST)
+
+    status = FINAL_STATUSES.get(event.get("status"))
+    if status is None:
+        return JsonResponse({"status": "success", "data": "Ignored"})
+    payment_status = apply_payment_result(tx_ref, status, PaymentEventSource.WEBHOOK, event)
+    return JsonResponse({"status": "success", "data": {"tx_ref": tx_ref, "payment_status": payment_status}})
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, only served to INTERNAL_IPS."""
+    if request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")